@@ -0,0 +1,122 @@
+import numpy as np
+import constants as const
+import array_engine
+
+# Fields a generation can change (the height never changes)
+CHANGING = [field for field in array_engine.FIELDS if array_engine.NEXT_FIELDS[field] != field]
+
+# A step of spread follows the cells one by one while they are fewer than 1/SPARSE of the world
+SPARSE = 32
+
+
+class ActiveEngine(array_engine.ArrayEngine):
+    """
+    ArrayEngine which only calculates and applies the changes of the active cells.
+
+    The changes of a cell depend only on the cells within MAX_HOPS steps of it (the winds
+    reaching it, and the cells along their paths). The rules don't use random values, so a
+    cell, none of whose cells within MAX_HOPS steps changed in the last generation, makes
+    the same (lack of) change as in the last generation. Therefore the active cells are the
+    cells within MAX_HOPS steps of a changed cell (cities always change), and skipping all
+    the others gives the same world as a full sweep.
+    When more than ACTIVE_FRACTION of the cells are active, the whole grid is calculated.
+    """
+    def __init__(self, echoSystem, types):
+        """
+        Init function for class ActiveEngine.
+
+        :param echoSystem: the EchoSystem whose counters are updated.
+        :param types: (rows, columns) array of type codes (the index in array_engine.TYPES).
+        """
+        super().__init__(echoSystem, types)
+        self.active = None      # Flat indices of the active cells (None - all the cells)
+        self.sources = None     # Flat indices of the cells whose winds can reach the active cells
+        self.calculated = None  # The cells calculated in this generation (None - all the cells)
+        self.changed = None     # Flat indices of the cells the last applyChanges changed (None - not known)
+        self.first = np.empty(self.size, dtype=np.intp)    # Scratch array of spread
+
+    def setState(self, state, nextState):
+        """
+        Replaces the cell arrays and their calculated changes, all the cells become active.
+        """
+        super().setState(state, nextState)
+        self.active = None
+        self.changed = None
+
+    def spread(self, mask, frontier):
+        """
+        Adds the neighbors of the cells of a mask to it (the cells a wind reaches in one more step).
+
+        :param mask: bool array of the cells, updated in place.
+        :param frontier: flat indices of the cells added to the mask by the last step (None - not known).
+        :return: flat indices of the cells added by this step (None - not known).
+        """
+        if frontier is not None and len(frontier) * SPARSE < self.size:
+            around = self.neighbors[:, frontier].ravel()
+            around = around[~mask[around]]
+            # Keep the first of the repeated cells (without sorting them)
+            position = np.arange(len(around))
+            self.first[around] = position
+            frontier = around[self.first[around] == position]
+            mask[frontier] = True
+            return frontier
+
+        # Many cells - shift the whole grid in the four directions (the world is circular)
+        grid = mask.reshape(self.shape)
+        old = grid.copy()
+        grid[1:] |= old[:-1]
+        grid[:1] |= old[-1:]
+        grid[:-1] |= old[1:]
+        grid[-1:] |= old[:1]
+        grid[:, 1:] |= old[:, :-1]
+        grid[:, :1] |= old[:, -1:]
+        grid[:, :-1] |= old[:, 1:]
+        grid[:, -1:] |= old[:, :1]
+        return None
+
+    def calcChanges(self):
+        """
+        Calculate the changes of the active cells, with the winds of every cell which can reach them.
+        """
+        self.calculated = self.active
+        if self.active is None:
+            super().calcChanges()
+        else:
+            super().calcChanges(self.active, self.sources)
+
+    def applyChanges(self):
+        """
+        Update the changes of the cells which changed, they (and the cells around them) are
+        the active cells of the next generation.
+        """
+        cells = self.calculated
+        changed = None
+        for field in CHANGING:
+            current = getattr(self, field).ravel()
+            new = getattr(self, array_engine.NEXT_FIELDS[field]).ravel()
+            differs = current != new if cells is None else current[cells] != new[cells]
+            changed = differs if changed is None else changed | differs
+        changed = np.flatnonzero(changed) if cells is None else cells[changed]
+        self.changed = changed
+
+        # The next* arrays already hold the values of all the other cells
+        for field in CHANGING:
+            getattr(self, field).ravel()[changed] = getattr(self, array_engine.NEXT_FIELDS[field]).ravel()[changed]
+
+        if len(changed) > self.size * const.ACTIVE_FRACTION:
+            self.active = None
+            return
+        # The active cells are within MAX_HOPS steps of a changed cell, and the winds
+        # reaching them start within MAX_HOPS steps of an active cell
+        mask = np.zeros(self.size, dtype=bool)
+        mask[changed] = True
+        frontier = changed
+        for _ in range(array_engine.MAX_HOPS):
+            frontier = self.spread(mask, frontier)
+        self.active = np.flatnonzero(mask)
+        if len(self.active) > self.size * const.ACTIVE_FRACTION:
+            self.active = None
+            return
+        for _ in range(array_engine.MAX_HOPS):
+            frontier = self.spread(mask, frontier)
+        self.sources = np.flatnonzero(mask)
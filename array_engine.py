@@ -0,0 +1,631 @@
+import operator
+import random
+import numpy as np
+import cell
+import rules
+import constants as const
+
+# Integer codes used for the cell fields in the arrays (the same codes as in Cell)
+TYPES = cell.TYPES
+HEIGHTS = cell.HEIGHTS
+DIRECTIONS = cell.DIRECTIONS
+EARTH, SEA, GLACIER, CITY, FOREST = cell.EARTH, cell.SEA, cell.GLACIER, cell.CITY, cell.FOREST
+NORTH, EAST, SOUTH, WEST = cell.NORTH, cell.EAST, cell.SOUTH, cell.WEST
+
+# The arrays holding the state of the cells, their types and the Cell attribute holding their changes
+FIELDS = ["type", "height", "temperature", "pollution", "windSpeed", "windDirection", "clouds", "rain"]
+DTYPES = {"type": np.int8,
+          "height": np.int8,
+          "temperature": np.float64,
+          "pollution": np.int32,
+          "windSpeed": np.int32,
+          "windDirection": np.int8,
+          "clouds": bool,
+          "rain": bool}
+NEXT_FIELDS = {"type": "nextType",
+               "height": "height",      # The height never changes
+               "temperature": "nextTemperature",
+               "pollution": "nextPollution",
+               "windSpeed": "nextWindSpeed",
+               "windDirection": "nextWindDirection",
+               "clouds": "nextClouds",
+               "rain": "nextRain"}
+
+# Row and column offset of the neighbor in every direction
+OFFSETS = {NORTH: (-1, 0), EAST: (0, 1), SOUTH: (1, 0), WEST: (0, -1)}
+
+# TURN[d1][d2] is Cell.calcWindDirection for an origin blowing d1 into a destination blowing d2
+TURN = np.array(cell.TURN, dtype=np.int8)
+
+# Position of every write inside the calcChanges of a single cell.
+# Events are ordered by (source cell, step) - the order in which Cell objects make them.
+# The changes a rule makes to its own cell are made at the step of its index in rules.RULES.
+HOP_STEP = len(rules.RULES) # updateWind - first hop, every hop takes HOP_STEPS steps
+HOP_STEPS = 2               # destination writes, then origin writes
+MAX_HOPS = const.MAX_WIND_SPEED // 10
+WIND_STEP = HOP_STEP + MAX_HOPS * HOP_STEPS     # updateWind - the source slows down
+STEPS = WIND_STEP + 1
+
+
+def neighborTable(shape):
+    """
+    neighbors[direction] holds the flat index of the neighbor of every cell.
+    The world is circular, like in Cell.updateNeighbors.
+
+    :param shape: (rows, columns) of the world.
+    """
+    index = np.arange(shape[0] * shape[1]).reshape(shape)
+    neighbors = np.empty((len(DIRECTIONS), index.size), dtype=np.intp)
+    for direction, (dRow, dCol) in OFFSETS.items():
+        neighbors[direction] = np.roll(index, (-dRow, -dCol), axis=(0, 1)).ravel()
+    return neighbors
+
+
+def joinEvents(events, dtype, keep=None):
+    """
+    Joins (cells, order keys, values) event groups into three arrays.
+    A group value can be a single value for all its cells.
+
+    :param keep: bool array of the cells, only the events of the set cells are kept (None - all).
+    """
+    dest = np.concatenate([e[0] for e in events])
+    order = np.concatenate([e[1] for e in events])
+    values = np.concatenate([np.broadcast_to(np.asarray(e[2], dtype=dtype), e[0].shape) for e in events])
+    if keep is not None:
+        kept = keep[dest]
+        return dest[kept], order[kept], values[kept]
+    return dest, order, values
+
+
+def sortKey(dest, order):
+    """
+    :return: a single int64 key sorting events by cell and then by order key.
+    """
+    return dest.astype(np.int64) * (int(order.max()) + 1) + order
+
+
+def orderedClip(values, dest, order, delta, low, high, changed=None):
+    """
+    Adds every delta to values[dest], clamping to [low, high] after every addition.
+    The additions to a single cell are made in ascending order, like Cell.increasePollution
+    and Cell.increaseWindSpeed being called one after the other.
+
+    :param values: flat array to update in place.
+    :param dest: index of the updated cell for every event.
+    :param order: order key for every event (unique between the events of a cell).
+    :param delta: value to add for every event.
+    :param changed: bool array of the events, set for every event which changed the value of its cell
+                    (None - not marked).
+    """
+    if not len(dest):
+        return
+    if changed is not None:
+        # Events which can't reach a bound change their cell unless they add 0
+        changed[:] = delta != 0
+
+    # Cells which can't reach a bound in any order get a plain scatter-add
+    if len(dest) * 4 < len(values):
+        # Few events - the sums are taken over the updated cells only, not the whole grid
+        cells, slot = np.unique(dest, return_inverse=True)
+    else:
+        cells, slot = None, dest
+    base = values if cells is None else values[cells]
+    up = np.bincount(slot, weights=np.maximum(delta, 0), minlength=len(base))
+    down = np.bincount(slot, weights=np.minimum(delta, 0), minlength=len(base))
+    safe = (base + up <= high) & (base + down >= low)
+    values[safe if cells is None else cells[safe]] += (up + down)[safe].astype(values.dtype)
+    ordered = ~safe[slot]
+    if not ordered.any():
+        return
+    events = np.flatnonzero(ordered)
+    dest, order, delta = dest[ordered], order[ordered], delta[ordered]
+
+    perm = np.argsort(sortKey(dest, order))
+    dest = dest[perm]
+    delta = delta[perm]
+    events = events[perm]
+
+    # Rank of every event between the events of the same cell
+    first = np.flatnonzero(np.r_[True, dest[1:] != dest[:-1]])
+    counts = np.diff(np.r_[first, len(dest)])
+    rank = np.arange(len(dest)) - np.repeat(first, counts)
+
+    # Every round updates each cell at most once
+    byRank = np.argsort(rank, kind="stable")
+    bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+    for r in range(len(bounds) - 1):
+        sel = byRank[bounds[r]:bounds[r + 1]]
+        idx = dest[sel]
+        before = values[idx]
+        values[idx] = np.clip(before + delta[sel], low, high)
+        if changed is not None:
+            changed[events[sel]] = values[idx] != before
+
+
+def lastWrite(values, dest, order, new):
+    """
+    Assigns new values to values[dest]; when a cell is written several times the write
+    with the highest order key wins (the order keys of a cell must be unique).
+    """
+    if not len(dest):
+        return
+    latest = np.full(len(values), -1, dtype=order.dtype)
+    np.maximum.at(latest, dest, order)
+    won = order == latest[dest]
+    values[dest[won]] = new[won]
+
+
+def initialState(types):
+    """
+    Creates the cells of a world, drawing their random values in the same order as Cell.__init__,
+    so a seeded run starts from the same world in all the engines. The rows of a large world can
+    be created a block at a time, from the first block to the last.
+
+    :param types: (rows, columns) array of type codes (the index in TYPES).
+    :return: dict of field name to array, for every name in FIELDS.
+    """
+    shape = tuple(np.shape(types))
+    heights = []
+    directions = []
+    clouds = []
+    seaLevel = HEIGHTS.index("sea level")
+    for cellType in np.ravel(types).tolist():
+        directions.append(DIRECTIONS.index(random.choice(const.WIND_DIRECTIONS)))
+        if cellType == GLACIER or cellType == SEA:
+            heights.append(seaLevel)
+        else:
+            heights.append(HEIGHTS.index(random.choice(const.HEIGHTS)))
+        clouds.append(random.choice([True, False]))
+
+    state = {"type": np.array(types, dtype=DTYPES["type"]),
+             "height": np.array(heights, dtype=DTYPES["height"]).reshape(shape),
+             "windDirection": np.array(directions, dtype=DTYPES["windDirection"]).reshape(shape),
+             "clouds": np.array(clouds, dtype=bool).reshape(shape),
+             "rain": np.zeros(shape, dtype=bool),
+             "pollution": np.full(shape, const.INIT_POLLUTION, dtype=DTYPES["pollution"])}
+
+    heightTemps = np.array([const.HEIGHTS_TEMP[h] for h in HEIGHTS], dtype=np.float64)
+    state["temperature"] = heightTemps[state["height"]]
+    state["temperature"][state["type"] == GLACIER] = const.GLACIER_TEMP
+
+    windSpeeds = np.full(len(TYPES), 20, dtype=DTYPES["windSpeed"])
+    windSpeeds[GLACIER] = 10
+    windSpeeds[SEA] = 30
+    state["windSpeed"] = windSpeeds[state["type"]]
+    return state
+
+
+class ArrayEngine:
+    """
+    Structure-of-arrays version of the cells.
+    Every cell field is stored as a whole-grid NumPy array and the rules of Cell
+    are applied to all the cells at once.
+    """
+    def __init__(self, echoSystem, types):
+        """
+        Init function for class ArrayEngine.
+
+        :param echoSystem: the EchoSystem whose counters are updated.
+        :param types: (rows, columns) array of type codes (the index in TYPES).
+        """
+        self.echoSystem = echoSystem
+        self.shape = tuple(np.shape(types))
+        self.size = self.shape[0] * self.shape[1]
+        for field, array in initialState(types).items():
+            setattr(self, field, array)
+
+        self.neighbors = neighborTable(self.shape)
+        self.cellOrder = np.arange(self.size)      # Position of every cell in the row-major order of the world
+        self.resetChanges()
+
+    @classmethod
+    def fromState(cls, echoSystem, state, neighbors=None, cellOrder=None):
+        """
+        Creates an engine from existing cell arrays (no random values are drawn).
+
+        :param echoSystem: the EchoSystem whose counters are updated.
+        :param state: dict of field name to array, for every name in FIELDS.
+        :param neighbors: neighbors index table (None - a circular world of the state's shape).
+        :param cellOrder: position of every cell in the row-major order of the world the cells
+                          belong to, which orders their changes (None - the order of the state).
+        """
+        engine = cls.__new__(cls)
+        engine.echoSystem = echoSystem
+        for field in FIELDS:
+            setattr(engine, field, state[field])
+        engine.shape = engine.type.shape
+        engine.size = engine.type.size
+        engine.neighbors = neighborTable(engine.shape) if neighbors is None else neighbors
+        engine.cellOrder = np.arange(engine.size) if cellOrder is None else cellOrder
+        engine.resetChanges()
+        return engine
+
+    def state(self):
+        """
+        :return: dict of field name to array, for every name in FIELDS.
+        """
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def nextState(self):
+        """
+        :return: dict of field name to the array of its calculated changes, for every name in FIELDS.
+        """
+        return {field: getattr(self, NEXT_FIELDS[field]) for field in FIELDS}
+
+    def setState(self, state, nextState):
+        """
+        Replaces the cell arrays and their calculated changes.
+
+        :param state: dict of field name to array, for every name in FIELDS.
+        :param nextState: dict of field name to the array of its calculated changes.
+        """
+        for field in FIELDS:
+            setattr(self, field, np.array(state[field], dtype=DTYPES[field]))
+        for field in FIELDS:
+            if NEXT_FIELDS[field] != field:
+                setattr(self, NEXT_FIELDS[field], np.array(nextState[field], dtype=DTYPES[field]))
+
+    def resetChanges(self):
+        """
+        Starts the next* arrays from the current state.
+        """
+        self.nextType = self.type.copy()
+        self.nextWindSpeed = self.windSpeed.copy()
+        self.nextWindDirection = self.windDirection.copy()
+        self.nextPollution = self.pollution.copy()
+        self.nextTemperature = self.temperature.copy()
+        self.nextClouds = self.clouds.copy()
+        self.nextRain = self.rain.copy()
+
+    def calcChanges(self, cells=None, sources=None):
+        """
+        Calculate the changes of all the cells (Cell.calcChanges for the whole grid).
+
+        :param cells: flat indices of the cells whose changes are calculated (None - all the cells),
+                      the changes the winds make to other cells are dropped.
+        :param sources: flat indices of the cells whose winds are calculated (None - all the cells),
+                        they must include every cell whose wind reaches the calculated cells.
+        """
+        cellType = self.type.ravel()
+        fields = {field: getattr(self, field).ravel() for field in rules.CONDITION_FIELDS}
+        keep = None
+        if cells is not None:
+            cellType = cellType[cells]
+            fields = {field: values[cells] for field, values in fields.items()}
+            keep = np.zeros(self.size, dtype=bool)
+            keep[cells] = True
+        # Every rule is timed when the EchoSystem is profiled
+        profiler = getattr(self.echoSystem, "profiler", None)
+        mark = profiler.lap() if profiler is not None else None
+
+        order = self.cellOrder if cells is None else self.cellOrder[cells]
+        if mark:
+            events, eventNames, changed = self.profileRules(cellType, fields, cells, order, mark)
+        else:
+            events = self.applyRules(cellType, fields, cells, order)
+
+        reached = np.zeros(self.size, dtype=bool) if mark else None
+        events.append(self.calcWind(reached, sources, keep))
+        if mark:
+            mark("wind", np.count_nonzero(reached))
+
+        dest, order, delta = [np.concatenate(e) for e in zip(*events)]
+        moved = np.zeros(len(dest), dtype=bool) if mark else None
+        orderedClip(self.nextPollution.ravel(), dest, order, delta, const.MIN_POLLUTION, const.MAX_POLLUTION, moved)
+        if mark:
+            mark("pollutionEvents")
+            # The pollution a rule changed is only known once the events of the winds before it are merged
+            end = 0
+            for name, (cellsOf, _, _) in zip(eventNames, events):
+                start, end = end, end + len(cellsOf)
+                changed[name][cellsOf[moved[start:end]]] = True
+            for name, cellsOf in changed.items():
+                profiler.addRule(name, 0, 0, int(np.count_nonzero(cellsOf)))
+
+    def applyRules(self, cellType, fields, cells, order):
+        """
+        Applies all the rules at once, by looking up the key of every cell in the rule tables.
+
+        :param cellType: flat array of the type codes of the calculated cells.
+        :param fields: dict of field name to flat array of the calculated cells, for the fields of the conditions.
+        :param cells: flat indices of the calculated cells (None - all the cells).
+        :param order: the order of every calculated cell.
+        :return: list of the (destinations, orders, deltas) pollution events of the rules.
+        """
+        table = rules.arrayRules()
+        key = table.keys(cellType, fields)
+        self.nextType.ravel()[slice(None) if cells is None else cells] = table.nextType[key]
+        # Only the cells making the i-th change of their key look up its value
+        nextTemperature = self.nextTemperature.ravel()
+        for deltas, makes in zip(table.temperature, table.makesTemperature):
+            selected = np.flatnonzero(makes[key])
+            nextTemperature[selected if cells is None else cells[selected]] += deltas[key[selected]]
+        events = []
+        for deltas, steps, makes in zip(table.pollution, table.pollutionSteps, table.makesPollution):
+            selected = np.flatnonzero(makes[key])
+            made = key[selected]
+            events.append((selected if cells is None else cells[selected],
+                           order[selected] * STEPS + steps[made], deltas[made]))
+        counts = np.bincount(key, minlength=table.size)
+        for counter, change in zip(rules.COUNTERS, (counts @ table.counters).tolist()):
+            setattr(self.echoSystem, counter, getattr(self.echoSystem, counter) + change)
+        return events
+
+    def profileRules(self, cellType, fields, cells, order, mark):
+        """
+        Applies the rules one at a time, in order, like applyRules, timing every rule (with the rules after
+        it of the same name) with the profiler.
+
+        :param mark: the lap of the profiler.
+        :return: (list of the (destinations, orders, deltas) pollution events of the rules, the rule name of
+                 every one of them, dict of rule name to bool array of the cells whose type or temperature the
+                 rules of the name changed).
+        """
+        nextType = self.nextType.ravel()
+        nextTemperature = self.nextTemperature.ravel()
+        events = []
+        eventNames = []
+        changed = {}
+        for step, rule in enumerate(rules.RULES):
+            applies = rules.ruleMask(rule, cellType, fields)
+            if rule.get("else"):
+                applies &= ~chain
+                chain |= applies
+            else:
+                chain = applies.copy()  # The cells a rule of the chain was applied to
+            selected = np.flatnonzero(applies)
+            dest = selected if cells is None else cells[selected]
+            touched = changed.setdefault(rule["name"], np.zeros(self.size, dtype=bool))
+            if "nextType" in rule:
+                code = TYPES.index(rule["nextType"])
+                touched[dest[nextType[dest] != code]] = True
+                nextType[dest] = code
+            if "temperature" in rule:
+                before = nextTemperature[dest]
+                nextTemperature[dest] += rules.resolve(rule["temperature"])
+                touched[dest[nextTemperature[dest] != before]] = True
+            if "pollution" in rule:
+                events.append((dest, order[selected] * STEPS + step,
+                               np.full(len(selected), rules.resolve(rule["pollution"]), dtype=np.int32)))
+                eventNames.append(rule["name"])
+            for counter, change in rule.get("counters", {}).items():
+                setattr(self.echoSystem, counter, getattr(self.echoSystem, counter) + change * len(selected))
+            if step == len(rules.RULES) - 1 or rules.RULES[step + 1]["name"] != rule["name"]:
+                mark(rule["name"])
+        return events, eventNames, changed
+
+    def calcWind(self, reached=None, sources=None, keep=None):
+        """
+        Calculate the wind changes of all the cells (Cell.updateWind for the whole grid).
+        All the wind paths advance together, one hop at a time, using the neighbors index table.
+        The clouds, rain, wind speed and wind direction of the destinations are updated here.
+
+        :param reached: bool array of the cells, the (kept) cells reached by a wind are set (None - not marked).
+        :param sources: flat indices of the cells whose winds are calculated (None - all the cells).
+        :param keep: bool array of the cells, only the changes of the set cells are kept (None - all).
+        :return: the pollution events made by the wind, as (cells, order keys, deltas).
+        """
+        windDirection = self.windDirection.ravel()
+        pollution = self.pollution.ravel()
+        clouds = self.clouds.ravel()
+        rain = self.rain.ravel()
+
+        speedEvents = []
+        dirEvents = []
+        cloudEvents = []
+        rainDest = []
+        pollEvents = []
+
+        # Every cell blows its wind windSpeed/10 cells away
+        if sources is None:
+            sources = np.flatnonzero(self.windSpeed.ravel() >= 10)
+        else:
+            sources = sources[self.windSpeed.ravel()[sources] >= 10]
+        hops = self.windSpeed.ravel()[sources] // 10
+        origin = sources
+        direction = windDirection[sources]
+        for hop in range(MAX_HOPS):
+            alive = hops > hop
+            if not alive.all():
+                sources, hops, origin, direction = sources[alive], hops[alive], origin[alive], direction[alive]
+            if not len(sources):
+                break
+            dest = self.neighbors[direction, origin]
+            if reached is not None:
+                reached[dest if keep is None else dest[keep[dest]]] = True
+            step = self.cellOrder[sources] * STEPS + HOP_STEP + hop * HOP_STEPS
+
+            # Wind moves the clouds (and the rain) from the origin to the destination
+            cloudy = clouds[origin]
+            cloudEvents.append((dest[cloudy], step[cloudy], True))
+            cloudEvents.append((origin[cloudy], step[cloudy] + 1, False))
+            rainDest.append(dest[cloudy & rain[origin]])
+
+            # Wind increases the speed and changes the direction of the destination
+            speedEvents.append((dest, step, 10))
+            direction = TURN[windDirection[origin], windDirection[dest]]
+            dirEvents.append((dest, step, direction))
+
+            # Wind spreads the pollution of the source cell
+            lower = pollution[dest] < pollution[sources]
+            higher = pollution[dest] > pollution[sources]
+            pollEvents.append((dest[lower], step[lower], 5))
+            pollEvents.append((dest[higher], step[higher], -2))
+            origin = dest
+
+        # Every cell slows down its own wind after blowing it
+        cells = np.arange(self.size) if keep is None else np.flatnonzero(keep)
+        speedEvents.append((cells, self.cellOrder[cells] * STEPS + WIND_STEP, -10))
+
+        orderedClip(self.nextWindSpeed.ravel(), *joinEvents(speedEvents, np.int32, keep),
+                    const.MIN_WIND_SPEED, const.MAX_WIND_SPEED)
+        if dirEvents:
+            lastWrite(self.nextWindDirection.ravel(), *joinEvents(dirEvents, np.int8, keep))
+        if cloudEvents:
+            lastWrite(self.nextClouds.ravel(), *joinEvents(cloudEvents, bool, keep))
+        if rainDest:
+            rainDest = np.concatenate(rainDest)
+            self.nextRain.ravel()[rainDest if keep is None else rainDest[keep[rainDest]]] = True
+        if pollEvents:
+            return joinEvents(pollEvents, np.int32, keep)
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int32)
+
+    def applyChanges(self):
+        """
+        Update the changes that were calculated.
+        """
+        self.type = self.nextType
+        self.windSpeed = self.nextWindSpeed
+        self.windDirection = self.nextWindDirection
+        self.pollution = self.nextPollution
+        self.temperature = self.nextTemperature
+        self.rain = self.nextRain
+        self.clouds = self.nextClouds
+        self.resetChanges()
+
+    def view(self):
+        """
+        :return: rows of CellView objects, with the same layout as EchoSystem.world.
+        """
+        return WorldView(self)
+
+
+class WorldView:
+    """
+    Rows of CellView objects of an engine (world[row][col]), created on demand.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __len__(self):
+        return self.engine.shape[0]
+
+    def __getitem__(self, row):
+        return RowView(self.engine, range(self.engine.shape[0])[row])
+
+
+class RowView:
+    """
+    A row of CellView objects of an engine.
+    """
+    def __init__(self, engine, row):
+        self.engine = engine
+        self.row = row
+
+    def __len__(self):
+        return self.engine.shape[1]
+
+    def __getitem__(self, col):
+        return CellView(self.engine, (self.row, range(self.engine.shape[1])[col]))
+
+
+class CellView:
+    """
+    Read-only Cell-like view of a single cell of an ArrayEngine (used by the Gui).
+    """
+    __slots__ = ("engine", "coordinates")
+
+    def __init__(self, engine, coordinates):
+        self.engine = engine
+        self.coordinates = coordinates
+
+    @property
+    def type(self):
+        return TYPES[self.engine.type[self.coordinates]]
+
+    @property
+    def height(self):
+        return HEIGHTS[self.engine.height[self.coordinates]]
+
+    @property
+    def temperature(self):
+        return float(self.engine.temperature[self.coordinates])
+
+    @property
+    def pollution(self):
+        return int(self.engine.pollution[self.coordinates])
+
+    @property
+    def windSpeed(self):
+        return int(self.engine.windSpeed[self.coordinates])
+
+    @property
+    def windDirection(self):
+        return DIRECTIONS[self.engine.windDirection[self.coordinates]]
+
+    @property
+    def clouds(self):
+        return bool(self.engine.clouds[self.coordinates])
+
+    @property
+    def rain(self):
+        return bool(self.engine.rain[self.coordinates])
+
+
+# The values of the fields stored as codes
+FIELD_CODES = {"type": TYPES, "height": HEIGHTS, "windDirection": DIRECTIONS}
+
+
+def cellsState(world, changes=False):
+    """
+    Packs the fields of Cell objects into arrays.
+
+    :param world: rows of Cell objects.
+    :param changes: if True, the calculated changes (the next* attributes) are packed.
+    :return: dict of field name to array, for every name in FIELDS.
+    """
+    cells = [c for row in world for c in row]
+    state = {}
+    for field in FIELDS:
+        attribute = NEXT_FIELDS[field] if changes else field
+        if field in FIELD_CODES:
+            # The integer code Cell keeps for the field (typeCode etc.), not its string property
+            attribute += "Code"
+        values = np.fromiter(map(operator.attrgetter(attribute), cells), dtype=DTYPES[field], count=len(cells))
+        state[field] = values.reshape(len(world), -1)
+    return state
+
+
+def setCellsState(world, state, nextState):
+    """
+    Sets the fields of Cell objects from arrays.
+
+    :param world: rows of Cell objects.
+    :param state: dict of field name to array, for every name in FIELDS.
+    :param nextState: dict of field name to the array of the calculated changes.
+    """
+    for field in FIELDS:
+        for attribute, values in ((field, state[field]), (NEXT_FIELDS[field], nextState[field])):
+            if field in FIELD_CODES:
+                codes = FIELD_CODES[field]
+                values = [[codes[value] for value in row] for row in values.tolist()]
+            else:
+                values = values.tolist()
+            for row, rowValues in zip(world, values):
+                for c, value in zip(row, rowValues):
+                    setattr(c, attribute, value)
+
+
+class ConformanceError(AssertionError):
+    """
+    Raised when the arrays engine and the Cell objects disagree.
+    """
+
+
+def compareWorld(engine, world):
+    """
+    Compares the state of an ArrayEngine with a world of Cell objects.
+
+    :param engine: the ArrayEngine.
+    :param world: rows of Cell objects.
+    :return: list of differences as (coordinates, field, cell value, array value).
+    """
+    differences = []
+    for field in ("type", "height", "temperature", "pollution", "windSpeed", "windDirection", "clouds", "rain"):
+        for row in world:
+            for c in row:
+                expected = getattr(c, field)
+                actual = getattr(CellView(engine, c.coordinates), field)
+                if expected != actual:
+                    differences.append((c.coordinates, field, expected, actual))
+    return differences
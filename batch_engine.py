@@ -0,0 +1,141 @@
+import random
+import numpy as np
+import constants as const
+import array_engine
+import rules
+import stats
+import world_file
+from tiled_engine import _Counters
+
+
+class BatchEngine:
+    """
+    Many independent worlds of the same map, stacked into the arrays of a single ArrayEngine.
+    The members are stacked one under the other, and their neighbor tables only link cells of the
+    same member, so a generation of all of them is a single calcChanges of the stacked arrays.
+    Member i starts like an "arrays" EchoSystem created after random.seed(seeds[i]), and its
+    cells and counters stay the same as that world's.
+    """
+    def __init__(self, echoSystem, types, seeds):
+        """
+        Init function for class BatchEngine.
+
+        :param echoSystem: the EchoBatch whose (per-member) counters are updated.
+        :param types: (rows, columns) array of type codes (the index in array_engine.TYPES).
+        :param seeds: the seed of every member.
+        """
+        self.echoSystem = echoSystem
+        self.members = len(seeds)
+        self.shape = (self.members,) + tuple(np.shape(types))
+        self.size = int(np.prod(self.shape[1:]))
+
+        # The random values of every member are drawn like in ArrayEngine, after seeding
+        states = []
+        for seed in seeds:
+            random.seed(seed)
+            states.append(array_engine.initialState(types))
+        state = {field: np.concatenate([s[field] for s in states]) for field in array_engine.FIELDS}
+
+        # The neighbors of a member's cells are the neighbors in its own (circular) world
+        table = array_engine.neighborTable(self.shape[1:])
+        offsets = np.arange(self.members) * self.size
+        neighbors = (table[:, None, :] + offsets[None, :, None]).reshape(len(table), -1)
+        self.engine = array_engine.ArrayEngine.fromState(_Counters(), state, neighbors)
+
+    def field(self, name):
+        """
+        :param name: the name of a field (see array_engine.FIELDS).
+        :return: (members, rows, columns) view of the field.
+        """
+        return getattr(self.engine, name).reshape(self.shape)
+
+    def state(self):
+        """
+        :return: dict of field name to (members, rows, columns) array, for every name in array_engine.FIELDS.
+        """
+        return {field: self.field(field) for field in array_engine.FIELDS}
+
+    def member(self, index):
+        """
+        :return: dict of field name to the (rows, columns) array of a member, for every name in array_engine.FIELDS.
+        """
+        return {field: self.field(field)[index] for field in array_engine.FIELDS}
+
+    def calcChanges(self):
+        """
+        Calculate the changes of all the members, and update the counters of every member.
+        """
+        self.engine.calcChanges()
+        cellType = self.engine.type.reshape(self.members, -1)
+        nextType = self.engine.nextType.reshape(self.members, -1)
+        for counter, change in zip(rules.COUNTERS, rules.countChanges(cellType, nextType, axis=1)):
+            setattr(self.echoSystem, counter, getattr(self.echoSystem, counter) + change)
+
+    def applyChanges(self):
+        """
+        Update the changes that were calculated.
+        """
+        self.engine.applyChanges()
+
+
+class EchoBatch:
+    """
+    An ensemble of EchoSystems of the same world stepped together (see BatchEngine), for ensemble
+    studies: the cost of a generation is paid once for all the members instead of once per member.
+    The counters are vectors with a value for every member, and stats[i] and totals[i] are the
+    stats and totals of member i, the same as those of its own EchoSystem.
+    """
+    def __init__(self, seeds, worldFile=const.WORLD_FILE, types=None):
+        """
+        :param seeds: the seed of every member.
+        :param worldFile: the world file (text or binary, see world_file.py).
+        :param types: array of cell type codes to use instead of the world file's cells.
+        """
+        if types is None:
+            types = world_file.readWorld(worldFile)
+        self.seeds = list(seeds)
+        self.members = len(self.seeds)
+        self.worldFile = worldFile
+        self.generation = 0     # Keeps count on the cells generations
+        self.stats = [{} for _ in self.seeds]       # Stores data about every member's world
+        self.totals = [{"temp": stats.RunningStats(), "pollution": stats.RunningStats()} for _ in self.seeds]
+
+        counts = np.bincount(np.ravel(types), minlength=len(array_engine.TYPES))
+        self.forests = np.full(self.members, counts[array_engine.FOREST], dtype=np.int64)
+        self.sea = np.full(self.members, counts[array_engine.SEA], dtype=np.int64)
+        self.glaciers = np.full(self.members, counts[array_engine.GLACIER], dtype=np.int64)
+        self.arrays = BatchEngine(self, types, self.seeds)
+
+    def updateWorld(self):
+        """
+        Updates the worlds of all the members.
+        """
+        self.calcStats()
+        self.generation += 1
+        self.arrays.calcChanges()
+        self.arrays.applyChanges()
+
+    def calcStats(self):
+        """
+        Update the data dict of every member (see EchoSystem.calcStats), and the totals of every member.
+        """
+        temps = stats.RunningStats.fromRows(self.arrays.field("temperature").reshape(self.members, -1))
+        pollutions = stats.RunningStats.fromRows(self.arrays.field("pollution").reshape(self.members, -1))
+        types = self.arrays.field("type").reshape(self.members, -1)
+        # The type counts of all the members in one bincount, member i's codes shifted by i * len(TYPES)
+        shift = np.arange(self.members)[:, None] * len(array_engine.TYPES)
+        counts = np.bincount((types + shift).ravel(), minlength=self.members * len(array_engine.TYPES))
+        counts = counts.reshape(self.members, -1).tolist()
+
+        forests, sea, glaciers = self.forests.tolist(), self.sea.tolist(), self.glaciers.tolist()
+        for i in range(self.members):
+            self.totals[i]["temp"].merge(temps[i])
+            self.totals[i]["pollution"].merge(pollutions[i])
+            data = {}
+            data["temp"] = temps[i].summary()
+            data["pollution"] = pollutions[i].summary()
+            data["types"] = dict(zip(const.CELL_TYPES, counts[i]))
+            data["forests"] = forests[i]
+            data["sea"] = sea[i]
+            data["glaciers"] = glaciers[i]
+            self.stats[i][self.generation] = data
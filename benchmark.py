@@ -0,0 +1,254 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import array_engine
+import constants as const
+import world_file
+from echo_system import EchoSystem
+
+SIZES = [40, 100, 200]
+GENERATIONS = 20
+REPEAT = 3              # Every case is run this many times, and the fastest run is kept
+TOLERANCE = 0.1         # A metric more than 10% worse than the baseline is a regression
+
+# Per-generation phases timed by every case (the lower the better)
+PHASES = ["calcChanges", "applyChanges", "calcStats", "updateCanvas"]
+
+
+def generateWorld(size, path, seed=0):
+    """
+    Generates a random square world with the cell type proportions of world.dat and writes it
+    in the binary format.
+
+    :param size: number of rows and columns.
+    :param path: path of the generated world file.
+    :param seed: seed of the generated cells.
+    """
+    counts = np.bincount(world_file.readWorld(const.WORLD_FILE).ravel(), minlength=len(array_engine.TYPES))
+    rng = np.random.default_rng(seed)
+    types = rng.choice(len(array_engine.TYPES), size=(size, size), p=counts / counts.sum())
+    world_file.writeBinary(types, path)
+
+
+class _NullCanvas:
+    """
+    Canvas which only counts the calls (updateCanvas without a display).
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def create_rectangle(self, *args, **kwargs):
+        self.calls += 1
+        return self.calls
+
+    def create_text(self, *args, **kwargs):
+        self.calls += 1
+        return self.calls
+
+    def itemconfig(self, *args, **kwargs):
+        self.calls += 1
+
+    def winfo_rgb(self, color):
+        return 0, 0, 0
+
+
+class _NullImage:
+    """
+    PhotoImage which ignores the image data.
+    """
+    def configure(self, **kwargs):
+        pass
+
+
+def headlessGui(echoSystem):
+    """
+    :return: a Gui displaying the EchoSystem on a canvas which draws nothing, or None if tkinter
+             or matplotlib are not installed.
+    """
+    try:
+        import gui
+    except ImportError:
+        return None
+
+    class HeadlessGui(gui.Gui):
+        def createImage(self, data):
+            return _NullImage()
+
+    return HeadlessGui(echoSystem=echoSystem, canvas=_NullCanvas())
+
+
+def runCase(engine, worldFile, generations):
+    """
+    Times a single engine on a single world (in its own process, so the peak RSS is its own).
+
+    :return: dict of the results.
+    """
+    start = time.perf_counter()
+    random.seed(0)
+    echoSystem = EchoSystem(engine, worldFile=worldFile)
+    createWorld = time.perf_counter() - start
+
+    # The phases of EchoSystem.updateWorld, timed one by one
+    times = dict.fromkeys(PHASES, 0.0)
+    try:
+        view = headlessGui(echoSystem)
+        for _ in range(generations):
+            start = time.perf_counter()
+            echoSystem.calcStats()
+            echoSystem.generation += 1
+            calcStats = time.perf_counter()
+            echoSystem.calcChanges()
+            calcChanges = time.perf_counter()
+            echoSystem.applyChanges()
+            applyChanges = time.perf_counter()
+            if view is not None:
+                view.updateCanvas(new=False)
+            updateCanvas = time.perf_counter()
+            times["calcStats"] += calcStats - start
+            times["calcChanges"] += calcChanges - calcStats
+            times["applyChanges"] += applyChanges - calcChanges
+            times["updateCanvas"] += updateCanvas - applyChanges
+    finally:
+        # Stops the worker processes and frees the shared memory of the tiles engine, even if a case fails
+        echoSystem.close()
+
+    cells = echoSystem.arrays.size if echoSystem.arrays is not None else sum(len(row) for row in echoSystem.world)
+    step = times["calcStats"] + times["calcChanges"] + times["applyChanges"]
+    result = {"engine": engine,
+              "cells": cells,
+              "generations": generations,
+              "createWorld": createWorld,
+              "generationsPerSec": generations / step,
+              "nsPerCell": step / generations / cells * 1e9,
+              "peakRssKb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    for phase in PHASES:
+        skipped = view is None and phase == "updateCanvas"
+        result[phase + "NsPerCell"] = None if skipped else times[phase] / generations / cells * 1e9
+    return result
+
+
+def _caseProcess(connection, engine, worldFile, generations):
+    """
+    Runs a case in a child process and sends its results (or its error) back.
+    """
+    try:
+        connection.send(runCase(engine, worldFile, generations))
+    except Exception as error:
+        connection.send({"engine": engine, "error": repr(error)})
+    connection.close()
+
+
+def runBenchmarks(sizes=SIZES, engines=const.ENGINES, generations=GENERATIONS, repeat=REPEAT):
+    """
+    Runs every engine on a generated world of every size, every run of a case in a new process.
+    The fastest run of every case is kept, the others are mostly noise of the machine.
+
+    :return: list of the results of the cases.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            worldFile = os.path.join(directory, "world{}.bin".format(size))
+            generateWorld(size, worldFile)
+            for engine in engines:
+                runs = []
+                for _ in range(repeat):
+                    receiver, sender = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(target=_caseProcess,
+                                                      args=(sender, engine, worldFile, generations))
+                    process.start()
+                    # Only the child holds the sending end, so a child dying without a result ends the pipe
+                    sender.close()
+                    try:
+                        runs.append(receiver.recv())
+                    except EOFError:
+                        process.join()
+                        runs.append({"engine": engine, "error": "the case process exited with code {}".format(
+                            process.exitcode)})
+                    receiver.close()
+                    process.join()
+                result = max(runs, key=lambda r: r.get("generationsPerSec", 0))
+                result["size"] = size
+                results.append(result)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compares results with the results of a baseline run.
+
+    :param results: list of results of runBenchmarks.
+    :param baseline: list of results of an earlier run.
+    :param tolerance: relative slowdown allowed before a metric is a regression.
+    :return: list of regressions as (engine, size, metric, baseline value, new value).
+    """
+    regressions = []
+    previous = {(r["engine"], r["size"]): r for r in baseline}
+    for result in results:
+        old = previous.get((result["engine"], result["size"]))
+        if old is None or "error" in old or "error" in result:
+            continue
+        for metric in ["createWorld", "nsPerCell"] + [phase + "NsPerCell" for phase in PHASES]:
+            if old.get(metric) and result.get(metric) and result[metric] > old[metric] * (1 + tolerance):
+                regressions.append((result["engine"], result["size"], metric, old[metric], result[metric]))
+    return regressions
+
+
+def printResults(results):
+    """
+    Prints a table of the results.
+    """
+    print("{:>8} {:>6} {:>12} {:>10} {:>12} {:>12} {:>12}".format(
+        "engine", "size", "gens/sec", "ns/cell", "createWorld", "updateCanvas", "peak RSS MB"))
+    for r in results:
+        if "error" in r:
+            print("{:>8} {:>6}   failed: {}".format(r["engine"], r["size"], r["error"]))
+            continue
+        canvas = "-" if r["updateCanvasNsPerCell"] is None else "{:.1f}".format(r["updateCanvasNsPerCell"])
+        print("{:>8} {:>6} {:>12.1f} {:>10.1f} {:>12.4f} {:>12} {:>12.1f}".format(
+            r["engine"], r["size"], r["generationsPerSec"], r["nsPerCell"], r["createWorld"], canvas,
+            r["peakRssKb"] / 1024))
+
+
+def main(args=None):
+    """
+    Command line interface of the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the engines of the ecosystem cellular automaton.")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=SIZES,
+                        help="sizes of the generated worlds (default: %(default)s)")
+    parser.add_argument("-e", "--engines", nargs="+", choices=const.ENGINES, default=const.ENGINES,
+                        help="engines to benchmark (default: all)")
+    parser.add_argument("-g", "--generations", type=int, default=GENERATIONS,
+                        help="generations timed in every case (default: %(default)s)")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT,
+                        help="runs of every case, the fastest is kept (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="JSON file the results are written to")
+    parser.add_argument("-b", "--baseline", help="JSON file of earlier results to compare with")
+    parser.add_argument("-t", "--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown flagged as a regression (default: %(default)s)")
+    options = parser.parse_args(args)
+
+    results = runBenchmarks(options.sizes, options.engines, options.generations, options.repeat)
+    printResults(results)
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for engine, size, metric, old, new in regressions:
+            print("REGRESSION {} size {}: {} {:.4g} -> {:.4g}".format(engine, size, metric, old, new))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
 import random
 import constants as const
+import rules
+
+
+# Integer codes of the cell types, heights and wind directions (their index in these lists)
+TYPES = list(const.CELL_TYPES)
+HEIGHTS = list(const.HEIGHTS)
+DIRECTIONS = list(const.WIND_DIRECTIONS)
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+HEIGHT_CODES = {name: code for code, name in enumerate(HEIGHTS)}
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+EARTH, SEA, GLACIER, CITY, FOREST = [TYPE_CODES[t] for t in ("earth", "sea", "glacier", "city", "forest")]
+NORTH, EAST, SOUTH, WEST = [DIRECTION_CODES[d] for d in ("north", "east", "south", "west")]
+
+# TURN[d1][d2] is the wind direction in a destination blowing d2 reached by a wind from an origin blowing d1
+_turns = {(NORTH, SOUTH): EAST, (SOUTH, NORTH): WEST, (EAST, WEST): NORTH, (WEST, EAST): SOUTH}
+TURN = tuple(tuple(_turns.get((d1, d2), d1) for d2 in range(len(DIRECTIONS))) for d1 in range(len(DIRECTIONS)))
 
 
 class Cell:
     """
     Class representing a cell int he EchoSystem
+    The type, height and wind direction are stored as integer codes, and exposed by name.
     """
+    __slots__ = ("echoSystem", "coordinates", "typeCode", "heightCode", "windDirectionCode", "pollution",
+                 "temperature", "windSpeed", "clouds", "rain", "neighbors",
+                 "nextTypeCode", "nextWindSpeed", "nextWindDirectionCode", "nextPollution", "nextTemperature",
+                 "nextClouds", "nextRain")
+
     def __init__(self, echoSystem, coordinates, cellType):
         """
         Init function for class Cell
@@ -15,16 +37,16 @@ class Cell:
         self.type = cellType                                        # Cell type (sea, forest etc.)
         self.windDirection = random.choice(const.WIND_DIRECTIONS)   # Wind direction (north, south-west, etc)
         self.pollution = const.INIT_POLLUTION                       # Pollution rate in the cell
-        self.neighbors = {}                                         # the neighbors and their locations
+        self.neighbors = ()                                         # the neighbors, by wind direction code
 
         # A glacier is created with temp -20, sea level height and 10 winds speed
-        if self.type == "glacier":
+        if self.typeCode == GLACIER:
             self.temperature = const.GLACIER_TEMP
             self.height = "sea level"
             self.windSpeed = 10
 
         # A sea is created with sea level height and 39 wind speed
-        elif self.type == "sea":
+        elif self.typeCode == SEA:
             self.height = "sea level"
             self.temperature = const.HEIGHTS_TEMP[self.height]
             self.windSpeed = 30
@@ -41,130 +63,134 @@ class Cell:
             self.rain = random.choice([True, False])
 
         # These variables are storing the cell changes
-        self.nextType = self.type
+        self.nextTypeCode = self.typeCode
         self.nextWindSpeed = self.windSpeed
-        self.nextWindDirection = self.windDirection
+        self.nextWindDirectionCode = self.windDirectionCode
         self.nextPollution = self.pollution
         self.nextTemperature = self.temperature
         self.nextClouds = self.clouds
         self.nextRain = self.rain
 
+    @property
+    def type(self):
+        return TYPES[self.typeCode]
+
+    @type.setter
+    def type(self, value):
+        self.typeCode = TYPE_CODES[value]
+
+    @property
+    def nextType(self):
+        return TYPES[self.nextTypeCode]
+
+    @nextType.setter
+    def nextType(self, value):
+        self.nextTypeCode = TYPE_CODES[value]
+
+    @property
+    def height(self):
+        return HEIGHTS[self.heightCode]
+
+    @height.setter
+    def height(self, value):
+        self.heightCode = HEIGHT_CODES[value]
+
+    @property
+    def windDirection(self):
+        return DIRECTIONS[self.windDirectionCode]
+
+    @windDirection.setter
+    def windDirection(self, value):
+        self.windDirectionCode = DIRECTION_CODES[value]
+
+    @property
+    def nextWindDirection(self):
+        return DIRECTIONS[self.nextWindDirectionCode]
+
+    @nextWindDirection.setter
+    def nextWindDirection(self, value):
+        self.nextWindDirectionCode = DIRECTION_CODES[value]
+
     def updateNeighbors(self):
         """
-        Updated neighbors dict.
+        Updated neighbors tuple (indexed by wind direction code).
         The world is circular (the north continues to the south, the east continues to the west).
         """
+        neighbors = {}
         row, col = self.coordinates
+        rows = len(self.echoSystem.world)
+        cols = len(self.echoSystem.world[row])
         if row > 0:
-            self.neighbors["north"] = self.echoSystem.world[row-1][col]
+            neighbors[NORTH] = self.echoSystem.world[row-1][col]
         else:
-            self.neighbors["north"] = self.echoSystem.world[const.WORLD_SIZE-1][col]
+            neighbors[NORTH] = self.echoSystem.world[rows-1][col]
 
         if col > 0:
-            self.neighbors["west"] = self.echoSystem.world[row][col-1]
+            neighbors[WEST] = self.echoSystem.world[row][col-1]
         else:
-            self.neighbors["west"] = self.echoSystem.world[row][const.WORLD_SIZE-1]
+            neighbors[WEST] = self.echoSystem.world[row][cols-1]
 
-        if row < const.WORLD_SIZE-1:
-            self.neighbors["south"] = self.echoSystem.world[row+1][col]
+        if row < rows-1:
+            neighbors[SOUTH] = self.echoSystem.world[row+1][col]
         else:
-            self.neighbors["south"] = self.echoSystem.world[0][col]
+            neighbors[SOUTH] = self.echoSystem.world[0][col]
 
-        if col < const.WORLD_SIZE-1:
-            self.neighbors["east"] = self.echoSystem.world[row][col + 1]
+        if col < cols-1:
+            neighbors[EAST] = self.echoSystem.world[row][col + 1]
         else:
-            self.neighbors["east"] = self.echoSystem.world[row][0]
+            neighbors[EAST] = self.echoSystem.world[row][0]
+        self.neighbors = tuple(neighbors[direction] for direction in range(len(DIRECTIONS)))
 
     def calcChanges(self):
         """
-        Calculate the changes in the cells.
+        Calculate the changes in the cells: the rules (see rules.RULES), then the wind.
         """
+        rules.applyCellRules(self)
+        self.updateWind()
 
-        if self.type == "city":
-            self.updateCity()
-
-        elif self.type == "forest":
-            self.updateForest()
-
-        elif self.type == "glacier":
-            self.updateGlacier()
-
-        if self.type == "sea":
-            self.updateSea()
+    def profileChanges(self, profiler, reached):
+        """
+        Calculate the changes in the cells like calcChanges, timing the rules and the wind with the profiler.
 
-        if self.rain:
-            self.updateRain()
+        :param profiler: the Profiler the rules are added to.
+        :param reached: set the cells reached by the wind are added to.
+        """
+        rules.profileCellRules(self, profiler)
+        profiler.rule("wind", self.updateWind)
+        reached.update(self.windPath())
 
-        self.updatePollution()
-        self.updateWind()
+    def windPath(self):
+        """
+        :return: list of the cells the wind of the cell reaches (the path of updateWind).
+        """
+        path = []
+        originCell = self
+        direction = self.windDirectionCode
+        for _ in range(int(self.windSpeed/10)):
+            destCell = originCell.neighbors[direction]
+            direction = TURN[originCell.windDirectionCode][destCell.windDirectionCode]
+            path.append(destCell)
+            originCell = destCell
+        return path
 
     def applyChanges(self):
         """
         Update the changes that were calculated.
         """
-        self.type = self.nextType
+        self.typeCode = self.nextTypeCode
         self.windSpeed = self.nextWindSpeed
-        self.windDirection = self.nextWindDirection
+        self.windDirectionCode = self.nextWindDirectionCode
         self.pollution = self.nextPollution
         self.temperature = self.nextTemperature
         self.rain = self.nextRain
         self.clouds = self.nextClouds
 
-    def updateCity(self):
-        """
-        City increases pollution by 5%
-        """
-        self.increasePollution(5)
-
-    def updatePollution(self):
-        """
-        If pollution in cell is above 50% - the temperature is increased by 0.3 degrees.
-        If temperature is lower than 10 - the pollution is decreased bu 2%.
-        """
-        if self.pollution > 50:
-            self.nextTemperature += 0.3
-        if self.temperature < 10:
-            self.increasePollution(-2)
-
-    def updateSea(self):
-        """
-        If the sea temperature is higher than 100 - it becomes earth.
-        If the sea temperature is less than -10 - it becomes a glacier.
-        """
-        if self.temperature > 100:
-            self.nextType = "earth"
-            self.echoSystem.sea -= 1
-        elif self.temperature < -10:
-            self.nextType = "glacier"
-            self.echoSystem.sea -= 1
-            self.echoSystem.glaciers += 1
-
-    def updateForest(self):
-        """
-        If temperature reaches 60 or pollution is 100% - forest turns to earth.
-        Forest reduces pollution by 5%.
-        """
-        if self.temperature >= 60 or self.pollution >= 100:
-            self.nextType = "earth"
-            self.echoSystem.forests -= 1
-        else:
-            self.increasePollution(-2)
-
-    def updateGlacier(self):
-        """
-        If temperature reaches 0 or pollution is 100% - glacier turns into sea.
-        """
-        if self.temperature > 0 or self.pollution >= 100:
-            self.nextType = "sea"
-            self.echoSystem.sea += 1
-            self.echoSystem.glaciers -= 1
-
     def updateWind(self):
         """
         Update the wind speed & direction, pollution, clouds and rain of the neighbor cells.
         """
         originCell = self
-        direction = self.windDirection
+        direction = self.windDirectionCode
         i = 1
         # A cell distributes the wind to the neighbor cells according to its wind speed and direction
         while i <= int(self.windSpeed/10):
@@ -181,8 +207,8 @@ class Cell:
             destCell.increaseWindSpeed(10)
 
             # Change wind direction of the destination cell
-            direction = self.calcWindDirection(originCell, destCell)
-            destCell.nextWindDirection = direction
+            direction = TURN[originCell.windDirectionCode][destCell.windDirectionCode]
+            destCell.nextWindDirectionCode = direction
 
             # Wind distributes pollution
             if destCell.pollution < self.pollution:
@@ -198,25 +224,7 @@ class Cell:
         Calculates the new wind direction in the destination cell.
         :return: The new wind direction.
         """
-        direction1 = cell1.windDirection
-        direction2 = cell2.windDirection
-        if direction1 == "north" and direction2 == "south":
-            return "east"
-        elif direction1 == "south" and direction2 == "north":
-            return "west"
-        elif direction1 == "east" and direction2 == "west":
-            return "north"
-        elif direction1 == "west" and direction2 == "east":
-            return "south"
-        else:
-            return direction1
-
-    def updateRain(self):
-        """
-        Rain reduces pollution by 2%.
-        """
-        self.increasePollution(-2)
-        self.nextTemperature -= 0.1
+        return DIRECTIONS[TURN[cell1.windDirectionCode][cell2.windDirectionCode]]
 
     def increaseWindSpeed(self, value):
         """
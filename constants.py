@@ -1,14 +1,21 @@
 # World constants
-WORLD_SIZE = 40
 CELL_TYPES = {"earth": "saddle brown",
               "sea": "deep sky blue",
               "glacier": "snow",
               "city": "gold",
               "forest": "forest green"}
 WORLD_FILE = "world.dat"
-WORLD_CELLS = ["E", "S", "F", "C", "G"]
+WORLD_CELLS = {"E": "earth",                # The letters of the cell types in the world file
+               "S": "sea",
+               "F": "forest",
+               "C": "city",
+               "G": "glacier"}
 CELL_SIZE = 20
 REFRESH_RATE = 1
+REPLAY_RATE = 50            # Milliseconds between two generations of a replay
+FRAME_TIME = 40             # Milliseconds of generations calculated between two displayed frames
+MAX_CANVAS_CELLS = 10000    # Larger worlds are displayed as a single image
+MAX_IMAGE_SIZE = 1000       # Maximal width and height of that image in pixels
 STOP_GEN = 365
 
 # Temperature constants
@@ -23,10 +30,40 @@ MAX_POLLUTION = 100
 MIN_POLLUTION = 0
 INIT_POLLUTION = 0
 
+# Rule constants (the changes a cell makes every generation)
+CITY_POLLUTION = 5          # A city increases its pollution
+FOREST_POLLUTION = -2       # A forest reduces its pollution
+RAIN_POLLUTION = -2         # Rain reduces the pollution
+RAIN_TEMP = -0.1            # Rain cools the cell
+POLLUTION_HEAT = 0.3        # High pollution (above 50) heats the cell
+
 # Wind constants
 WIND_SPEEDS = [0, 10, 20, 30]
 WIND_DIRECTIONS = ["north", "east", "south", "west"]
 MAX_WIND_SPEED = 30
 MIN_WIND_SPEED = 0
 
+# Statistics constants
+STATS_SNAPSHOTS = 0     # Number of recent generations whose cell values are kept (0 - none)
+PROFILE_HISTORY = 1000  # Number of recent generations whose profile records are kept
+SERIES_CHUNK_BYTES = 1 << 22    # Size of the rows of a series buffered before they are written
+HISTORY_KEYFRAMES = 100         # Every this many generations, a history records the whole cells
+HISTORY_LEVEL = 1               # zlib compression level of the history records
+REGIONS_REFRESH = 100           # Every this many generations, the region aggregates are recalculated
+NO_REGION = "."                 # The label of the cells outside the regions of a label file
+
+# Engine constants
+ENGINES = ["cells", "arrays", "tiles", "active", "packed"]
+ENGINE = "cells"
+TILES = 4               # Number of row tiles (worker processes) of the "tiles" engine
+ACTIVE_FRACTION = 0.5   # The "active" engine steps the whole grid when more of the cells are active
+PACKED_STRIP_CELLS = 1 << 18   # Number of cells the "packed" engine steps at once
 
+# Streaming constants
+STREAM_HOST = "127.0.0.1"   # The streaming server only accepts local connections by default
+STREAM_PORT = 8765
+STREAM_FRAME_TIME = 40      # Milliseconds of generations calculated between two streamed frames
+STREAM_AGGREGATES = 1000    # Number of recent generations whose aggregates a client joining or lagging is sent
+# Sweep constants
+SWEEP_CACHE_DIR = "sweep-cache"     # Directory of the cached results of the parameter sweeps
+SWEEP_CACHE_BYTES = 1 << 30         # The least recently used results are evicted above this size
@@ -1,53 +1,113 @@
+import hashlib
+import json
+import random
 import cell
+import array_engine
+import tiled_engine
+import active_engine
+import packed_engine
+import world_file
+import stats
+import profiler as prof
+import series_file
+import history_file
+import regions as region_stats
 import constants as const
-import tkinter as tk
-from statistics import stdev
-import matplotlib.pyplot as plt
+import numpy as np
+from collections import deque
 
 
 class EchoSystem:
     """
     Class representing the Echo System containing the cells.
     """
-    def __init__(self):
+    def __init__(self, engine=const.ENGINE, conformance=False, worldFile=const.WORLD_FILE, types=None,
+                 profile=False, cycles=0):
+        """
+        :param engine: the simulation engine - "cells" (a Cell object per cell), "arrays" (NumPy arrays),
+                       "tiles" (NumPy arrays stepped by worker processes), "active" (NumPy arrays,
+                       only the cells around the last changes are stepped) or "packed" (reduced precision
+                       arrays of giant worlds, see packed_engine.py).
+        :param conformance: if True, an "arrays" world is checked against Cell objects every generation
+                            (not supported by the "packed" engine, whose temperatures are rounded).
+        :param worldFile: the world file (text or binary, see world_file.py).
+        :param types: array of cell type codes to use instead of the world file's cells.
+        :param profile: if True, the phases and rules of every generation are timed (see profiler.py),
+                        a Profiler can also be passed to set its trace file.
+        :param cycles: fixed points and cycles of up to this many generations are detected (0 - not
+                       detected), see detectCycle and skipCycles.
+        """
+        if engine not in const.ENGINES:
+            raise ValueError("Unknown engine '{}', expected one of {}".format(engine, const.ENGINES))
+        if conformance and engine == "packed":
+            raise ValueError("The packed engine can't be checked for conformance, its temperatures are rounded")
+        self.engine = engine
+        self.worldFile = worldFile
+        self.arrays = None      # The ArrayEngine holding the cells (when using the "arrays" engine)
+        self.shadow = None      # EchoSystem of Cell objects checked against the arrays (conformance mode)
         self.world = []         # Array containing the cells
         self.generation = 0     # Keeps count on the cells generations
         self.stats = {}         # Stores data about the world
+        self.totals = {"temp": stats.RunningStats(),            # Run-wide temperature and pollution stats
+                       "pollution": stats.RunningStats()}
+        self.snapshots = deque(maxlen=const.STATS_SNAPSHOTS)    # Values of every cell in recent generations
         self.glaciers = 0       # Counts the number of glaciers
         self.forests = 0        # Counts the number of forests
         self.sea = 0            # Counts the number of sea cells
-        self.createWorld()      # Initiates the world
-
-    def createWorld(self):
-        """
-        Creates (initiates) the world using the world.dat.
-        """
-        # Init the world with the data from world.dat file
-        with open(const.WORLD_FILE, 'r') as f:
-            for row in range(const.WORLD_SIZE):
-                self.world.append([])
-                for col in range(const.WORLD_SIZE):
-                    c = f.read(1)
-                    while c not in const.WORLD_CELLS:
-                        c = f.read(1)
-                    if c == "E":
-                        # Create cell of type 'earth'
-                        self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col), cellType="earth"))
-                    if c == "C":
-                        # Create cell of type 'city'
-                        self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col), cellType="city"))
-                    if c == "F":
-                        # Create cell of type 'forest' and update the forests counter
-                        self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col), cellType="forest"))
-                        self.forests += 1
-                    if c == "S":
-                        # Create cell of type 'sea' and update the seas counter
-                        self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col), cellType="sea"))
-                        self.sea += 1
-                    if c == "G":
-                        # Create cell of type 'glaciers' and update the glaciers count
-                        self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col), cellType="glacier"))
-                        self.glaciers += 1
+        self.profiler = None    # Times the phases and rules of every generation (when profiling)
+        self.series = None      # SeriesWriter the stats of every generation are streamed to (if set)
+        self.history = None     # HistoryWriter the cells of every generation are recorded to (if set)
+        self.regions = None     # Regions whose aggregates are added to the stats of every generation (if set)
+        self.areas = None       # (generation, SummedAreas) of the cells, made by the last rectangle query
+        self.recent = deque(maxlen=cycles)  # (generation, state hash, temp, pollution) of recent generations
+        self.convergence = None # The cycle the run entered: its first generation and period (once detected)
+        self.cycle = []         # (temp, pollution) RunningStats of every generation of the cycle
+        if profile:
+            self.profiler = profile if isinstance(profile, prof.Profiler) else prof.Profiler()
+        randomState = random.getstate()
+        self.createWorld(types) # Initiates the world
+
+        if conformance and self.arrays is not None:
+            # Create the same world from the same random values, this time with Cell objects
+            state = random.getstate()
+            random.setstate(randomState)
+            self.shadow = EchoSystem("cells", worldFile=worldFile, types=types)
+            random.setstate(state)
+            self.checkConformance()
+
+    def createWorld(self, types=None):
+        """
+        Creates (initiates) the world using the world file.
+
+        :param types: array of cell type codes to use instead of the world file's cells.
+        """
+        # Read the cell types from the world file (its size is the size of the world)
+        if types is None:
+            types = world_file.readWorld(self.worldFile)
+        counts = np.bincount(types.ravel(), minlength=len(array_engine.TYPES))
+        self.forests = int(counts[array_engine.FOREST])
+        self.sea = int(counts[array_engine.SEA])
+        self.glaciers = int(counts[array_engine.GLACIER])
+
+        if self.engine in ("arrays", "tiles", "active", "packed"):
+            # The cells are stored in arrays, the world contains views of them
+            if self.engine == "tiles":
+                self.arrays = tiled_engine.TiledEngine(self, types)
+            elif self.engine == "active":
+                self.arrays = active_engine.ActiveEngine(self, types)
+            elif self.engine == "packed":
+                self.arrays = packed_engine.PackedEngine(self, types)
+            else:
+                self.arrays = array_engine.ArrayEngine(self, types)
+            self.world = self.arrays.view()
+            return
+
+        # Init the world with the cells
+        for row, rowTypes in enumerate(types.tolist()):
+            self.world.append([])
+            for col, cellType in enumerate(rowTypes):
+                self.world[row].append(cell.Cell(echoSystem=self, coordinates=(row, col),
+                                                 cellType=array_engine.TYPES[cellType]))
 
         # Let every cell update its neighbors
         for row in self.world:
@@ -60,255 +120,360 @@ class EchoSystem:
         First each cell calculates its changes.
         After all cells calculated the changes, they apply them.
         """
+        if self.profiler is not None:
+            self.profileWorld()
+            return
         # Update the 'stats' dict which saves data about the system
         self.calcStats()
         self.generation += 1
-        # Calculate for each cell what changes need to made
+        self.calcChanges()
+        self.applyChanges()
+        if self.shadow is not None:
+            self.shadow.updateWorld()
+            self.checkConformance()
+
+    def profileWorld(self):
+        """
+        Updates the world like updateWorld, timing every phase (and every rule) with the profiler.
+        """
+        profiler = self.profiler
+        profiler.startGeneration(self.generation + 1)
+        with profiler.phase("calcStats"):
+            self.calcStats()
+        self.generation += 1
+        with profiler.phase("calcChanges"):
+            if self.arrays is not None:
+                self.arrays.calcChanges()
+            else:
+                reached = set()
+                for row in self.world:
+                    for column in row:
+                        column.profileChanges(profiler, reached)
+                profiler.addRule("wind", 0, 0, len(reached))
+        with profiler.phase("applyChanges"):
+            self.applyChanges()
+        if self.shadow is not None:
+            with profiler.phase("conformance"):
+                self.shadow.updateWorld()
+                self.checkConformance()
+
+    def calcChanges(self):
+        """
+        Calculate for each cell what changes need to made.
+        """
+        if self.arrays is not None:
+            # Calculate the changes of all cells at once
+            self.arrays.calcChanges()
+            return
         for row in self.world:
             for column in row:
                 column.calcChanges()
 
-        # Apply the changes in each cell
+    def applyChanges(self):
+        """
+        Apply the changes in each cell.
+        """
+        if self.arrays is not None:
+            self.arrays.applyChanges()
+            return
         for row in self.world:
             for column in row:
                 column.applyChanges()
 
+    def close(self):
+        """
+        Releases the resources of the engine (the worker processes of the "tiles" engine),
+        completes the profile and writes the rest of the series and the history.
+        """
+        if self.profiler is not None:
+            self.profiler.close()
+        if self.series is not None:
+            self.series.close()
+        if self.history is not None:
+            self.history.close()
+        if hasattr(self.arrays, "close"):
+            self.arrays.close()
+
+    def checkConformance(self):
+        """
+        Checks that the arrays match the Cell objects of the shadow EchoSystem.
+        Raises ConformanceError with the first differences if they don't.
+        """
+        differences = array_engine.compareWorld(self.arrays, self.shadow.world)
+        for counter in ("forests", "sea", "glaciers"):
+            if getattr(self, counter) != getattr(self.shadow, counter):
+                differences.append((None, counter, getattr(self.shadow, counter), getattr(self, counter)))
+        if differences:
+            raise array_engine.ConformanceError("Generation {}: {} differences, first: {}".format(
+                self.generation, len(differences), differences[:5]))
+
+    def saveCheckpoint(self, path):
+        """
+        Saves the full state of the simulation to a binary checkpoint file: the fields of every
+        cell and their calculated changes, the counters, the generation, the stats, the state of the
+        cycle detection and the state of the random generator.
+
+        :param path: path of the checkpoint file.
+        """
+        if self.arrays is not None:
+            state = self.arrays.state()
+            nextState = self.arrays.nextState()
+        else:
+            state = array_engine.cellsState(self.world)
+            nextState = array_engine.cellsState(self.world, changes=True)
+
+        info = {"engine": self.engine,
+                "worldFile": self.worldFile,
+                "generation": self.generation,
+                "forests": self.forests,
+                "sea": self.sea,
+                "glaciers": self.glaciers,
+                "stats": self.stats,
+                "totals": {name: vars(acc) for name, acc in self.totals.items()},
+                "snapshots": list(self.snapshots),
+                "cycles": self.recent.maxlen,
+                "recent": [(gen, digest.hex(), vars(temp), vars(pollution))
+                           for gen, digest, temp, pollution in self.recent],
+                "convergence": self.convergence,
+                "cycle": [(vars(temp), vars(pollution)) for temp, pollution in self.cycle],
+                "random": random.getstate()}
+        arrays = dict(state)
+        for field, array in nextState.items():
+            arrays["next_" + field] = array
+        arrays["info"] = np.frombuffer(json.dumps(info).encode(), dtype=np.uint8)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def loadCheckpoint(cls, path):
+        """
+        Loads a simulation saved by saveCheckpoint. The run continues exactly as the saved one would have.
+
+        :param path: path of the checkpoint file.
+        :return: the restored EchoSystem.
+        """
+        with np.load(path) as data:
+            info = json.loads(data["info"].tobytes())
+            state = {field: data[field] for field in array_engine.FIELDS}
+            nextState = {field: data["next_" + field] for field in array_engine.FIELDS}
+
+        echoSystem = cls(info["engine"], worldFile=info["worldFile"], types=state["type"],
+                         cycles=info.get("cycles", 0))
+        if echoSystem.arrays is not None:
+            echoSystem.arrays.setState(state, nextState)
+        else:
+            array_engine.setCellsState(echoSystem.world, state, nextState)
+
+        echoSystem.generation = info["generation"]
+        echoSystem.forests = info["forests"]
+        echoSystem.sea = info["sea"]
+        echoSystem.glaciers = info["glaciers"]
+        echoSystem.stats = {int(gen): data for gen, data in info["stats"].items()}
+        for name, values in info["totals"].items():
+            vars(echoSystem.totals[name]).update(values)
+        echoSystem.snapshots.extend(tuple(snapshot) for snapshot in info["snapshots"])
+        # Checkpoints saved before the cycle detection was saved have none of it
+        fromVars = stats.RunningStats.fromVars
+        echoSystem.recent.extend((gen, bytes.fromhex(digest), fromVars(temp), fromVars(pollution))
+                                 for gen, digest, temp, pollution in info.get("recent", []))
+        echoSystem.convergence = info.get("convergence")
+        echoSystem.cycle = [(fromVars(temp), fromVars(pollution)) for temp, pollution in info.get("cycle", [])]
+
+        version, internalState, gaussNext = info["random"]
+        random.setstate((version, tuple(internalState), gaussNext))
+        return echoSystem
+
     def calcStats(self):
         """
         Update the data dict.
-        The dict stores data about the world (pollution, temperature etc.) for every generation.
+        The dict stores data about the world (pollution, temperature etc.) for every generation:
+        avg, stdev, min and max of the temperature and the pollution, and the number of cells of every type.
+        The run totals are updated as well, and a snapshot of the cells is kept if enabled.
         :return:
         """
-        temp = []
-        pollution = []
-        for row in self.world:
-            for col in row:
-                temp.append(col.temperature)
-                pollution.append(col.pollution)
+        types = dict.fromkeys(const.CELL_TYPES, 0)
+        if hasattr(self.arrays, "runningStats"):
+            # Merged a part of the cells at a time
+            temp = self.arrays.runningStats("temperature")
+            pollution = self.arrays.runningStats("pollution")
+        elif self.arrays is not None:
+            temp = stats.RunningStats.fromArray(self.arrays.temperature)
+            pollution = stats.RunningStats.fromArray(self.arrays.pollution)
+        if self.arrays is not None:
+            counts = np.bincount(self.arrays.type.ravel(), minlength=len(array_engine.TYPES))
+            for cellType, count in zip(array_engine.TYPES, counts.tolist()):
+                types[cellType] = count
+        else:
+            temp = stats.RunningStats()
+            pollution = stats.RunningStats()
+            for row in self.world:
+                for col in row:
+                    temp.add(col.temperature)
+                    pollution.add(col.pollution)
+                    types[col.type] += 1
+        self.totals["temp"].merge(temp)
+        self.totals["pollution"].merge(pollution)
+
+        if self.snapshots.maxlen:
+            # Keep the values of every cell of the recent generations
+            if self.arrays is not None:
+                snapshot = {"temp": self.arrays.temperature.ravel().tolist(),
+                            "pollution": self.arrays.pollution.ravel().tolist()}
+            else:
+                snapshot = {"temp": [col.temperature for row in self.world for col in row],
+                            "pollution": [col.pollution for row in self.world for col in row]}
+            self.snapshots.append((self.generation, snapshot))
+
         data = {}
-        data["temp"] = temp
-        data["pollution"] = pollution
+        data["temp"] = temp.summary()
+        data["pollution"] = pollution.summary()
+        data["types"] = types
         data["forests"] = self.forests
         data["sea"] = self.sea
         data["glaciers"] = self.glaciers
+        if self.regions is not None:
+            self.regions.update(self.generation, self.grids(), getattr(self.arrays, "changed", None))
+            data["regions"] = self.regions.summary()
         self.stats[self.generation] = data
+        if self.series is not None:
+            self.series.append(self.generation, data, self.grids() if self.series.grids else None)
+        if self.history is not None:
+            self.history.append(self.generation, self.state())
+        if self.recent.maxlen and self.convergence is None:
+            self.detectCycle(temp, pollution)
 
+    def stateHash(self):
+        """
+        :return: hash of the fields of every cell.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        state = self.state()
+        for field in array_engine.FIELDS:
+            digest.update(np.ascontiguousarray(state[field], dtype=array_engine.DTYPES[field]))
+        return digest.digest()
 
-class Gui:
-    def __init__(self):
+    def detectCycle(self, temp, pollution):
         """
-        Class for handling the GUI.
+        Compares the cells with the cells of the recent generations. The rules don't use random
+        values, so once the cells repeat an earlier generation the run repeats the generations
+        since then forever (a fixed point is a cycle of one generation).
+
+        :param temp: RunningStats of the temperatures of this generation.
+        :param pollution: RunningStats of the pollution of this generation.
         """
-        self.items = []
-        self.echoSystem = EchoSystem()
-        self.root = tk.Tk()
-        self.root.title("Maman 11 - Biological Computation - Lea Ben Zvi")
-        self.label = tk.Label(self.root)
-        self.label.pack()
+        digest = self.stateHash()
+        for generation, previous, _, _ in self.recent:
+            if previous == digest:
+                self.convergence = {"generation": generation, "period": self.generation - generation}
+                self.cycle = [(t, p) for gen, _, t, p in self.recent if gen >= generation]
+                return
+        self.recent.append((self.generation, digest, temp, pollution))
 
-        height = const.WORLD_SIZE * const.CELL_SIZE
-        # Create canvas for displaying the world
-        self.canvas = tk.Canvas(self.root,
-                                height=height,
-                                width=height)
-        self.canvas.pack()
+    def skipCycles(self, generations):
+        """
+        Skips the whole cycles before a generation, once the run entered a cycle (see detectCycle):
+        the stats of a skipped generation are the stats of the same generation of the cycle, with
+        the counters changed by the same amount every cycle, and the cells are left as they are.
+        Nothing is skipped if the values of every cell are kept (snapshots, a series with grids or a history).
 
-        # Add label which contains the current generation
-        self.label.config(text="Generation {}".format(self.echoSystem.generation))
-        self.updateCanvas()
+        :param generations: the generation the run stops at.
+        """
+        if self.convergence is None or self.snapshots.maxlen or self.history is not None:
+            return
+        if self.series is not None and self.series.grids:
+            return
+        start = self.convergence["generation"]
+        period = self.convergence["period"]
+        first = self.generation
+        skipped = (generations - first) // period * period
+        counters = ("forests", "sea", "glaciers")
+        delta = {name: self.stats[start + period][name] - self.stats[start][name] for name in counters}
+        for generation in range(first, first + skipped):
+            offset = (generation - start) % period
+            cycles = (generation - start) // period
+            data = dict(self.stats[start + offset])
+            for name in counters:
+                data[name] += cycles * delta[name]
+            self.stats[generation] = data
+            temp, pollution = self.cycle[offset]
+            self.totals["temp"].merge(temp)
+            self.totals["pollution"].merge(pollution)
+            if self.series is not None:
+                self.series.append(generation, data)
+        for name in counters:
+            setattr(self, name, getattr(self, name) + skipped // period * delta[name])
+        self.generation += skipped
 
-        # Refresh the screen every interval
-        self.root.after(const.REFRESH_RATE, self.refreshScreen)
-        self.root.mainloop()
+    def openSeries(self, path, grids=False):
+        """
+        Streams the stats of every generation (and the values of every cell) to a series on disk,
+        see series_file.py. A resumed run continues the series, rewriting its later generations.
 
-    def refreshScreen(self):
+        :param path: directory of the series.
+        :param grids: if True, the temperature, pollution and type of every cell are written as well.
         """
-        Refreshes the screen every interval, displaying the new generations.
+        shape = (len(self.world), len(self.world[0]))
+        names = self.regions.names if self.regions is not None else None
+        self.series = series_file.SeriesWriter(path, shape, grids, append=self.generation > 0, regions=names)
+        if self.generation > 0:
+            self.series.truncate(self.generation)
+
+    def openRegions(self, regions):
         """
-        # Update the world and display it
-        self.echoSystem.updateWorld()
-        generation = self.echoSystem.generation
-        self.label.config(text="Generation {}".format(generation))
-        self.updateCanvas(new=False)
-        if generation < const.STOP_GEN:
-            self.root.after(const.REFRESH_RATE, self.refreshScreen)
-        else:
-            # If the last generation is reached - print graphs
-            self.printStats()
-            self.createGraphs()
-
-    def updateCanvas(self, new=True):
-        """
-        Updates the canvas containing the echo system world.
-        """
-        # If first iteration - create the GUI
-        if new:
-            for row in range(len(self.echoSystem.world)):
-                self.items.append([])
-                # Create the cell objects in the GUI
-                for col in range(0, len(self.echoSystem.world)):
-                    cell = self.echoSystem.world[row][col]
-                    cellText = "{}".format(int(cell.temperature))
-                    rectID = self.canvas.create_rectangle(row*const.CELL_SIZE,
-                                                          col*const.CELL_SIZE,
-                                                          (row+1)*const.CELL_SIZE,
-                                                          (col + 1) * const.CELL_SIZE,
-                                                          fill=const.CELL_TYPES[cell.type])
-                    textId = self.canvas.create_text((row+0.5)*const.CELL_SIZE,
-                                                     (col+0.5)*const.CELL_SIZE,
-                                                     text=cellText, font="Arial 8 bold")
-                    self.items[row].append((rectID, textId))
-        # Else - update it
-        else:
-            items = len(self.items)
-            # Update the display of the cells
-            for row in range(items):
-                for col in range(items):
-                    cell = self.echoSystem.world[row][col]
-                    cellText = "{}".format(int(cell.temperature))
-                    (rectID, textId) = self.items[row][col]
-                    self.canvas.itemconfig(rectID, fill=const.CELL_TYPES[cell.type])
-                    self.canvas.itemconfig(textId, text=cellText)
-
-    def printStats(self):
-        """
-        Prints data about the temperature and the pollution levels.
-        :return:
+        Keeps the aggregates of regions of the world, added to the stats of every generation as
+        data["regions"] (see regions.py). Open the regions before a series, to write them to it.
+
+        :param regions: path of a JSON regions file, or a Regions object.
         """
-        # Print temperatures
-        temperatures = []
-        for gen in self.echoSystem.stats.values():
-            temperatures += gen["temp"]
-        print("Temperature max = {}".format(max(temperatures)))
-        print("Temperature min = {}".format(min(temperatures)))
-        avg = sum(temperatures) / len(temperatures)
-        print("Temperature avg = {}".format(avg))
-        print("Temperature stdev = {}\n".format(stdev(temperatures)))
-
-        # Print pollution values
-        pollutions = []
-        for gen in self.echoSystem.stats.values():
-            pollutions += gen["pollution"]
-        print("Pollution max = {}".format(max(pollutions)))
-        print("Pollution min = {}".format(min(pollutions)))
-        avg = sum(pollutions) / len(pollutions)
-        print("Pollution avg = {}".format(avg))
-        print("Pollution stdev = {}".format(stdev(pollutions)))
-
-    def createGraphs(self):
-        """
-        Creates three figures (windows) with the following graphs:
-            1. Temperature avg and stdev overtime (figure 1).
-            2. Pollution avg and stdev overtime (figure 1).
-            3. Normalized temperature overtime (figure 2).
-            4. Normalized pollution overtime (figure 2).
-            5. Avg pollution level impact on temperature, forests, seas and glaciers (figure 3).
-        :return:
+        shape = (len(self.world), len(self.world[0]))
+        if not isinstance(regions, region_stats.Regions):
+            regions = region_stats.readRegions(regions, shape)
+        elif regions.shape != shape:
+            raise ValueError("The regions are of a {}x{} world, the world is {}x{}".format(*regions.shape, *shape))
+        self.regions = regions
+
+    def summedAreas(self):
+        """
+        :return: the SummedAreas of the cells of this generation, for the stats of any rectangle of the world.
+        """
+        if self.areas is None or self.areas[0] != self.generation:
+            self.areas = (self.generation, region_stats.SummedAreas(self.grids()))
+        return self.areas[1]
+
+    def openHistory(self, path, keyframeEvery=const.HISTORY_KEYFRAMES):
+        """
+        Records the fields of every cell in every generation to a history file, see history_file.py.
+        A resumed run continues the history, rewriting its later generations.
+
+        :param path: path of the history file.
+        :param keyframeEvery: number of generations between two keyframes of the history.
+        """
+        shape = (len(self.world), len(self.world[0]))
+        self.history = history_file.HistoryWriter(path, shape, keyframeEvery, append=self.generation > 0)
+        if self.generation > 0:
+            self.history.truncate(self.generation)
+
+    def state(self):
+        """
+        :return: dict of field name to array of the cells, for every name in array_engine.FIELDS.
+        """
+        if self.arrays is not None:
+            return self.arrays.state()
+        return array_engine.cellsState(self.world)
+
+    def grids(self):
+        """
+        :return: dict of field name to array of the temperature, pollution and type code of every cell.
         """
-        gens = self.echoSystem.stats.keys()
-        plt.figure(1)
-        plt.subplots_adjust(hspace=0.5)
-
-        # Create temperature overtime graph
-        temp_avgs = []
-        temp_stdevs = []
-        for gen in gens:
-            values = self.echoSystem.stats[gen]["temp"]
-            temp_avgs.append(sum(values) / len(values))
-            temp_stdevs.append(stdev(values))
-        plt.subplot(211, title="Temperature avg and stdev overtime")
-        plt.plot(gens, temp_avgs, label="temp_avg", color="blue")
-        plt.plot(gens, temp_stdevs, label="temp_stdev", linestyle="dashed")
-        plt.grid(True)
-        plt.xlabel("Generations")
-        plt.ylabel("Temperature")
-        plt.legend()
-
-        # Create normalized temperature graph overtime
-        plt.figure(2)
-        plt.subplots_adjust(hspace=0.5)
-        plt.subplot(211, title="Normalized temperature overtime")
-        year_avg = sum(temp_avgs) / len(temp_avgs)
-        year_stdev = stdev(temp_avgs)
-        new_avgs = [(x-year_avg)/year_stdev for x in temp_avgs]
-        plt.plot(gens, new_avgs, label="normalized_temp")
-        plt.grid(True)
-        plt.xlabel("Generations")
-        plt.ylabel("Temperature")
-        plt.legend()
-
-        # Create pollution graph overtime
-        plt.figure(1)
-        pollution_avgs = []
-        pollution_stdevs = []
-        for gen in gens:
-            values = self.echoSystem.stats[gen]["pollution"]
-            pollution_avgs.append(sum(values) / len(values))
-            pollution_stdevs.append(stdev(values))
-        plt.subplot(212, title="Pollution avg and and stdev overtime")
-        plt.plot(gens, pollution_avgs, label="pollution_avg", color="blue")
-        plt.plot(gens, pollution_stdevs, label="pollution_stdev", linestyle="dashed")
-        plt.grid(True)
-        plt.xlabel("Generations")
-        plt.ylabel("Pollution")
-        plt.legend()
-
-        # Create normalized pollution graph overtime
-        plt.figure(2)
-        plt.subplot(212, title="Normalized pollution overtime")
-        year_avg = sum(pollution_avgs) / len(pollution_avgs)
-        year_stdev = stdev(pollution_avgs)
-        new_avgs = [(x - year_avg) / year_stdev for x in pollution_avgs]
-        plt.plot(gens, new_avgs, label="normalized_pollution")
-        plt.grid(True)
-        plt.xlabel("Generations")
-        plt.ylabel("Pollution")
-        plt.legend()
-
-        plt.figure(3, figsize=(8, 8))
-        plt.subplots_adjust(hspace=0.9)
-        glaciers = []
-        forests = []
-        sea = []
-        for gen in gens:
-            glaciers.append(self.echoSystem.stats[gen]["glaciers"])
-            forests.append(self.echoSystem.stats[gen]["forests"])
-            sea.append(self.echoSystem.stats[gen]["sea"])
-
-        # Create pollution and temperature correlation graph
-        plt.subplot(411, title="Pollution and temperature")
-        plt.plot(pollution_avgs, temp_avgs, label="temp_avg", color="red")
-        plt.grid(True)
-        plt.xlabel("Pollution")
-        plt.ylabel("Temperature")
-        plt.legend()
-
-        # Create pollution and forests correlation graph
-        plt.subplot(412, title="Pollution and forests number")
-        plt.plot(pollution_avgs, forests, label="forests", color="green")
-        plt.grid(True)
-        plt.xlabel("Pollution")
-        plt.ylabel("Forests")
-        plt.legend()
-
-        # Create pollution and seas correlation graph
-        plt.subplot(413, title="Pollution and seas number")
-        plt.plot(pollution_avgs, sea, label="seas", color="blue")
-        plt.grid(True)
-        plt.xlabel("Pollution")
-        plt.ylabel("Sea")
-        plt.legend()
-
-        # Create pollution and glaciers correlation graph
-        plt.subplot(414, title="Pollution and glaciers number")
-        plt.plot(pollution_avgs, glaciers, label="glaciers", color="grey")
-        plt.grid(True)
-        plt.xlabel("Pollution")
-        plt.ylabel("Glaciers")
-        plt.legend()
-
-        plt.show()
+        if self.arrays is not None:
+            return {"temperature": self.arrays.temperature,
+                    "pollution": self.arrays.pollution,
+                    "type": self.arrays.type}
+        return {"temperature": [[col.temperature for col in row] for row in self.world],
+                "pollution": [[col.pollution for col in row] for row in self.world],
+                "type": [[col.typeCode for col in row] for row in self.world]}
 
 
 if __name__ == "__main__":
+    from gui import Gui
     Gui()
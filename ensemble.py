@@ -0,0 +1,143 @@
+import argparse
+import json
+import math
+import random
+import time
+from multiprocessing import Pool
+import constants as const
+import stats
+from echo_system import EchoSystem
+from batch_engine import EchoBatch
+
+# Per-generation aggregates returned by every member of the ensemble
+SERIES = ["temp", "pollution", "forests", "sea", "glaciers"]
+CONFIDENCE_Z = 1.96     # z-score of the 95% confidence band
+
+# The tiles engine runs worker processes of its own, the members run in the (daemonic) processes of a pool
+ENGINES = [engine for engine in const.ENGINES if engine != "tiles"]
+
+
+def runMember(task):
+    """
+    Runs a single member of the ensemble (in a worker process).
+
+    :param task: tuple of (seed, generations, engine, world file).
+    :return: dict of per-generation lists, one for every name in SERIES.
+    """
+    seed, generations, engine, worldFile = task
+    random.seed(seed)
+    echoSystem = EchoSystem(engine, worldFile=worldFile)
+    while echoSystem.generation < generations:
+        echoSystem.updateWorld()
+    return memberSeries(echoSystem.stats, generations)
+
+
+def runBatch(task):
+    """
+    Runs a batch of members of the ensemble together, as a single EchoBatch (in a worker process).
+
+    :param task: tuple of (seeds, generations, world file).
+    :return: list of dicts of per-generation lists (see runMember), one for every seed.
+    """
+    seeds, generations, worldFile = task
+    batch = EchoBatch(seeds, worldFile=worldFile)
+    while batch.generation < generations:
+        batch.updateWorld()
+    return [memberSeries(memberStats, generations) for memberStats in batch.stats]
+
+
+def memberSeries(memberStats, generations):
+    """
+    :param memberStats: the stats of a member (see EchoSystem.stats).
+    :param generations: number of generations of the member.
+    :return: dict of per-generation lists, one for every name in SERIES.
+    """
+    series = {name: [] for name in SERIES}
+    for gen in range(generations):
+        data = memberStats[gen]
+        series["temp"].append(data["temp"]["avg"])
+        series["pollution"].append(data["pollution"]["avg"])
+        for name in ("forests", "sea", "glaciers"):
+            series[name].append(data[name])
+    return series
+
+
+def runEnsemble(members, generations=const.STOP_GEN, engine=const.ENGINE, seed=0, processes=None,
+                worldFile=const.WORLD_FILE, batch=None):
+    """
+    Runs many EchoSystems with different random initial conditions in a process pool
+    and merges their aggregates as they arrive, so memory doesn't grow with the members.
+    With a batch size, the members are stepped that many at a time as a single EchoBatch
+    (their results are the same as the results of the "arrays" engine).
+
+    :param members: number of runs in the ensemble.
+    :param generations: number of generations of every run.
+    :param engine: the simulation engine of the runs (see ENGINES).
+    :param seed: seed of the first run, run i is seeded with seed + i.
+    :param processes: number of worker processes (None - number of cores).
+    :param worldFile: the world file of the runs.
+    :param batch: number of members stepped together (None - every member is a separate EchoSystem).
+    :return: dict with the number of members and, for every name in SERIES, the per-generation
+             mean, stdev and 95% confidence band (low, high) of the mean.
+    """
+    if not batch and engine not in ENGINES:
+        raise ValueError("Unknown engine '{}', expected one of {}".format(engine, ENGINES))
+    accumulators = {name: [stats.RunningStats() for _ in range(generations)] for name in SERIES}
+    if batch:
+        seeds = [seed + i for i in range(members)]
+        tasks = ((seeds[i:i + batch], generations, worldFile) for i in range(0, members, batch))
+        run = runBatch
+    else:
+        tasks = ((seed + i, generations, engine, worldFile) for i in range(members))
+        run = runMember
+    with Pool(processes) as pool:
+        for results in pool.imap_unordered(run, tasks):
+            for series in (results if batch else [results]):
+                for name in SERIES:
+                    for acc, value in zip(accumulators[name], series[name]):
+                        acc.add(value)
+
+    result = {"members": members, "generations": generations, "engine": "batch" if batch else engine,
+              "seed": seed, "world": worldFile}
+    for name in SERIES:
+        mean = [acc.mean for acc in accumulators[name]]
+        stdev = [acc.stdev for acc in accumulators[name]]
+        margin = [CONFIDENCE_Z * s / math.sqrt(members) for s in stdev]
+        result[name] = {"mean": mean,
+                        "stdev": stdev,
+                        "low": [m - e for m, e in zip(mean, margin)],
+                        "high": [m + e for m, e in zip(mean, margin)]}
+    return result
+
+
+def main(args=None):
+    """
+    Command line interface of the ensemble runner.
+    """
+    parser = argparse.ArgumentParser(description="Run an ensemble of ecosystems with random initial conditions.")
+    parser.add_argument("members", type=int, help="number of runs")
+    parser.add_argument("-g", "--generations", type=int, default=const.STOP_GEN,
+                        help="number of generations of every run (default: %(default)s)")
+    parser.add_argument("-e", "--engine", choices=ENGINES, default=const.ENGINE,
+                        help="simulation engine (default: %(default)s)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the first run (default: %(default)s)")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE,
+                        help="world file, text or binary (default: %(default)s)")
+    parser.add_argument("-p", "--processes", type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument("-b", "--batch", type=int,
+                        help="step this many members together in a single stacked world (the engine is ignored)")
+    parser.add_argument("-o", "--output", help="JSON file the ensemble stats are written to")
+    options = parser.parse_args(args)
+
+    start = time.perf_counter()
+    result = runEnsemble(options.members, options.generations, options.engine, options.seed, options.processes,
+                         options.world, options.batch)
+    elapsed = time.perf_counter() - start
+    print("{} runs of {} generations in {:.3f} seconds".format(options.members, options.generations, elapsed))
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(result, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import bisect
+import time
+import numpy as np
+import array_engine
+from echo_system import EchoSystem
+from history_file import HistoryReader
+import constants as const
+import tkinter as tk
+import report
+import matplotlib.pyplot as plt
+
+
+class Gui:
+    def __init__(self, engine=const.ENGINE, worldFile=const.WORLD_FILE, raster=None, profile=False, replay=None,
+                 echoSystem=None, canvas=None):
+        """
+        Class for handling the GUI.
+        In replay mode the generations of a history are displayed instead of being calculated:
+        the slider seeks to any generation, space plays and pauses, the arrows step a generation
+        and "r" reverses the direction of play.
+
+        :param engine: the simulation engine used by the EchoSystem.
+        :param worldFile: the world file.
+        :param raster: if True, the world is drawn as a single image instead of an item per cell
+                       (None - only worlds with more than MAX_CANVAS_CELLS cells).
+        :param profile: if True, the phases of every generation and the rendering are timed,
+                        and their summary is printed at the end.
+        :param replay: path of a history (see history_file.py) to replay (None - the generations are calculated).
+        :param echoSystem: the EchoSystem displayed (None - a new one is created).
+        :param canvas: canvas the world is drawn on without a window, the caller updates it (None - the world
+                       is displayed in a Tk window until it's closed).
+        """
+        self.history = None
+        self.echoSystem = echoSystem
+        if replay is not None:
+            self.history = HistoryReader(replay)
+            rows, cols = self.history.shape
+        else:
+            if self.echoSystem is None:
+                self.echoSystem = EchoSystem(engine, worldFile=worldFile, profile=profile)
+            rows = len(self.echoSystem.world)
+            cols = len(self.echoSystem.world[0])
+        if canvas is not None:
+            self.root = None
+            self.initDisplay(rows, cols, raster, canvas)
+            self.updateCanvas()
+            return
+
+        self.root = tk.Tk()
+        self.root.title("Maman 11 - Biological Computation - Lea Ben Zvi")
+        self.label = tk.Label(self.root)
+        self.label.pack()
+        self.initDisplay(rows, cols, raster)
+
+        if self.history is not None:
+            self.initReplay()
+        else:
+            # Add label which contains the current generation
+            self.label.config(text="Generation {}".format(self.echoSystem.generation))
+            self.updateCanvas()
+
+            # Refresh the screen every interval
+            self.root.after(const.REFRESH_RATE, self.refreshScreen)
+        self.root.mainloop()
+        if self.history is not None:
+            self.history.close()
+
+    def initDisplay(self, rows, cols, raster=None, canvas=None):
+        """
+        Sets up how the world is drawn: as an item per cell or a single image, the size of the cells and the canvas.
+
+        :param rows: number of rows of the world.
+        :param cols: number of columns of the world.
+        :param raster: see __init__.
+        :param canvas: the canvas the world is drawn on (None - a canvas is created in the window).
+        """
+        self.items = []
+        self.shown = None       # The (types, temperatures) currently displayed
+        if raster is None:
+            raster = rows * cols > const.MAX_CANVAS_CELLS
+        self.raster = raster
+        self.image = None
+        if raster:
+            # Every cell is a square of pixels, large worlds only display every step-th cell
+            self.step = -(-max(rows, cols) // const.MAX_IMAGE_SIZE)
+            self.cellSize = max(1, min(const.CELL_SIZE, const.MAX_IMAGE_SIZE // max(rows, cols)))
+        else:
+            self.step = 1
+            self.cellSize = const.CELL_SIZE
+
+        if canvas is None:
+            # Create canvas for displaying the world (every row of the world is a column of the canvas)
+            canvas = tk.Canvas(self.root,
+                               height=-(-cols // self.step) * self.cellSize,
+                               width=-(-rows // self.step) * self.cellSize)
+            canvas.pack()
+        self.canvas = canvas
+        if raster:
+            self.colors = typeColors(self.canvas)
+
+    def createImage(self, data):
+        """
+        :param data: PPM image data of the world.
+        :return: the image of the world, displayed on the canvas.
+        """
+        image = tk.PhotoImage(data=data, format="PPM")
+        self.canvas.create_image(0, 0, image=image, anchor="nw")
+        return image
+
+    def initReplay(self):
+        """
+        Creates the controls of the replay mode and displays the first generation of the history.
+        """
+        self.position = 0       # Index of the displayed generation in the history
+        self.direction = 1      # 1 - playing forward, -1 - playing backward
+        self.playing = True
+        self.slider = tk.Scale(self.root, from_=self.history.first, to=self.history.last, orient=tk.HORIZONTAL,
+                               showvalue=False, command=self.seek)
+        self.slider.pack(fill=tk.X)
+        self.root.bind("<space>", lambda event: self.togglePlay())
+        self.root.bind("<Right>", lambda event: self.stepReplay(1))
+        self.root.bind("<Left>", lambda event: self.stepReplay(-1))
+        self.root.bind("r", lambda event: self.reverse())
+        self.showReplay(new=True)
+        self.root.after(const.REPLAY_RATE, self.refreshReplay)
+
+    def showReplay(self, new=False):
+        """
+        Displays the generation of the history at the current position.
+        """
+        generation = self.history.generations[self.position]
+        state = "playing {}".format("forward" if self.direction > 0 else "backward") if self.playing else "paused"
+        self.label.config(text="Generation {} (replay, {})".format(generation, state))
+        self.slider.set(generation)
+        self.updateCanvas(new=new)
+
+    def refreshReplay(self):
+        """
+        Displays the next generation of the history every interval while playing, pausing at the
+        first and the last generation.
+        """
+        if self.playing:
+            if 0 <= self.position + self.direction < len(self.history.generations):
+                self.position += self.direction
+            else:
+                self.playing = False
+            self.showReplay()
+        self.root.after(const.REPLAY_RATE, self.refreshReplay)
+
+    def stepReplay(self, direction):
+        """
+        Pauses the replay and displays the next (1) or the previous (-1) generation.
+        """
+        self.playing = False
+        self.position = min(max(self.position + direction, 0), len(self.history.generations) - 1)
+        self.showReplay()
+
+    def togglePlay(self):
+        self.playing = not self.playing
+        self.showReplay()
+
+    def reverse(self):
+        self.direction = -self.direction
+        self.showReplay()
+
+    def seek(self, value):
+        """
+        Displays the last generation of the history up to the slider's value.
+        """
+        position = max(bisect.bisect_right(self.history.generations, int(float(value))) - 1, 0)
+        if position != self.position:
+            self.position = position
+            self.showReplay()
+
+    def refreshScreen(self):
+        """
+        Refreshes the screen every interval, displaying the new generations.
+        Generations are calculated for FRAME_TIME milliseconds, and only the last one is displayed.
+        """
+        # Update the world and display it
+        deadline = time.perf_counter() + const.FRAME_TIME / 1000
+        self.echoSystem.updateWorld()
+        while self.echoSystem.generation < const.STOP_GEN and time.perf_counter() < deadline:
+            self.echoSystem.updateWorld()
+        generation = self.echoSystem.generation
+        self.label.config(text="Generation {}".format(generation))
+        if self.echoSystem.profiler is not None:
+            with self.echoSystem.profiler.phase("render"):
+                self.updateCanvas(new=False)
+        else:
+            self.updateCanvas(new=False)
+        if generation < const.STOP_GEN:
+            self.root.after(const.REFRESH_RATE, self.refreshScreen)
+        else:
+            # If the last generation is reached - print graphs
+            self.printStats()
+            self.createGraphs()
+
+    def displayValues(self):
+        """
+        :return: arrays of the type codes and the displayed (integer) temperatures of the cells.
+        """
+        if self.history is not None:
+            state = self.history.state(self.history.generations[self.position])
+            return np.array(state["type"]), state["temperature"].astype(int)
+        arrays = self.echoSystem.arrays
+        if arrays is not None:
+            return np.array(arrays.type), arrays.temperature.astype(int)
+        types = [[cell.typeCode for cell in row] for row in self.echoSystem.world]
+        temps = [[int(cell.temperature) for cell in row] for row in self.echoSystem.world]
+        return np.array(types), np.array(temps)
+
+    def updateCanvas(self, new=True):
+        """
+        Updates the canvas containing the echo system world.
+        Only the cells whose color or temperature changed since they were displayed are updated.
+        """
+        types, temps = self.displayValues()
+        if self.raster:
+            # The whole world is a single image
+            if new or not np.array_equal(types, self.shown[0]):
+                data = rasterImage(types, self.colors, self.step, self.cellSize)
+                if self.image is None:
+                    self.image = self.createImage(data)
+                else:
+                    self.image.configure(data=data, format="PPM")
+        # If first iteration - create the GUI
+        elif new:
+            for row in range(len(types)):
+                self.items.append([])
+                # Create the cell objects in the GUI
+                for col in range(0, len(types[row])):
+                    cellText = "{}".format(temps[row, col])
+                    rectID = self.canvas.create_rectangle(row*const.CELL_SIZE,
+                                                          col*const.CELL_SIZE,
+                                                          (row+1)*const.CELL_SIZE,
+                                                          (col + 1) * const.CELL_SIZE,
+                                                          fill=typeColor(types[row, col]))
+                    textId = self.canvas.create_text((row+0.5)*const.CELL_SIZE,
+                                                     (col+0.5)*const.CELL_SIZE,
+                                                     text=cellText, font="Arial 8 bold")
+                    self.items[row].append((rectID, textId))
+        # Else - update the cells which changed
+        else:
+            shownTypes, shownTemps = self.shown
+            for row, col in zip(*np.nonzero(types != shownTypes)):
+                self.canvas.itemconfig(self.items[row][col][0], fill=typeColor(types[row, col]))
+            for row, col in zip(*np.nonzero(temps != shownTemps)):
+                self.canvas.itemconfig(self.items[row][col][1], text="{}".format(temps[row, col]))
+        self.shown = (types, temps)
+
+    def printStats(self):
+        """
+        Prints data about the temperature and the pollution levels.
+        :return:
+        """
+        # Print temperatures
+        temperatures = self.echoSystem.totals["temp"]
+        print("Temperature max = {}".format(temperatures.max))
+        print("Temperature min = {}".format(temperatures.min))
+        print("Temperature avg = {}".format(temperatures.mean))
+        print("Temperature stdev = {}\n".format(temperatures.stdev))
+
+        # Print pollution values
+        pollutions = self.echoSystem.totals["pollution"]
+        print("Pollution max = {}".format(pollutions.max))
+        print("Pollution min = {}".format(pollutions.min))
+        print("Pollution avg = {}".format(pollutions.mean))
+        print("Pollution stdev = {}".format(pollutions.stdev))
+
+        # Print the profile
+        if self.echoSystem.profiler is not None:
+            print("\n" + self.echoSystem.profiler.summary())
+
+    def createGraphs(self):
+        """
+        Creates three figures (windows) with the graphs of the report (see report.drawFigures).
+        :return:
+        """
+        columns = report.statsColumns(self.echoSystem.stats)
+        figures = {name: plt.figure(number, figsize=size)
+                   for number, (name, size) in enumerate(report.FIGURES.items(), 1)}
+        report.drawFigures(columns, figures)
+        plt.show()
+
+
+def typeColor(code):
+    """
+    :return: the color of a cell type code.
+    """
+    return const.CELL_TYPES[array_engine.TYPES[code]]
+
+
+def typeColors(widget):
+    """
+    :param widget: a Tk widget, which resolves the color names.
+    :return: (types, 3) uint8 array of the RGB color of every cell type code.
+    """
+    return np.array([[c >> 8 for c in widget.winfo_rgb(const.CELL_TYPES[cellType])]
+                     for cellType in array_engine.TYPES], dtype=np.uint8)
+
+
+def rasterImage(types, colors, step, cellSize):
+    """
+    Draws the world as a binary PPM image - every row of the world is a column of the image.
+
+    :param types: array of the type codes of the cells.
+    :param colors: RGB color of every type code.
+    :param step: only every step-th row and column of the world are drawn.
+    :param cellSize: size of a cell in pixels.
+    :return: the PPM image data.
+    """
+    pixels = colors[types[::step, ::step].T]
+    pixels = np.repeat(np.repeat(pixels, cellSize, axis=0), cellSize, axis=1)
+    header = "P6 {} {} 255\n".format(pixels.shape[1], pixels.shape[0]).encode()
+    return header + pixels.tobytes()
+
+
+def main(args=None):
+    """
+    Command line interface of the GUI.
+    """
+    parser = argparse.ArgumentParser(description="Display the ecosystem simulation.")
+    parser.add_argument("-e", "--engine", choices=const.ENGINES, default=const.ENGINE,
+                        help="simulation engine (default: %(default)s)")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE,
+                        help="world file, text or binary (default: %(default)s)")
+    parser.add_argument("--raster", action="store_true", default=None, help="draw the world as a single image")
+    parser.add_argument("--profile", action="store_true", help="time the phases of every generation")
+    parser.add_argument("--replay", help="history file (see runner.py --history) to replay instead of simulating")
+    options = parser.parse_args(args)
+    Gui(options.engine, options.world, options.raster, options.profile, options.replay)
+
+
+if __name__ == "__main__":
+    main()
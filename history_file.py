@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import struct
+import zlib
+import numpy as np
+import constants as const
+from array_engine import FIELDS, DTYPES
+
+# A history is an append-only file of the fields of every cell in every generation. Every record
+# holds all the fields, each encoded against the record before it, compressed together. A keyframe
+# record holds the fields themselves, so a reader can start from it.
+MAGIC = b"ECOHIS01"
+META = struct.Struct("<I")                          # Size of the JSON description after the magic
+RECORD = struct.Struct("<i{}BI".format(len(FIELDS)))  # Generation, encoding of every field, compressed size
+
+# Encodings of a field in a record
+RAW = 0         # The values themselves
+ZERO = 1        # No cell changed
+XOR = 2         # The bytes of the values XORed with the bytes of the previous values (bits for bool fields)
+DIFF8 = 3       # The int8 difference from the previous values (integer fields)
+FDIFF = 4       # The float difference from the previous values, when both ways of applying it are exact
+
+
+def fieldDtype(field):
+    """
+    :return: the little-endian dtype of a field in a history.
+    """
+    return np.dtype(DTYPES[field]).newbyteorder("<")
+
+
+def encodeField(previous, current):
+    """
+    :param previous: the values of a field in the previous record (None - the record is a keyframe).
+    :param current: the values of the field in this record.
+    :return: (encoding, uint8 array) of the field.
+    """
+    if previous is None:
+        return RAW, current.view(np.uint8).ravel()
+    if current.dtype.kind == "f":
+        if np.array_equal(previous.view(np.uint8), current.view(np.uint8)):
+            return ZERO, np.empty(0, dtype=np.uint8)
+        # Most changes are a few fixed steps (+0.3, -0.1), which compress better than XORed mantissas
+        diff = current - previous
+        if np.array_equal((previous + diff).view(np.uint8), current.view(np.uint8)) and \
+                np.array_equal((current - diff).view(np.uint8), previous.view(np.uint8)):
+            return FDIFF, diff.view(np.uint8).ravel()
+        return XOR, np.bitwise_xor(previous.view(np.uint8), current.view(np.uint8)).ravel()
+    if current.dtype.kind == "b":
+        # A bit per cell
+        changed = np.not_equal(previous, current).ravel()
+        if not changed.any():
+            return ZERO, np.empty(0, dtype=np.uint8)
+        return XOR, np.packbits(changed)
+    # The integer differences wrap around, adding them back wraps the same way
+    diff = current - previous
+    if not diff.any():
+        return ZERO, np.empty(0, dtype=np.uint8)
+    small = diff.astype(np.int8)
+    if current.dtype.itemsize == 1 or np.array_equal(small, diff):
+        return DIFF8, small.view(np.uint8).ravel()
+    return XOR, np.bitwise_xor(previous.view(np.uint8), current.view(np.uint8)).ravel()
+
+
+def encodedSize(encoding, dtype, size):
+    """
+    :return: number of bytes of a field of size cells with an encoding.
+    """
+    if encoding == ZERO:
+        return 0
+    if encoding == XOR and dtype.kind == "b":
+        return -(-size // 8)
+    return size * (1 if encoding == DIFF8 else dtype.itemsize)
+
+
+def decodeField(encoding, data, values, backward=False):
+    """
+    :param encoding: the encoding of a field in a record.
+    :param data: uint8 array of the encoded field.
+    :param values: the values of the field in the previous record (in the record, if backward).
+    :param backward: if True, the record is undone.
+    :return: the values of the field in the record (in the previous record, if backward).
+    """
+    if encoding == RAW:
+        return data.view(values.dtype).reshape(values.shape)
+    if encoding == ZERO:
+        return values
+    if encoding == XOR and values.dtype.kind == "b":
+        return values ^ np.unpackbits(data, count=values.size).view(bool).reshape(values.shape)
+    if encoding == XOR:
+        return np.bitwise_xor(values.view(np.uint8), data.reshape(values.view(np.uint8).shape)).view(values.dtype)
+    diff = data.view(np.int8 if encoding == DIFF8 else values.dtype).reshape(values.shape)
+    if backward:
+        return (values - diff).astype(values.dtype)
+    return (values + diff).astype(values.dtype)
+
+
+class HistoryWriter:
+    """
+    Append-only writer of a history. Every keyframeEvery-th generation is a keyframe, so a
+    reader seeks to a generation decoding at most keyframeEvery records.
+    """
+    def __init__(self, path, shape, keyframeEvery=const.HISTORY_KEYFRAMES, append=False):
+        """
+        Init function for class HistoryWriter.
+
+        :param path: path of the history file.
+        :param shape: (rows, columns) of the world.
+        :param keyframeEvery: number of generations between two keyframes.
+        :param append: if True, the records are appended to an existing history of the same world.
+        """
+        self.path = path
+        self.shape = tuple(shape)
+        self.keyframeEvery = keyframeEvery
+        meta = {"format": MAGIC.decode(),
+                "shape": list(self.shape),
+                "fields": {field: fieldDtype(field).str for field in FIELDS}}
+        if append and os.path.exists(path):
+            if readMeta(path)[0] != meta:
+                raise ValueError("{} is a history of a different world".format(path))
+            self.file = open(path, 'r+b')
+            self.file.seek(0, os.SEEK_END)
+        else:
+            text = json.dumps(meta).encode()
+            self.file = open(path, 'w+b')
+            self.file.write(MAGIC + META.pack(len(text)) + text)
+        self.previous = None    # The fields of the last record (None - the next record is a keyframe)
+        self.generation = None  # Generation of the last record
+
+    def truncate(self, generation):
+        """
+        Removes the records of the generation and the ones after it (a run resumed from a checkpoint
+        rewrites them).
+
+        :param generation: the first generation removed.
+        """
+        self.file.flush()
+        offsets = [offset for gen, _, offset, _ in readIndex(self.path) if gen >= generation]
+        if offsets:
+            self.file.truncate(offsets[0])
+        self.file.seek(0, os.SEEK_END)
+        self.previous = None
+
+    def append(self, generation, state):
+        """
+        Adds the record of a generation.
+
+        :param generation: number of the generation.
+        :param state: dict of field name to array, for every name in FIELDS.
+        """
+        current = {field: np.ascontiguousarray(state[field], dtype=fieldDtype(field)) for field in FIELDS}
+        keyframe = self.previous is None or generation != self.generation + 1 or generation % self.keyframeEvery == 0
+        encodings = []
+        parts = []
+        for field in FIELDS:
+            encoding, data = encodeField(None if keyframe else self.previous[field], current[field])
+            encodings.append(encoding)
+            parts.append(data)
+        compressed = zlib.compress(np.concatenate(parts), const.HISTORY_LEVEL)
+        self.file.write(RECORD.pack(generation, *encodings, len(compressed)))
+        self.file.write(compressed)
+        # The state arrays of an engine (and views of them) are updated in place
+        self.previous = {field: array.copy() if np.may_share_memory(array, state[field]) else array
+                         for field, array in current.items()}
+        self.generation = generation
+
+    def close(self):
+        """
+        Writes the buffered records and closes the file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readMeta(path):
+    """
+    :return: (the JSON description of a history, the offset of its first record).
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a history".format(path))
+        size, = META.unpack(f.read(META.size))
+        return json.loads(f.read(size)), len(MAGIC) + META.size + size
+
+
+def readIndex(path):
+    """
+    Reads the record headers of a history (skipping their data). A record cut short by a
+    crash ends the index.
+
+    :return: list of (generation, encodings of the fields, offset, compressed size) of every record.
+    """
+    _, offset = readMeta(path)
+    end = os.path.getsize(path)
+    index = []
+    with open(path, 'rb') as f:
+        while offset + RECORD.size <= end:
+            f.seek(offset)
+            generation, *encodings, size = RECORD.unpack(f.read(RECORD.size))
+            if offset + RECORD.size + size > end:
+                break
+            index.append((generation, tuple(encodings), offset, size))
+            offset += RECORD.size + size
+    return index
+
+
+class HistoryReader:
+    """
+    Reads the cells of any generation of a history. Stepping to the next or the previous
+    generation decodes a single record (every encoding can be undone exactly), seeking anywhere
+    else starts from the keyframe before the generation.
+    """
+    def __init__(self, path):
+        """
+        Init function for class HistoryReader.
+
+        :param path: path of the history file.
+        """
+        self.path = path
+        meta, _ = readMeta(path)
+        self.shape = tuple(meta["shape"])
+        self.index = readIndex(path)
+        if not self.index:
+            raise ValueError("{} has no generations".format(path))
+        self.positions = {generation: i for i, (generation, _, _, _) in enumerate(self.index)}
+        self.generations = [generation for generation, _, _, _ in self.index]
+        self.file = open(path, 'rb')
+        self.position = None    # Index of the record of the current fields
+        self.current = None     # The fields of the current generation
+
+    @property
+    def first(self):
+        return self.generations[0]
+
+    @property
+    def last(self):
+        return self.generations[-1]
+
+    def isKeyframe(self, position):
+        return all(encoding == RAW for encoding in self.index[position][1])
+
+    def apply(self, position, backward=False):
+        """
+        Decodes a record into the current fields (undoes it, if backward).
+        """
+        _, encodings, offset, size = self.index[position]
+        self.file.seek(offset + RECORD.size)
+        data = np.frombuffer(zlib.decompress(self.file.read(size)), dtype=np.uint8)
+        cells = self.shape[0] * self.shape[1]
+        start = 0
+        fields = {}
+        for field, encoding in zip(FIELDS, encodings):
+            dtype = fieldDtype(field)
+            end = start + encodedSize(encoding, dtype, cells)
+            values = self.current[field] if self.current is not None else np.empty(self.shape, dtype=dtype)
+            fields[field] = decodeField(encoding, data[start:end], values, backward)
+            start = end
+        self.current = fields
+
+    def state(self, generation):
+        """
+        :param generation: a generation of the history.
+        :return: dict of field name to (read-only) array of the cells of the generation, for every name in FIELDS.
+        """
+        if generation not in self.positions:
+            raise KeyError("Generation {} isn't in {}".format(generation, self.path))
+        target = self.positions[generation]
+        if self.position is not None and target == self.position + 1 and not self.isKeyframe(target):
+            self.apply(target)
+        elif self.position is not None and target == self.position - 1 and not self.isKeyframe(self.position):
+            self.apply(self.position, backward=True)
+        elif target != self.position:
+            start = target
+            while not self.isKeyframe(start):
+                start -= 1
+            for position in range(start, target + 1):
+                self.apply(position)
+        self.position = target
+        return self.current
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(args=None):
+    """
+    Command line summary of a history.
+    """
+    parser = argparse.ArgumentParser(description="Print the generations and the size of a history.")
+    parser.add_argument("path", help="path of the history file")
+    options = parser.parse_args(args)
+
+    with HistoryReader(options.path) as history:
+        records = len(history.index)
+        keyframes = sum(history.isKeyframe(position) for position in range(records))
+        cells = history.shape[0] * history.shape[1]
+        rawSize = sum(fieldDtype(field).itemsize * cells for field in FIELDS) * records
+        fileSize = os.path.getsize(options.path)
+        print("World of {}x{} cells".format(*history.shape))
+        print("{} generations ({} to {}), {} keyframes".format(records, history.first, history.last, keyframes))
+        print("{} bytes ({:.1f} bytes per generation, {:.1f}x compressed)".format(
+            fileSize, fileSize / records, rawSize / fileSize))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import numpy as np
+import constants as const
+import array_engine
+import stats
+from tiled_engine import HALO, countChanges, _Counters
+
+# Packed layout of the cells, 8 bytes per cell
+PACKED_DTYPES = {"type": np.uint8,
+                 "height": np.uint8,
+                 "temperature": np.int16,       # Fixed point, in TEMP_SCALE-ths of a degree
+                 "pollution": np.uint8,
+                 "windSpeed": np.uint8,
+                 "windDirection": np.uint8,
+                 "flags": np.uint8}             # CLOUDS and RAIN bits
+TEMP_SCALE = 10
+CLOUDS = 1
+RAIN = 2
+TEMP_LIMITS = (np.iinfo(np.int16).min, np.iinfo(np.int16).max)
+
+
+def pack(state):
+    """
+    Packs cell arrays (see array_engine.FIELDS) into the packed layout.
+    Temperatures are rounded to the nearest TEMP_SCALE-th of a degree, OverflowError is raised if one is
+    beyond the int16 limits.
+
+    :param state: dict of field name to array, for every name in array_engine.FIELDS.
+    :return: dict of packed field name to array, for every name in PACKED_DTYPES.
+    """
+    packed = {field: np.asarray(state[field]).astype(PACKED_DTYPES[field])
+              for field in ("type", "height", "pollution", "windSpeed", "windDirection")}
+    temperature = np.rint(np.asarray(state["temperature"]) * TEMP_SCALE)
+    if temperature.size:
+        low, high = temperature.min(), temperature.max()
+        if low < TEMP_LIMITS[0] or high > TEMP_LIMITS[1]:
+            reached = low if low < TEMP_LIMITS[0] else high
+            raise OverflowError("The packed engine holds temperatures from {} to {} degrees, a cell reached {}".format(
+                TEMP_LIMITS[0] / TEMP_SCALE, TEMP_LIMITS[1] / TEMP_SCALE, reached / TEMP_SCALE))
+    packed["temperature"] = temperature.astype(np.int16)
+    packed["flags"] = (np.asarray(state["clouds"]) * CLOUDS | np.asarray(state["rain"]) * RAIN).astype(np.uint8)
+    return packed
+
+
+def unpack(packed):
+    """
+    :param packed: dict of packed field name to array, for every name in PACKED_DTYPES.
+    :return: dict of field name to array (with the dtypes of array_engine.DTYPES), for every name in FIELDS.
+    """
+    state = {field: packed[field].astype(array_engine.DTYPES[field])
+             for field in ("type", "height", "pollution", "windSpeed", "windDirection")}
+    state["temperature"] = packed["temperature"] / TEMP_SCALE
+    state["clouds"] = (packed["flags"] & CLOUDS).astype(bool)
+    state["rain"] = (packed["flags"] & RAIN).astype(bool)
+    return state
+
+
+class PackedEngine:
+    """
+    ArrayEngine for giant worlds: the cells are stored packed in 8 bytes (the temperature in
+    fixed point), and the world is stepped a strip of rows at a time, so the memory of a
+    generation's calculations follows the strip size and not the world size.
+
+    Every strip is unpacked, with HALO rows around it, and stepped by an ArrayEngine. Its new
+    rows are written back once the next strip was stepped (a strip reads HALO rows of the one
+    before it), so the world is updated in place, without a second buffer.
+
+    Accuracy contract: the fixed point temperature holds exact multiples of 0.1 degrees, like
+    the rules (which only add POLLUTION_HEAT and RAIN_TEMP, multiples of 0.1), while the float engines accumulate a rounding
+    error of about 1e-15 degrees per change. The values of both agree to that error as long as
+    no temperature of the float engines lands on the other side of a rule threshold (60, 0, 100,
+    -10, 10 degrees) than its exact value; the packed engine then follows the exact value.
+    Temperatures are held from -3276.8 to 3276.7 degrees, a generation taking one beyond them
+    raises OverflowError (the strips before it were already updated). All the other fields are exact.
+    """
+    def __init__(self, echoSystem, types, stripCells=const.PACKED_STRIP_CELLS):
+        """
+        Init function for class PackedEngine.
+
+        :param echoSystem: the EchoSystem whose counters are updated.
+        :param types: (rows, columns) array of type codes (the index in array_engine.TYPES).
+        :param stripCells: number of cells stepped at once.
+        """
+        self.echoSystem = echoSystem
+        self.shape = tuple(np.shape(types))
+        self.size = self.shape[0] * self.shape[1]
+        rows, cols = self.shape
+
+        # A strip has at least HALO rows, so only the last strip reads rows which were written back
+        stripRows = max(stripCells // max(cols, 1), 2 * HALO, 1)
+        if stripRows + 2 * HALO >= rows:
+            self.strips = [(0, rows)]
+        else:
+            bounds = list(range(0, rows, stripRows)) + [rows]
+            if bounds[-1] - bounds[-2] < HALO:
+                del bounds[-2]
+            self.strips = list(zip(bounds[:-1], bounds[1:]))
+        self.tables = {}        # Neighbor tables of the strip shapes
+
+        # The random initial values are drawn like in ArrayEngine, a strip at a time
+        self.packed = {field: np.empty(self.shape, dtype=dtype) for field, dtype in PACKED_DTYPES.items()}
+        for first, end in self.strips:
+            for field, array in pack(array_engine.initialState(np.asarray(types[first:end]))).items():
+                self.packed[field][first:end] = array
+
+    @property
+    def type(self):
+        return self.packed["type"]
+
+    @property
+    def height(self):
+        return self.packed["height"]
+
+    @property
+    def temperature(self):
+        return self.packed["temperature"] / TEMP_SCALE
+
+    @property
+    def pollution(self):
+        return self.packed["pollution"]
+
+    @property
+    def windSpeed(self):
+        return self.packed["windSpeed"]
+
+    @property
+    def windDirection(self):
+        return self.packed["windDirection"]
+
+    @property
+    def clouds(self):
+        return (self.packed["flags"] & CLOUDS).astype(bool)
+
+    @property
+    def rain(self):
+        return (self.packed["flags"] & RAIN).astype(bool)
+
+    def state(self):
+        """
+        :return: dict of field name to array, for every name in array_engine.FIELDS.
+        """
+        return unpack(self.packed)
+
+    def nextState(self):
+        """
+        :return: the calculated changes - they are applied as they are calculated, between
+                 generations they are the current state.
+        """
+        return self.state()
+
+    def setState(self, state, nextState):
+        """
+        Replaces the cells (the changes are calculated again every generation).
+
+        :param state: dict of field name to array, for every name in array_engine.FIELDS.
+        :param nextState: ignored, see nextState.
+        """
+        for field, array in pack(state).items():
+            self.packed[field][...] = array
+
+    def runningStats(self, field):
+        """
+        :param field: "temperature" or "pollution".
+        :return: RunningStats of the values of the field in all the cells, merged a strip at a time.
+        """
+        result = stats.RunningStats()
+        for first, end in self.strips:
+            values = self.packed[field][first:end]
+            result.merge(stats.RunningStats.fromArray(values / TEMP_SCALE if field == "temperature" else values))
+        return result
+
+    def calcStrip(self, first, end, head):
+        """
+        Steps a strip of rows.
+
+        :param first: first row of the strip.
+        :param end: end row of the strip.
+        :param head: the packed first HALO rows of the world, as they were before the generation.
+        :return: the new packed rows of the strip.
+        """
+        worldRows, cols = self.shape
+        halo = 0 if end - first == worldRows else HALO
+        rows = np.arange(first - halo, end + halo) % worldRows
+        packed = {field: array[rows] for field, array in self.packed.items()}
+        if halo and end == worldRows and first > 0:
+            # The rows after the last strip are the first rows, which were already written back
+            wrapped = np.flatnonzero(rows < HALO)
+            for field, array in packed.items():
+                array[wrapped] = head[field][rows[wrapped]]
+
+        shape = (len(rows), cols)
+        if shape not in self.tables:
+            self.tables[shape] = array_engine.neighborTable(shape)
+        # The changes of the strip cells are ordered by their position in the whole world
+        cellOrder = (rows[:, None] * cols + np.arange(cols)).ravel()
+        state = unpack(packed)
+        # The rules of every strip are timed with the profiler of the EchoSystem (only the cells of the strip
+        # are calculated, so the halo cells aren't counted twice)
+        counters = _Counters(getattr(self.echoSystem, "profiler", None))
+        strip = array_engine.ArrayEngine.fromState(counters, state, self.tables[shape], cellOrder)
+        own = slice(halo, halo + end - first)
+        strip.calcChanges(np.arange(own.start * cols, own.stop * cols))
+
+        new = {field: array[own] for field, array in strip.nextState().items()}
+        forests, sea, glaciers = countChanges(state["type"][own], new["type"])
+        self.echoSystem.forests += forests
+        self.echoSystem.sea += sea
+        self.echoSystem.glaciers += glaciers
+        return pack(new)
+
+    def calcChanges(self):
+        """
+        Calculate the changes of all the strips, and apply them.
+        """
+        head = {field: array[:HALO].copy() for field, array in self.packed.items()}
+        pending = None
+        for first, end in self.strips:
+            rows = self.calcStrip(first, end, head)
+            if pending is not None:
+                self.writeRows(*pending)
+            pending = (first, end, rows)
+        self.writeRows(*pending)
+
+    def writeRows(self, first, end, rows):
+        """
+        Writes back the new packed rows of a strip.
+        """
+        for field, array in rows.items():
+            self.packed[field][first:end] = array
+
+    def applyChanges(self):
+        """
+        The changes are applied by calcChanges.
+        """
+
+    def view(self):
+        """
+        :return: rows of CellView objects, with the same layout as EchoSystem.world.
+        """
+        return array_engine.WorldView(self)
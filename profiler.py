@@ -0,0 +1,182 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+import constants as const
+import rules
+
+# Phases of a generation, in the order they run (render is timed by the GUI)
+PHASES = ["calcStats", "calcChanges", "applyChanges", "conformance", "render"]
+
+# Rules of Cell.calcChanges, in the order they run (the rules of the rule table are timed by the profiling
+# variant of its kernel, pollutionEvents - the arrays engine merging the pollution changes of all the rules
+# in their sequential order)
+RULES = rules.NAMES + ["wind", "pollutionEvents"]
+
+
+class Profiler:
+    """
+    Records the wall time and the number of calls of every phase of a generation, and of every
+    rule inside calcChanges, together with the number of cells every rule changed.
+    A cell is counted as changed by a rule of the rule table if the rule changed its next type,
+    pollution or temperature - a value is compared before and after the rule, after clipping, so
+    a city whose pollution is already at MAX_POLLUTION isn't counted. The wind counts the cells
+    its paths reach.
+
+    The "tiles" engine steps the rules in worker processes, only its phases are recorded.
+    """
+    def __init__(self, trace=None, history=const.PROFILE_HISTORY):
+        """
+        Init function for class Profiler.
+
+        :param trace: path of a JSON lines file every generation's record is written to (None - not written).
+        :param history: number of recent generation records kept in memory.
+        """
+        # A generation's record maps the phase names to [seconds, calls] and the rule names to
+        # [seconds, calls, changed cells], the trace file has a record (a JSON object) per line
+        self.history = deque(maxlen=history)    # Records of the recent generations
+        self.record = None                      # Record of the current generation
+        self.generations = 0                    # Number of generations recorded
+        self.phases = {}                        # Run totals, phase name to [seconds, calls]
+        self.rules = {}                         # Run totals, rule name to [seconds, calls, changed]
+        self.trace = open(trace, 'w') if trace is not None else None
+
+    def startGeneration(self, generation):
+        """
+        Starts the record of a new generation, the record of the previous one is complete.
+
+        :param generation: number of the generation.
+        """
+        self.endGeneration()
+        self.record = {"generation": generation, "phases": {}, "rules": {}}
+        self.history.append(self.record)
+
+    def endGeneration(self):
+        """
+        Adds the record of the current generation to the totals (and to the trace file).
+        """
+        if self.record is None:
+            return
+        for name, (seconds, calls) in self.record["phases"].items():
+            total = self.phases.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+        for name, (seconds, calls, changed) in self.record["rules"].items():
+            total = self.rules.setdefault(name, [0.0, 0, 0])
+            total[0] += seconds
+            total[1] += calls
+            total[2] += changed
+        self.generations += 1
+        if self.trace is not None:
+            self.trace.write(json.dumps(self.record) + "\n")
+        self.record = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the phase run inside the with block.
+
+        :param name: name of the phase (see PHASES).
+        """
+        start = time.perf_counter()
+        yield
+        self.addPhase(name, time.perf_counter() - start)
+
+    def addPhase(self, name, seconds, calls=1):
+        """
+        Adds the time of a phase to the record of the current generation.
+        """
+        if self.record is None:
+            return
+        phase = self.record["phases"].setdefault(name, [0.0, 0])
+        phase[0] += seconds
+        phase[1] += calls
+
+    def addRule(self, name, seconds, calls=1, changed=0):
+        """
+        Adds the time and the changed cells of a rule to the record of the current generation.
+        """
+        rule = self.record["rules"].get(name)
+        if rule is None:
+            rule = self.record["rules"][name] = [0.0, 0, 0]
+        rule[0] += seconds
+        rule[1] += calls
+        rule[2] += changed
+
+    def rule(self, name, method, changed=0):
+        """
+        Calls a rule of a single cell and adds its time.
+
+        :param name: name of the rule (see RULES).
+        :param method: the rule.
+        :param changed: number of cells the rule changes.
+        """
+        start = time.perf_counter()
+        method()
+        self.addRule(name, time.perf_counter() - start, 1, changed)
+
+    def lap(self):
+        """
+        :return: function mark(name, changed) which adds the time since the previous mark (or since
+                 the call to lap) to a rule - for engines applying every rule to all the cells at once.
+        """
+        last = [time.perf_counter()]
+
+        def mark(name, changed=0):
+            now = time.perf_counter()
+            self.addRule(name, now - last[0], 1, int(changed))
+            last[0] = now
+        return mark
+
+    def totals(self):
+        """
+        :return: dict with the number of generations and the run totals of the phases and the rules,
+                 including the current generation.
+        """
+        phases = {name: list(values) for name, values in self.phases.items()}
+        rules = {name: list(values) for name, values in self.rules.items()}
+        generations = self.generations
+        if self.record is not None:
+            generations += 1
+            for name, values in self.record["phases"].items():
+                phases[name] = [a + b for a, b in zip(phases.get(name, [0.0, 0]), values)]
+            for name, values in self.record["rules"].items():
+                rules[name] = [a + b for a, b in zip(rules.get(name, [0.0, 0, 0]), values)]
+        return {"generations": generations,
+                "phases": {name: {"seconds": s, "calls": c} for name, (s, c) in phases.items()},
+                "rules": {name: {"seconds": s, "calls": c, "changed": n} for name, (s, c, n) in rules.items()}}
+
+    def summary(self):
+        """
+        :return: a table of the time per generation of every phase and rule, and of the cells changed
+                 by every rule.
+        """
+        totals = self.totals()
+        generations = max(totals["generations"], 1)
+        total = sum(phase["seconds"] for phase in totals["phases"].values()) or 1
+        lines = ["Profile of {} generations".format(totals["generations"]),
+                 "{:<18} {:>10} {:>10} {:>7} {:>14}".format("", "ms/gen", "calls/gen", "%", "changed/gen")]
+
+        def line(name, values):
+            changed = values.get("changed")
+            lines.append("{:<18} {:>10.3f} {:>10.1f} {:>6.1f}% {:>14}".format(
+                name, values["seconds"] / generations * 1000, values["calls"] / generations,
+                values["seconds"] / total * 100, "" if changed is None else "{:.1f}".format(changed / generations)))
+
+        for name in PHASES + sorted(set(totals["phases"]) - set(PHASES)):
+            if name in totals["phases"]:
+                line(name, totals["phases"][name])
+            if name == "calcChanges":
+                for rule in RULES + sorted(set(totals["rules"]) - set(RULES)):
+                    if rule in totals["rules"]:
+                        line("  " + rule, totals["rules"][rule])
+        return "\n".join(lines)
+
+    def close(self):
+        """
+        Completes the record of the current generation and closes the trace file.
+        """
+        self.endGeneration()
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import numpy as np
+import constants as const
+import world_file
+from array_engine import TYPES, DTYPES
+
+# The aggregated fields of the cells, by their name in the stats (see EchoSystem.calcStats)
+FIELDS = {"temp": "temperature", "pollution": "pollution"}
+# The fields of the cells the regions are given (see EchoSystem.grids)
+GRIDS = list(FIELDS.values()) + ["type"]
+
+# The aggregates are recalculated from all the cells when more than this fraction of them changed
+INCREMENTAL = 0.25
+
+
+def readLabels(path, shape):
+    """
+    Reads a label grid: a token for every cell (the name of its region, NO_REGION - none), a line
+    for every row, like the letters of world.dat.
+
+    :param path: path of the label file.
+    :param shape: (rows, columns) of the world.
+    :return: (names of the labels, (rows, columns) array of the index of every cell's label, -1 - none).
+    """
+    with open(path) as f:
+        rows = [line.split() for line in f if line.split()]
+    if len(rows) != shape[0] or any(len(row) != shape[1] for row in rows):
+        raise ValueError("{} doesn't have a label for every cell of a {}x{} world".format(path, *shape))
+    tokens = [token for row in rows for token in row]
+    names = [name for name in dict.fromkeys(tokens) if name != const.NO_REGION]
+    index = {name: i for i, name in enumerate(names)}
+    index[const.NO_REGION] = -1
+    return names, np.array([index[token] for token in tokens], dtype=np.intp).reshape(shape)
+
+
+def readRegions(path, shape):
+    """
+    Reads the regions of a world from a JSON file with any of the keys:
+    "rectangles" - dict of region name to its [top, left, bottom, right] (the bottom row and the
+    right column are not part of it), "bands" - number of latitude bands the rows are split into
+    (regions "band 1" to "band n", from the top), "labels" - a label file (see readLabels, the path
+    is relative to the JSON file).
+
+    :param path: path of the JSON file.
+    :param shape: (rows, columns) of the world.
+    :return: the Regions.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    unknown = set(spec) - {"rectangles", "bands", "labels"}
+    if unknown:
+        raise ValueError("{}: unknown keys {}".format(path, sorted(unknown)))
+    rectangles = dict(spec.get("rectangles", {}))
+    bands = spec.get("bands", 0)
+    edges = np.linspace(0, shape[0], bands + 1).round().astype(int).tolist() if bands else []
+    for band in range(bands):
+        rectangles["band {}".format(band + 1)] = [edges[band], 0, edges[band + 1], shape[1]]
+    names, labels = [], None
+    if "labels" in spec:
+        names, labels = readLabels(os.path.join(os.path.dirname(path), spec["labels"]), shape)
+    return Regions(shape, rectangles, labels, names)
+
+
+class Regions:
+    """
+    Aggregates of the cells of named regions - rectangles of the world and the labels of a label
+    grid - kept up to date every generation from the cells that changed since the last one.
+
+    A region holds its number of cells, the sums and the sums of squares of its temperatures and
+    pollution, and the number of its cells of every type. The cells in the same regions form a class,
+    so the sums of all the regions are a single bincount of the cells by class, multiplied by the
+    membership matrix of the classes - no matter how many regions there are and how they overlap.
+    The temperature sums are floats, every REGIONS_REFRESH generations they are recalculated from all
+    the cells, so their rounding errors don't add up.
+    """
+    def __init__(self, shape, rectangles=None, labels=None, names=()):
+        """
+        Init function for class Regions.
+
+        :param shape: (rows, columns) of the world.
+        :param rectangles: dict of region name to its (top, left, bottom, right), without the bottom
+                           row and the right column.
+        :param labels: (rows, columns) array of the index of every cell's label in names (-1 - none).
+        :param names: names of the labels.
+        """
+        self.shape = tuple(shape)
+        self.names = list(names)
+        rectangles = dict(rectangles or {})
+        duplicates = set(self.names) & set(rectangles)
+        if duplicates:
+            raise ValueError("Regions {} are both labels and rectangles".format(sorted(duplicates)))
+        self.size = self.shape[0] * self.shape[1]
+
+        # The class of a cell is numbered by its label and the rectangles it's in, a rectangle at a time
+        classes = np.zeros(self.size, dtype=np.intp)
+        if labels is not None:
+            labels = np.asarray(labels, dtype=np.intp)
+            if labels.shape != self.shape:
+                raise ValueError("The label grid is {}x{}, the world is {}x{}".format(*labels.shape, *self.shape))
+            classes = labels.ravel() + 1
+        for name, (top, left, bottom, right) in rectangles.items():
+            if not (0 <= top < bottom <= self.shape[0] and 0 <= left < right <= self.shape[1]):
+                raise ValueError("Region '{}' {} is empty or outside the {}x{} world".format(
+                    name, [top, left, bottom, right], *self.shape))
+            inside = np.zeros(self.shape, dtype=np.intp)
+            inside[top:bottom, left:right] = 1
+            classes = np.unique(classes * 2 + inside.ravel(), return_inverse=True)[1]
+        _, first, self.classes = np.unique(classes, return_index=True, return_inverse=True)
+
+        # membership[c, r] - the cells of class c are in region r (taken from the first cell of the class)
+        self.membership = np.zeros((len(first), len(self.names) + len(rectangles)), dtype=np.int64)
+        if labels is not None:
+            labeled = np.flatnonzero(labels.ravel()[first] >= 0)
+            self.membership[labeled, labels.ravel()[first[labeled]]] = 1
+        row, col = np.divmod(first, self.shape[1])
+        for name, (top, left, bottom, right) in rectangles.items():
+            self.membership[:, len(self.names)] = (top <= row) & (row < bottom) & (left <= col) & (col < right)
+            self.names.append(name)
+        # The matrix products are made in floats (exact for counts below 2 ** 53)
+        self.weights = self.membership.astype(np.float64)
+        self.typeSlots = self.classes * len(TYPES)     # The first bincount slot of the types of every cell
+
+        self.cells = self.count(None)
+        if not self.cells.all():
+            raise ValueError("Regions {} have no cells".format([n for n, c in zip(self.names, self.cells) if not c]))
+        self.generation = None  # The generation of the aggregates
+        self.refreshed = None   # The generation the aggregates were last recalculated from all the cells
+        self.previous = {}      # The values of the cells in the generation of the aggregates, by field
+        self.sums = {}          # Sums of the values of every region, by field
+        self.squares = {}       # Sums of the squares of the values of every region, by field
+        self.types = None       # Number of cells of every type in every region
+
+    def count(self, weights, cells=None):
+        """
+        :param weights: value of every cell (of the cells if given, None - 1 for every cell).
+        :param cells: flat indices of the cells (None - all the cells).
+        :return: sum of the weights of the cells of every region (the number of cells without weights).
+        """
+        classes = self.classes if cells is None else self.classes[cells]
+        if weights is None:
+            return np.bincount(classes, minlength=len(self.membership)) @ self.membership
+        return np.bincount(classes, weights=weights, minlength=len(self.membership)) @ self.weights
+
+    def countTypes(self, cellType, cells=None):
+        """
+        :param cellType: type code of every cell (of the cells if given).
+        :param cells: flat indices of the cells (None - all the cells).
+        :return: (regions, types) array of the number of cells of every type in every region.
+        """
+        slots = (self.typeSlots if cells is None else self.typeSlots[cells]) + cellType
+        counts = np.bincount(slots, minlength=len(self.membership) * len(TYPES))
+        return (self.weights.T @ counts.reshape(-1, len(TYPES))).astype(np.int64)
+
+    def update(self, generation, grids, changed=None):
+        """
+        Updates the aggregates to the cells of a generation. When it follows the generation of the
+        aggregates, only the changes of the cells that changed are added (unless most of them changed).
+
+        :param generation: number of the generation.
+        :param grids: dict of field name to the array of the temperature, pollution and type of every cell.
+        :param changed: flat indices of the cells that changed since the previous generation, a superset
+                        is fine (None - not known, the cells are compared with their previous values).
+        """
+        values = {field: np.asarray(grids[field], dtype=DTYPES[field]).ravel() for field in GRIDS}
+        full = (self.generation is None or generation != self.generation + 1
+                or generation - self.refreshed >= const.REGIONS_REFRESH)
+        if not full and changed is None:
+            differs = None
+            for field, array in values.items():
+                different = array != self.previous[field]
+                differs = different if differs is None else differs | different
+            changed = np.flatnonzero(differs)
+        if full or len(changed) > self.size * INCREMENTAL:
+            for field in FIELDS.values():
+                self.sums[field] = self.count(values[field])
+                self.squares[field] = self.count(np.square(values[field], dtype=np.float64))
+            self.types = self.countTypes(values["type"])
+            self.previous = {field: array.copy() for field, array in values.items()}
+            self.generation = self.refreshed = generation
+            return
+
+        old = {field: array[changed] for field, array in self.previous.items()}
+        new = {field: array[changed] for field, array in values.items()}
+        for field in FIELDS.values():
+            self.sums[field] += self.count(new[field] - old[field].astype(np.float64), changed)
+            self.squares[field] += self.count(np.square(new[field], dtype=np.float64)
+                                              - np.square(old[field], dtype=np.float64), changed)
+        self.types += self.countTypes(new["type"], changed) - self.countTypes(old["type"], changed)
+        for field, array in new.items():
+            self.previous[field][changed] = array
+        self.generation = generation
+
+    def summary(self):
+        """
+        :return: dict of region name to its number of cells, the avg and stdev of its temperature and
+                 pollution, and its number of cells of every type.
+        """
+        result = {}
+        cells = self.cells.tolist()
+        types = self.types.tolist()
+        values = {key: (self.sums[field].tolist(), self.squares[field].tolist()) for key, field in FIELDS.items()}
+        for i, name in enumerate(self.names):
+            data = {"cells": cells[i]}
+            for key, (sums, squares) in values.items():
+                data[key] = moments(cells[i], sums[i], squares[i])
+            data["types"] = dict(zip(const.CELL_TYPES, types[i]))
+            result[name] = data
+        return result
+
+
+def moments(count, total, squares):
+    """
+    :return: dict with the avg and the sample stdev (like statistics.stdev) of values, given their
+             count, sum and sum of squares.
+    """
+    mean = total / count
+    variance = (squares - total * mean) / (count - 1) if count > 1 else 0.0
+    return {"avg": mean, "stdev": float(np.sqrt(max(variance, 0.0)))}
+
+
+def summedArea(values, dtype=np.float64):
+    """
+    :param values: (rows, columns) array.
+    :return: the (rows + 1, columns + 1) summed-area table of the values: table[r, c] is the sum of
+             values[:r, :c].
+    """
+    values = np.asarray(values)
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=dtype)
+    np.cumsum(values, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def rectangleSums(table, top, left, bottom, right):
+    """
+    :param table: summed-area table (see summedArea).
+    :return: the sum of the values of every rectangle (the corners can be arrays of many rectangles).
+    """
+    return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+
+class SummedAreas:
+    """
+    Summed-area tables of the cells of a generation: the sum of the values of any rectangle of the
+    world is four lookups. The table of a value is made the first time it's queried.
+    """
+    def __init__(self, grids):
+        """
+        Init function for class SummedAreas.
+
+        :param grids: dict of field name to the array of the temperature, pollution and type of every cell.
+        """
+        self.grids = {field: np.asarray(grids[field], dtype=DTYPES[field]) for field in GRIDS}
+        self.shape = self.grids["type"].shape
+        self.tables = {}
+
+    def table(self, name):
+        """
+        :param name: a field of FIELDS, "<field>^2" (its squares), or a cell type (its number of cells).
+        :return: the summed-area table of the value.
+        """
+        if name not in self.tables:
+            if name in TYPES:
+                self.tables[name] = summedArea(self.grids["type"] == TYPES.index(name), np.int64)
+            elif name.endswith("^2"):
+                self.tables[name] = summedArea(np.square(self.grids[name[:-2]], dtype=np.float64))
+            else:
+                self.tables[name] = summedArea(self.grids[name])
+        return self.tables[name]
+
+    def sums(self, name, top, left, bottom, right):
+        """
+        :param name: the summed value (see table).
+        :return: the sum of the value in every rectangle (the corners can be arrays of many rectangles,
+                 the bottom row and the right column are not part of a rectangle).
+        """
+        return rectangleSums(self.table(name), top, left, bottom, right)
+
+    def query(self, top, left, bottom, right):
+        """
+        :return: the stats of a rectangle, like the stats of a region (see Regions.summary).
+        """
+        if not (0 <= top < bottom <= self.shape[0] and 0 <= left < right <= self.shape[1]):
+            raise ValueError("Rectangle {} is empty or outside the {}x{} world".format(
+                [top, left, bottom, right], *self.shape))
+        cells = (bottom - top) * (right - left)
+        data = {"cells": cells}
+        for key, field in FIELDS.items():
+            data[key] = moments(cells, float(self.sums(field, top, left, bottom, right)),
+                                float(self.sums(field + "^2", top, left, bottom, right)))
+        data["types"] = {cellType: int(self.sums(cellType, top, left, bottom, right)) for cellType in TYPES}
+        return data
+
+    def bands(self, count):
+        """
+        :param count: number of latitude bands.
+        :return: list of the stats of the bands the rows are split into, from the top.
+        """
+        edges = np.linspace(0, self.shape[0], count + 1).round().astype(int).tolist()
+        return [self.query(top, 0, bottom, self.shape[1]) for top, bottom in zip(edges, edges[1:]) if bottom > top]
+
+
+def main(args=None):
+    """
+    Command line summary of the regions of a world.
+    """
+    parser = argparse.ArgumentParser(description="Print the regions of a world and their cells.")
+    parser.add_argument("regions", help="JSON regions file")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE, help="world file (text or binary)")
+    options = parser.parse_args(args)
+
+    types = world_file.readWorld(options.world)
+    regions = readRegions(options.regions, types.shape)
+    regions.update(0, {"temperature": np.zeros(types.shape), "pollution": np.zeros(types.shape), "type": types})
+    print("{} regions, {} classes of cells".format(len(regions.names), len(regions.membership)))
+    for name, data in regions.summary().items():
+        print("{:<20} {:>8} cells  {}".format(name, data["cells"], ", ".join(
+            "{} {}".format(count, cellType) for cellType, count in data["types"].items() if count)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+import numpy as np
+import series_file
+
+# Columns of a run used by the reports (see series_file.AGGREGATES)
+COLUMNS = ["generation", "temp.avg", "temp.stdev", "temp.min", "temp.max",
+           "pollution.avg", "pollution.stdev", "pollution.min", "pollution.max", "forests", "sea", "glaciers"]
+
+# The figures of a report: file name suffix of each one and its size in inches
+FIGURES = {"overtime": None, "normalized": None, "pollution-effect": (8, 8)}
+FORMATS = ["png", "svg"]
+
+
+def statsColumns(stats):
+    """
+    Converts the stats of a run (EchoSystem.stats, or the stats of a runner JSON file) to columns.
+
+    :param stats: dict of generation to its stats.
+    :return: dict of column name to array, a value for every generation (by generation order).
+    """
+    gens = sorted(stats, key=int)
+    rows = [stats[gen] for gen in gens]
+    columns = {"generation": np.array([int(gen) for gen in gens], dtype=np.int64)}
+    for name in ("temp", "pollution"):
+        for value in ("avg", "stdev", "min", "max"):
+            columns["{}.{}".format(name, value)] = np.array([row[name][value] for row in rows], dtype=float)
+    for name in ("forests", "sea", "glaciers"):
+        columns[name] = np.array([row[name] for row in rows], dtype=np.int64)
+    columns["cells"] = np.array([sum(row["types"].values()) for row in rows], dtype=np.int64)
+    return columns
+
+
+def loadRun(path):
+    """
+    Loads the columns of a saved run: a series directory (series_file.py) or a runner JSON stats file.
+
+    :param path: path of the run output.
+    :return: dict of column name to array, a value for every generation.
+    """
+    if os.path.isdir(path):
+        series = series_file.readSeries(path)
+        columns = {name: np.asarray(series[name]) for name in COLUMNS}
+        columns["cells"] = np.asarray(series["types"]).sum(axis=1)
+        return columns
+    with open(path) as f:
+        return statsColumns(json.load(f)["stats"])
+
+
+def normalize(values):
+    """
+    :return: the values minus their mean, divided by their sample stdev (like statistics.stdev).
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        return np.zeros_like(values)
+    stdev = values.std(ddof=1)
+    return (values - values.mean()) / (stdev if stdev else 1)
+
+
+def totals(columns, name):
+    """
+    Merges the per-generation avg and stdev of a value into the run-wide ones
+    (the vectorized form of merging the RunningStats of every generation).
+
+    :param columns: the columns of a run.
+    :param name: "temp" or "pollution".
+    :return: dict with the run-wide avg, stdev, min and max of the value.
+    """
+    counts = columns["cells"].astype(float)
+    means = columns[name + ".avg"]
+    if not len(means):
+        return {"avg": 0.0, "stdev": 0.0, "min": None, "max": None}
+    total = counts.sum()
+    mean = (counts * means).sum() / total
+    squares = ((counts - 1) * columns[name + ".stdev"] ** 2 + counts * (means - mean) ** 2).sum()
+    return {"avg": float(mean),
+            "stdev": float(np.sqrt(squares / (total - 1))) if total > 1 else 0.0,
+            "min": float(columns[name + ".min"].min()),
+            "max": float(columns[name + ".max"].max())}
+
+
+def formatStats(columns):
+    """
+    :return: the text of the temperature and pollution totals of a run (like Gui.printStats).
+    """
+    lines = []
+    for name, title in (("temp", "Temperature"), ("pollution", "Pollution")):
+        values = totals(columns, name)
+        lines.append("{} max = {}".format(title, values["max"]))
+        lines.append("{} min = {}".format(title, values["min"]))
+        lines.append("{} avg = {}".format(title, values["avg"]))
+        lines.append("{} stdev = {}".format(title, values["stdev"]))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def plotGraph(axes, x, ys, title, xlabel, ylabel):
+    """
+    Draws a graph with a legend and a grid.
+
+    :param ys: list of (values, keyword arguments of plot) - a line for each.
+    """
+    axes.set_title(title)
+    for values, kwargs in ys:
+        axes.plot(x, values, **kwargs)
+    axes.grid(True)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.legend()
+
+
+def drawFigures(columns, figures):
+    """
+    Draws the three report figures:
+        1. Temperature and pollution avg and stdev overtime.
+        2. Normalized temperature and pollution overtime.
+        3. Avg pollution level impact on temperature, forests, seas and glaciers.
+
+    :param columns: the columns of a run.
+    :param figures: dict of name (see FIGURES) to an empty matplotlib Figure.
+    """
+    gens = columns["generation"]
+    temp = columns["temp.avg"]
+    pollution = columns["pollution.avg"]
+
+    figure = figures["overtime"]
+    figure.subplots_adjust(hspace=0.5)
+    plotGraph(figure.add_subplot(211), gens,
+              [(temp, dict(label="temp_avg", color="blue")),
+               (columns["temp.stdev"], dict(label="temp_stdev", linestyle="dashed"))],
+              "Temperature avg and stdev overtime", "Generations", "Temperature")
+    plotGraph(figure.add_subplot(212), gens,
+              [(pollution, dict(label="pollution_avg", color="blue")),
+               (columns["pollution.stdev"], dict(label="pollution_stdev", linestyle="dashed"))],
+              "Pollution avg and and stdev overtime", "Generations", "Pollution")
+
+    figure = figures["normalized"]
+    figure.subplots_adjust(hspace=0.5)
+    plotGraph(figure.add_subplot(211), gens, [(normalize(temp), dict(label="normalized_temp"))],
+              "Normalized temperature overtime", "Generations", "Temperature")
+    plotGraph(figure.add_subplot(212), gens, [(normalize(pollution), dict(label="normalized_pollution"))],
+              "Normalized pollution overtime", "Generations", "Pollution")
+
+    figure = figures["pollution-effect"]
+    figure.subplots_adjust(hspace=0.9)
+    effects = [(temp, "Pollution and temperature", "Temperature", dict(label="temp_avg", color="red")),
+               (columns["forests"], "Pollution and forests number", "Forests", dict(label="forests", color="green")),
+               (columns["sea"], "Pollution and seas number", "Sea", dict(label="seas", color="blue")),
+               (columns["glaciers"], "Pollution and glaciers number", "Glaciers", dict(label="glaciers", color="grey"))]
+    for i, (values, title, ylabel, kwargs) in enumerate(effects):
+        plotGraph(figure.add_subplot(411 + i), pollution, [(values, kwargs)], title, "Pollution", ylabel)
+
+
+def reportName(path):
+    """
+    :param path: path of the run output.
+    :return: the name of the report files of the run - its file name and a short hash of its full path, so runs
+             of the same name in different directories don't overwrite each other's reports.
+    """
+    path = os.path.abspath(os.path.normpath(path))
+    digest = hashlib.sha256(path.encode()).hexdigest()[:8]
+    return "{}-{}".format(os.path.splitext(os.path.basename(path))[0], digest)
+
+
+def writeReport(path, outputDir, formats=("png",)):
+    """
+    Renders the report of a saved run to image files, without a display.
+
+    :param path: path of the run output (a series directory or a runner JSON stats file).
+    :param outputDir: directory of the report files, named after the run (see reportName).
+    :param formats: image formats of the figures (png, svg).
+    :return: list of the written files.
+    """
+    # The figures are drawn by the Agg renderer, not by a window of pyplot
+    from matplotlib.figure import Figure
+
+    columns = loadRun(path)
+    name = reportName(path)
+    os.makedirs(outputDir, exist_ok=True)
+    figures = {figure: Figure(figsize=size) for figure, size in FIGURES.items()}
+    drawFigures(columns, figures)
+
+    written = []
+    for figure, fig in figures.items():
+        for fmt in formats:
+            written.append(os.path.join(outputDir, "{}-{}.{}".format(name, figure, fmt)))
+            fig.savefig(written[-1], format=fmt)
+    written.append(os.path.join(outputDir, "{}-stats.txt".format(name)))
+    with open(written[-1], 'w') as f:
+        f.write(formatStats(columns))
+    return written
+
+
+def _writeReport(task):
+    """
+    writeReport of a single run (in a worker process).
+    """
+    return writeReport(*task)
+
+
+def main(args=None):
+    """
+    Command line report generator, for any number of saved runs.
+    """
+    parser = argparse.ArgumentParser(description="Render the reports of saved runs to image files.")
+    parser.add_argument("runs", nargs="+", help="series directories or runner JSON stats files")
+    parser.add_argument("-d", "--output-dir", default="reports",
+                        help="directory of the report files (default: %(default)s)")
+    parser.add_argument("-f", "--formats", nargs="+", choices=FORMATS, default=["png"],
+                        help="image formats (default: png)")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="number of worker processes (default: %(default)s)")
+    options = parser.parse_args(args)
+
+    tasks = [(path, options.output_dir, options.formats) for path in options.runs]
+    if options.processes > 1:
+        with Pool(options.processes) as pool:
+            results = pool.map(_writeReport, tasks)
+    else:
+        results = [_writeReport(task) for task in tasks]
+    for path, written in zip(options.runs, results):
+        print("{}: {} files written to {}".format(path, len(written), options.output_dir))
+
+
+if __name__ == "__main__":
+    main()
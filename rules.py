@@ -0,0 +1,355 @@
+import operator
+import time
+import numpy as np
+import constants as const
+
+# Integer codes of the cell types (the same codes as in Cell)
+TYPES = list(const.CELL_TYPES)
+
+# The counters of the EchoSystem the rules change
+COUNTERS = ["forests", "sea", "glaciers"]
+
+# The fields of a cell the conditions of the rules test, and the attribute of the Cell holding them
+CONDITION_FIELDS = {"temperature": "temperature",
+                    "pollution": "pollution",
+                    "windSpeed": "windSpeed",
+                    "clouds": "clouds",
+                    "rain": "rain"}
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+             "==": operator.eq, "!=": operator.ne}
+MAX_CONDITIONS = 16     # The arrays kernel has a table entry for every type and combination of the conditions
+
+# The rules every cell applies in every generation, in order, before its wind blows.
+# A rule applies to the cells of its "type" (every type if it has none) meeting all of its "all"
+# conditions and at least one of its "any" conditions, a condition being (field, operator, value).
+# A rule with "else" only applies to a cell none of the rules of its chain (the rules before it, up
+# to a rule without "else") applied to, like an if/elif chain, and has the name of the rule before it.
+# A rule sets the "nextType" of the cell, adds to its "pollution" (clipped to MIN_POLLUTION and
+# MAX_POLLUTION after every addition) and its "temperature", and adds its "counters" to the counters
+# of the EchoSystem (a rule changing counters changes the type of the cell).
+# The conditions are tested on the values of the cells before the generation. A value which is a
+# name is the value of that constant when the rule is applied.
+RULES = [
+    # City increases pollution by CITY_POLLUTION
+    {"name": "city", "type": "city", "pollution": "CITY_POLLUTION"},
+    # Forest turns to earth at 60 degrees or 100 pollution, else it changes pollution by FOREST_POLLUTION
+    {"name": "forest", "type": "forest", "any": [("temperature", ">=", 60), ("pollution", ">=", 100)],
+     "nextType": "earth", "counters": {"forests": -1}},
+    {"name": "forest", "type": "forest", "else": True, "pollution": "FOREST_POLLUTION"},
+    # Glacier melts into sea above 0 degrees or at 100 pollution
+    {"name": "glacier", "type": "glacier", "any": [("temperature", ">", 0), ("pollution", ">=", 100)],
+     "nextType": "sea", "counters": {"sea": 1, "glaciers": -1}},
+    # Sea evaporates above 100 degrees and freezes below -10 degrees
+    {"name": "sea", "type": "sea", "all": [("temperature", ">", 100)],
+     "nextType": "earth", "counters": {"sea": -1}},
+    {"name": "sea", "type": "sea", "else": True, "all": [("temperature", "<", -10)],
+     "nextType": "glacier", "counters": {"sea": -1, "glaciers": 1}},
+    # Rain changes pollution by RAIN_POLLUTION and temperature by RAIN_TEMP
+    {"name": "rain", "all": [("rain", "==", True)], "pollution": "RAIN_POLLUTION", "temperature": "RAIN_TEMP"},
+    # High pollution increases temperature by POLLUTION_HEAT, low temperature reduces pollution
+    {"name": "pollution", "all": [("pollution", ">", 50)], "temperature": "POLLUTION_HEAT"},
+    {"name": "pollution", "all": [("temperature", "<", 10)], "pollution": -2},
+]
+ACTIONS = ["nextType", "pollution", "temperature", "counters"]
+
+
+def checkRules(rules):
+    """
+    Raises ValueError if a table of rules is malformed.
+
+    :param rules: list of rules (see RULES).
+    """
+    seen = {}   # The counter changes of every (type, nextType) change
+    for index, rule in enumerate(rules):
+        where = "Rule {} ({})".format(index, rule.get("name"))
+        unknown = set(rule) - {"name", "type", "else", "all", "any"} - set(ACTIONS)
+        if unknown:
+            raise ValueError("{}: unknown keys {}".format(where, sorted(unknown)))
+        if "name" not in rule:
+            raise ValueError("{}: a rule needs a name".format(where))
+        if rule.get("else") and index == 0:
+            raise ValueError("{}: the first rule can't be an else rule".format(where))
+        if rule.get("else") and rule["name"] != rules[index - 1].get("name"):
+            # A chain is timed as one rule when profiling
+            raise ValueError("{}: an else rule needs the name of the rule before it".format(where))
+        for key in ("type", "nextType"):
+            if key in rule and rule[key] not in TYPES:
+                raise ValueError("{}: unknown cell type '{}'".format(where, rule[key]))
+        for field, op, value in rule.get("all", []) + rule.get("any", []):
+            if field not in CONDITION_FIELDS:
+                raise ValueError("{}: unknown field '{}', expected one of {}".format(where, field,
+                                                                                     list(CONDITION_FIELDS)))
+            if op not in OPERATORS:
+                raise ValueError("{}: unknown operator '{}'".format(where, op))
+            checkValue(where, value)
+        for key in ("pollution", "temperature"):
+            if key in rule:
+                checkValue(where, rule[key])
+        counters = rule.get("counters", {})
+        if set(counters) - set(COUNTERS):
+            raise ValueError("{}: unknown counters {}".format(where, sorted(set(counters) - set(COUNTERS))))
+        if counters and not ("type" in rule and rule.get("nextType", rule["type"]) != rule["type"]):
+            raise ValueError("{}: only a rule changing the type of a cell can change the counters".format(where))
+        if "nextType" in rule and "type" in rule:
+            change = (rule["type"], rule["nextType"])
+            if seen.setdefault(change, counters) != counters:
+                raise ValueError("{}: rules turning {} into {} change the counters differently".format(where, *change))
+    if len(conditions(rules)) > MAX_CONDITIONS:
+        raise ValueError("The rules have more than {} different conditions".format(MAX_CONDITIONS))
+
+
+def checkValue(where, value):
+    """
+    Raises ValueError if a value of a rule isn't a number, a bool or the name of a constant.
+    """
+    if isinstance(value, str):
+        if not value.isupper() or not hasattr(const, value):
+            raise ValueError("{}: unknown constant '{}'".format(where, value))
+    elif not isinstance(value, (int, float)):
+        raise ValueError("{}: {!r} isn't a number or a constant name".format(where, value))
+
+
+def resolve(value):
+    """
+    :return: the value of a rule value (the current value of a constant given by name).
+    """
+    return getattr(const, value) if isinstance(value, str) else value
+
+
+def conditions(rules):
+    """
+    :return: list of the different conditions of the rules, in the order they first appear.
+    """
+    result = []
+    for rule in rules:
+        for condition in rule.get("all", []) + rule.get("any", []):
+            if tuple(condition) not in result:
+                result.append(tuple(condition))
+    return result
+
+
+def transitions(rules):
+    """
+    :return: dict of (type code, next type code) to the counter changes (dict of counter name to change)
+             of every type change the rules make.
+    """
+    result = {}
+    for rule in rules:
+        if "nextType" in rule:
+            for cellType in ([rule["type"]] if "type" in rule else TYPES):
+                if cellType != rule["nextType"]:
+                    result[TYPES.index(cellType), TYPES.index(rule["nextType"])] = rule.get("counters", {})
+    return result
+
+
+def countChanges(cellType, nextType, axis=None):
+    """
+    :param cellType: array of the type codes of cells.
+    :param nextType: array of their next type codes.
+    :param axis: the axis the cells are counted along (None - all the cells).
+    :return: list of the changes of the COUNTERS made by the type changes of the cells.
+    """
+    changes = [0] * len(COUNTERS)
+    for (old, new), counters in TRANSITIONS.items():
+        if counters:
+            count = np.count_nonzero((cellType == old) & (nextType == new), axis=axis)
+            for i, name in enumerate(COUNTERS):
+                changes[i] = changes[i] + counters.get(name, 0) * count
+    return changes
+
+
+def cellSource(rules, name, profile=False):
+    """
+    Compiles the rules into the source of a single function applying all of them to a Cell, with
+    every rule inlined (no method is called per rule).
+
+    :param rules: list of rules (see RULES).
+    :param name: name of the function.
+    :param profile: if True, the function times every rule (with the rules after it of the same name), guard
+                    and effect, and adds the time to a Profiler (its second argument), with whether the rules
+                    changed the next type, pollution (after clipping) or temperature of the cell.
+    :return: the source of the function.
+    """
+    def value(v):
+        return "const." + v if isinstance(v, str) else repr(v)
+
+    used = {field for rule in rules for field, _, _ in rule.get("all", []) + rule.get("any", [])}
+    lines = ["def {}(cell{}):".format(name, ", profiler" if profile else "")]
+    lines.append("    cellType = cell.typeCode")
+    lines += ["    {} = cell.{}".format(field, CONDITION_FIELDS[field]) for field in CONDITION_FIELDS if field in used]
+    if any(rule.get("counters") for rule in rules):
+        lines.append("    echoSystem = cell.echoSystem")
+    lines.append("    nextPollution = cell.nextPollution")
+    lines.append("    nextTemperature = cell.nextTemperature")
+    for index, rule in enumerate(rules):
+        if profile and (index == 0 or rules[index - 1]["name"] != rule["name"]):
+            lines += ["    start = perf_counter()", "    changed = 0"]
+        tests = []
+        if "type" in rule:
+            tests.append("cellType == {}".format(TYPES.index(rule["type"])))
+        tests += ["{} {} {}".format(field, op, value(v)) for field, op, v in rule.get("all", [])]
+        if rule.get("any"):
+            tests.append("(" + " or ".join("{} {} {}".format(field, op, value(v))
+                                           for field, op, v in rule["any"]) + ")")
+        lines.append("    {} {}:".format("elif" if rule.get("else") else "if", " and ".join(tests) or "True"))
+        body = []
+        if profile:
+            body.append("before = (cell.nextTypeCode, nextPollution, nextTemperature)")
+        if "nextType" in rule:
+            body.append("cell.nextTypeCode = {}".format(TYPES.index(rule["nextType"])))
+        if "pollution" in rule:
+            body += ["nextPollution += {}".format(value(rule["pollution"])),
+                     "if nextPollution > const.MAX_POLLUTION:",
+                     "    nextPollution = const.MAX_POLLUTION",
+                     "elif nextPollution < const.MIN_POLLUTION:",
+                     "    nextPollution = const.MIN_POLLUTION"]
+        if "temperature" in rule:
+            body.append("nextTemperature += {}".format(value(rule["temperature"])))
+        for counter, change in rule.get("counters", {}).items():
+            body.append("echoSystem.{} += {}".format(counter, change))
+        if profile:
+            body += ["if (cell.nextTypeCode, nextPollution, nextTemperature) != before:",
+                     "    changed = 1"]
+        lines += ["        " + line for line in body or ["pass"]]
+        if profile and (index == len(rules) - 1 or rules[index + 1]["name"] != rule["name"]):
+            lines.append("    profiler.addRule({!r}, perf_counter() - start, 1, changed)".format(rule["name"]))
+    lines.append("    cell.nextPollution = nextPollution")
+    lines.append("    cell.nextTemperature = nextTemperature")
+    return "\n".join(lines) + "\n"
+
+
+def compileCell(rules, name, profile=False):
+    """
+    :return: the function compiled from the source of cellSource.
+    """
+    namespace = {"const": const, "perf_counter": time.perf_counter}
+    exec(compile(cellSource(rules, name, profile), "<rules>", "exec"), namespace)
+    return namespace[name]
+
+
+def ruleMask(rule, cellType, fields):
+    """
+    :param rule: a rule (see RULES).
+    :param cellType: flat array of the type codes of the cells.
+    :param fields: dict of field name to flat array of the cells, for the fields of the conditions.
+    :return: bool array of the cells the rule applies to, unless a rule before it in its chain does.
+    """
+    applies = np.ones(len(cellType), dtype=bool) if "type" not in rule else cellType == TYPES.index(rule["type"])
+    for field, op, value in rule.get("all", []):
+        applies &= OPERATORS[op](fields[field], resolve(value))
+    if rule.get("any"):
+        anyHolds = np.zeros(len(cellType), dtype=bool)
+        for field, op, value in rule["any"]:
+            anyHolds |= OPERATORS[op](fields[field], resolve(value))
+        applies &= anyHolds
+    return applies
+
+
+class ArrayRules:
+    """
+    The rules compiled into tables for the engines applying them to all the cells at once.
+    A cell's key is its type and which of the conditions of the rules hold for it, and the tables
+    hold the actions of the rules applied to every key - so all the rules are applied with a single
+    key per cell, and each action with a single lookup of the keys.
+    The actions of a key are numbered in the order they're made: its i-th pollution change is
+    pollution[i][key] (0 - none), made at step pollutionSteps[i][key] of its cell's sequence of
+    changes, and likewise for its temperature changes.
+    """
+    def __init__(self, rules, values):
+        """
+        Init function for class ArrayRules.
+
+        :param rules: list of rules (see RULES).
+        :param values: the value of every rule value (see resolve), by the value.
+        """
+        self.conditions = conditions(rules)
+        bits = len(self.conditions)
+        self.size = len(TYPES) << bits
+        actions = {key: [] for key in ("pollution", "temperature")}
+        nextType = np.empty(self.size, dtype=np.int8)
+        self.counters = np.zeros((self.size, len(COUNTERS)), dtype=np.int64)
+        for key in range(self.size):
+            cellType = key >> bits
+            holds = {condition: bool(key >> i & 1) for i, condition in enumerate(self.conditions)}
+            nextType[key] = cellType
+            applied = False     # A rule of the current chain was applied
+            made = {"pollution": [], "temperature": []}
+            for step, rule in enumerate(rules):
+                if not rule.get("else"):
+                    applied = False
+                elif applied:
+                    continue
+                if "type" in rule and TYPES.index(rule["type"]) != cellType:
+                    continue
+                if not all(holds[tuple(c)] for c in rule.get("all", [])):
+                    continue
+                if rule.get("any") and not any(holds[tuple(c)] for c in rule["any"]):
+                    continue
+                applied = True
+                if "nextType" in rule:
+                    nextType[key] = TYPES.index(rule["nextType"])
+                for action in made:
+                    if action in rule:
+                        made[action].append((step, values[rule[action]]))
+                for counter, change in rule.get("counters", {}).items():
+                    self.counters[key, COUNTERS.index(counter)] += change
+            for action in made:
+                actions[action].append(made[action])
+        self.nextType = nextType
+        # The keys are built in the narrowest integer type holding them
+        self.keyType = np.min_scalar_type(self.size - 1)
+        self.pollution, self.pollutionSteps = self.actionTables(actions["pollution"], np.int32)
+        self.temperature, _ = self.actionTables(actions["temperature"], np.float64)
+        # makesPollution[i][key] - the key makes an i-th pollution change, likewise makesTemperature
+        self.makesPollution = [table != 0 for table in self.pollution]
+        self.makesTemperature = [table != 0 for table in self.temperature]
+
+    def actionTables(self, actions, dtype):
+        """
+        :param actions: list of the (step, value) changes of every key.
+        :return: (list of the tables of the i-th change of every key, list of the tables of their steps).
+        """
+        tables = []
+        steps = []
+        for i in range(max(map(len, actions), default=0)):
+            tables.append(np.array([made[i][1] if i < len(made) else 0 for made in actions], dtype=dtype))
+            steps.append(np.array([made[i][0] if i < len(made) else 0 for made in actions], dtype=np.int64))
+        return tables, steps
+
+    def keys(self, cellType, fields):
+        """
+        :param cellType: flat array of the type codes of the cells.
+        :param fields: dict of field name to flat array of the cells, for the fields of the conditions.
+        :return: the key of every cell.
+        """
+        key = cellType.astype(self.keyType) << len(self.conditions)
+        for bit, (field, op, value) in enumerate(self.conditions):
+            key += OPERATORS[op](fields[field], resolve(value)) * self.keyType.type(1 << bit)
+        return key.astype(np.intp)
+
+
+def arrayRules(rules=None):
+    """
+    :param rules: list of rules (None - RULES).
+    :return: the ArrayRules of the rules with the current values of the constants (compiled once for
+             every set of values).
+    """
+    rules = RULES if rules is None else rules
+    values = {}
+    for rule in rules:
+        for action in ("pollution", "temperature"):
+            if action in rule:
+                values[rule[action]] = resolve(rule[action])
+    cacheKey = (id(rules), tuple(sorted(values.items(), key=repr)))
+    if cacheKey not in _arrayRules:
+        # The entry keeps the list of rules, so its id isn't reused by another list while it's cached
+        _arrayRules[cacheKey] = (rules, ArrayRules(rules, values))
+    return _arrayRules[cacheKey][1]
+
+
+_arrayRules = {}
+checkRules(RULES)
+TRANSITIONS = transitions(RULES)
+NAMES = list(dict.fromkeys(rule["name"] for rule in RULES))
+applyCellRules = compileCell(RULES, "applyCellRules")
+profileCellRules = compileCell(RULES, "profileCellRules", profile=True)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import time
+from collections import deque
+import constants as const
+import profiler
+from echo_system import EchoSystem
+
+
+def run(generations=const.STOP_GEN, engine=const.ENGINE, seed=None, output=None, quiet=False,
+        worldFile=const.WORLD_FILE, checkpoint=None, checkpointEvery=None, resume=None, profile=False,
+        profileTrace=None, series=None, seriesGrids=False, cycles=0, history=None,
+        historyKeyframes=const.HISTORY_KEYFRAMES, regions=None):
+    """
+    Runs the EchoSystem without a GUI, as fast as possible.
+
+    :param generations: number of generations to run.
+    :param engine: the simulation engine (see constants.ENGINES).
+    :param seed: seed for the random initial conditions (None - not seeded).
+    :param output: path of a JSON file the stats are written to (None - not written).
+    :param quiet: if True, nothing is printed.
+    :param worldFile: the world file (text or binary).
+    :param checkpoint: path of a checkpoint file saved at the end of the run (None - not saved).
+    :param checkpointEvery: the checkpoint is also saved every this many generations (None - only at the end).
+    :param resume: path of a checkpoint file the run continues from (the engine, seed and world are ignored).
+    :param profile: if True, the phases and rules of every generation are timed and their summary is printed.
+    :param profileTrace: path of a JSON lines file the profile of every generation is written to (implies profile).
+    :param series: directory of a series the stats of every generation are streamed to (None - not written).
+    :param seriesGrids: if True, the series holds the temperature, pollution and type of every cell as well.
+    :param cycles: fixed points and cycles of up to this many generations are detected and skipped (0 - not detected).
+    :param history: path of a history file the cells of every generation are recorded to (None - not recorded).
+    :param historyKeyframes: number of generations between two keyframes of the history.
+    :param regions: path of a JSON regions file whose aggregates are added to the stats (None - none).
+    :return: the EchoSystem after the run.
+    """
+    if resume is not None:
+        echoSystem = EchoSystem.loadCheckpoint(resume)
+        engine = echoSystem.engine
+    else:
+        if seed is not None:
+            random.seed(seed)
+        echoSystem = EchoSystem(engine, worldFile=worldFile)
+    # A resumed run keeps the generations its cycle detection saw
+    echoSystem.recent = deque(echoSystem.recent, maxlen=cycles)
+    if profile or profileTrace is not None:
+        echoSystem.profiler = profiler.Profiler(profileTrace)
+    if regions is not None:
+        echoSystem.openRegions(regions)
+    if series is not None:
+        echoSystem.openSeries(series, seriesGrids)
+    if history is not None:
+        echoSystem.openHistory(history, historyKeyframes)
+
+    first = echoSystem.generation
+    interval = echoSystem.generation // checkpointEvery if checkpointEvery else None
+    start = time.perf_counter()
+    while echoSystem.generation < generations:
+        echoSystem.updateWorld()
+        if echoSystem.convergence is not None:
+            # The rest of the run repeats the cycle
+            echoSystem.skipCycles(generations)
+        # Saved whenever a step reaches the next interval (skipping cycles can jump past its first generation)
+        if checkpoint is not None and checkpointEvery and echoSystem.generation // checkpointEvery > interval:
+            interval = echoSystem.generation // checkpointEvery
+            echoSystem.saveCheckpoint(checkpoint)
+    elapsed = time.perf_counter() - start
+    generations = echoSystem.generation - first
+    if checkpoint is not None:
+        echoSystem.saveCheckpoint(checkpoint)
+
+    if not quiet:
+        rate = generations / elapsed if elapsed > 0 else float("inf")
+        print("{} generations in {:.3f} seconds ({:.1f} generations/sec)".format(generations, elapsed, rate))
+        if echoSystem.convergence is not None:
+            print("Entered a cycle of {period} generations at generation {generation}".format(
+                **echoSystem.convergence))
+        if echoSystem.profiler is not None:
+            print(echoSystem.profiler.summary())
+    if echoSystem.profiler is not None:
+        echoSystem.profiler.close()
+    if echoSystem.series is not None:
+        echoSystem.series.close()
+    if echoSystem.history is not None:
+        echoSystem.history.close()
+    if output is not None:
+        writeStats(echoSystem, output, engine=engine, seed=seed, world=worldFile, seconds=elapsed)
+    return echoSystem
+
+
+def runStats(echoSystem, **info):
+    """
+    :param echoSystem: the EchoSystem.
+    :param info: extra values describing the run (engine, seed etc.).
+    :return: dict of the stats of the EchoSystem, as written by writeStats.
+    """
+    data = dict(info)
+    data["generations"] = echoSystem.generation
+    data["stats"] = echoSystem.stats
+    data["totals"] = {name: acc.summary() for name, acc in echoSystem.totals.items()}
+    data["convergence"] = echoSystem.convergence
+    return data
+
+
+def writeStats(echoSystem, path, **info):
+    """
+    Writes the stats of an EchoSystem to a JSON file.
+
+    :param echoSystem: the EchoSystem.
+    :param path: path of the JSON file.
+    :param info: extra values describing the run (engine, seed etc.).
+    """
+    with open(path, 'w') as f:
+        json.dump(runStats(echoSystem, **info), f)
+
+
+def main(args=None):
+    """
+    Command line interface of the headless runner.
+    """
+    parser = argparse.ArgumentParser(description="Run the ecosystem cellular automaton without a GUI.")
+    parser.add_argument("-g", "--generations", type=int, default=const.STOP_GEN,
+                        help="number of generations to run (default: %(default)s)")
+    parser.add_argument("-e", "--engine", choices=const.ENGINES, default=const.ENGINE,
+                        help="simulation engine (default: %(default)s)")
+    parser.add_argument("-s", "--seed", type=int, help="seed for the random initial conditions")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE,
+                        help="world file, text or binary (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="JSON file the stats are written to")
+    parser.add_argument("-c", "--checkpoint", help="checkpoint file saved at the end of the run")
+    parser.add_argument("--checkpoint-every", type=int, help="also save the checkpoint every this many generations")
+    parser.add_argument("-r", "--resume", help="checkpoint file the run continues from")
+    parser.add_argument("-p", "--profile", action="store_true", help="time the phases and rules of every generation")
+    parser.add_argument("--profile-trace", help="JSON lines file the profile of every generation is written to")
+    parser.add_argument("--series", help="directory the stats of every generation are streamed to")
+    parser.add_argument("--series-grids", action="store_true",
+                        help="also stream the temperature, pollution and type of every cell")
+    parser.add_argument("--history", help="history file the cells of every generation are recorded to")
+    parser.add_argument("--history-keyframes", type=int, default=const.HISTORY_KEYFRAMES,
+                        help="generations between two keyframes of the history (default: %(default)s)")
+    parser.add_argument("-k", "--cycles", type=int, default=0,
+                        help="detect fixed points and cycles of up to this many generations and skip them")
+    parser.add_argument("--regions", help="JSON regions file whose aggregates are added to the stats")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print the run speed")
+    options = parser.parse_args(args)
+    run(options.generations, options.engine, options.seed, options.output, options.quiet, options.world,
+        options.checkpoint, options.checkpoint_every, options.resume, options.profile, options.profile_trace,
+        options.series, options.series_grids, options.cycles, options.history, options.history_keyframes,
+        options.regions)
+
+
+if __name__ == "__main__":
+    main()
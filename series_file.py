@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import numpy as np
+import constants as const
+from array_engine import TYPES, DTYPES
+
+# A series is a directory with a column file for every value, holding a row for every generation
+# (little-endian, row after row, appended in chunks), and a JSON file describing the columns.
+META_FILE = "series.json"
+FORMAT = "ECOSER01"
+
+# Columns of the per-generation aggregates (EchoSystem.stats): name, dtype and shape of a row
+AGGREGATES = [("generation", "<i4", ())]
+AGGREGATES += [("{}.{}".format(name, value), "<f8", ()) for name in ("temp", "pollution")
+               for value in ("avg", "stdev", "min", "max")]
+AGGREGATES += [("types", "<i4", (len(TYPES),)), ("forests", "<i4", ()), ("sea", "<i4", ()), ("glaciers", "<i4", ())]
+
+# Columns of the region aggregates (EchoSystem.stats[generation]["regions"]), with a value for every
+# region, written only if the EchoSystem has regions (their names are the "regions" of the JSON file)
+REGIONS = [("regions.{}.{}".format(name, value), "<f8") for name in ("temp", "pollution")
+           for value in ("avg", "stdev")]
+
+# Grid columns (the value of every cell), written only if asked for
+GRIDS = {"temperature": "temperature", "pollution": "pollution", "type": "type"}
+
+
+def columnFile(path, name):
+    """
+    :return: path of the file of a column.
+    """
+    return os.path.join(path, name + ".bin")
+
+
+class SeriesWriter:
+    """
+    Append-only writer of a series. The rows are buffered and written in chunks of about
+    SERIES_CHUNK_BYTES, a column at a time, so a write adds very little to a generation.
+    """
+    def __init__(self, path, shape, grids=False, append=False, chunkBytes=const.SERIES_CHUNK_BYTES, regions=None):
+        """
+        Init function for class SeriesWriter.
+
+        :param path: directory of the series (created if needed).
+        :param shape: (rows, columns) of the world.
+        :param grids: if True, the temperature, pollution and type of every cell are written as well.
+        :param append: if True, the rows are appended to an existing series of the same world.
+        :param chunkBytes: size of the buffered rows written at once.
+        :param regions: names of the regions whose aggregates are written (None - none).
+        """
+        self.path = path
+        self.shape = tuple(shape)
+        self.grids = grids
+        self.regions = list(regions) if regions else []
+        self.columns = {name: (np.dtype(dtype), shape) for name, dtype, shape in AGGREGATES}
+        if self.regions:
+            for name, dtype in REGIONS:
+                self.columns[name] = (np.dtype(dtype), (len(self.regions),))
+            self.columns["regions.types"] = (np.dtype("<i4"), (len(self.regions), len(TYPES)))
+        if grids:
+            for name, field in GRIDS.items():
+                self.columns["grid." + name] = (np.dtype(DTYPES[field]).newbyteorder("<"), self.shape)
+
+        os.makedirs(path, exist_ok=True)
+        meta = {"format": FORMAT,
+                "shape": list(self.shape),
+                "columns": {name: {"dtype": dtype.str, "shape": list(shape)}
+                            for name, (dtype, shape) in self.columns.items()}}
+        if self.regions:
+            meta["regions"] = self.regions
+        if append and os.path.exists(os.path.join(path, META_FILE)):
+            with open(os.path.join(path, META_FILE)) as f:
+                if json.load(f) != meta:
+                    raise ValueError("{} is a series of a different world".format(path))
+        else:
+            with open(os.path.join(path, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=1)
+            for name in self.columns:
+                open(columnFile(path, name), 'wb').close()
+        self.files = {name: open(columnFile(path, name), 'ab') for name in self.columns}
+
+        rowBytes = sum(dtype.itemsize * int(np.prod(shape)) for dtype, shape in self.columns.values())
+        self.chunk = max(1, chunkBytes // rowBytes)     # Rows buffered before a write
+        self.buffers = {name: np.empty((self.chunk,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in self.columns.items()}
+        self.buffered = 0
+
+    def truncate(self, generation):
+        """
+        Removes the rows of the generation and the ones after it (a run resumed from a checkpoint
+        rewrites them).
+
+        :param generation: the first generation removed.
+        """
+        self.flush()
+        generations = np.array(readSeries(self.path)["generation"])
+        rows = int(np.searchsorted(generations, generation))
+        for name, (dtype, shape) in self.columns.items():
+            self.files[name].truncate(rows * dtype.itemsize * int(np.prod(shape)))
+
+    def append(self, generation, data, grids=None):
+        """
+        Adds the row of a generation.
+
+        :param generation: number of the generation.
+        :param data: the generation's stats (see EchoSystem.calcStats).
+        :param grids: dict of field name to array, the values of every cell (needed if the series has grids).
+        """
+        row = self.buffered
+        buffers = self.buffers
+        buffers["generation"][row] = generation
+        for name in ("temp", "pollution"):
+            for value, number in data[name].items():
+                buffers["{}.{}".format(name, value)][row] = number
+        buffers["types"][row] = [data["types"][cellType] for cellType in TYPES]
+        buffers["forests"][row] = data["forests"]
+        buffers["sea"][row] = data["sea"]
+        buffers["glaciers"][row] = data["glaciers"]
+        if self.regions:
+            regions = [data["regions"][name] for name in self.regions]
+            for name in ("temp", "pollution"):
+                for value in ("avg", "stdev"):
+                    buffers["regions.{}.{}".format(name, value)][row] = [region[name][value] for region in regions]
+            buffers["regions.types"][row] = [[region["types"][cellType] for cellType in TYPES] for region in regions]
+        for name, field in GRIDS.items():
+            if "grid." + name in buffers:
+                buffers["grid." + name][row] = grids[field]
+
+        self.buffered += 1
+        if self.buffered == self.chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows.
+        """
+        if self.buffered:
+            for name, f in self.files.items():
+                f.write(self.buffers[name][:self.buffered].tobytes())
+                f.flush()
+            self.buffered = 0
+
+    def close(self):
+        """
+        Writes the buffered rows and closes the column files.
+        """
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readSeries(path):
+    """
+    Memory-maps the columns of a series, the rows are not read until they are used.
+    A column can be sliced by generation (its first axis) and a grid column by cell as well,
+    e.g. series["grid.temperature"][:, row, col] is the temperature of a cell in every generation.
+
+    :param path: directory of the series.
+    :return: dict of column name to read-only array with a row for every generation written.
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT:
+        raise ValueError("{} is not a series".format(path))
+
+    columns = {}
+    sizes = {}
+    for name, column in meta["columns"].items():
+        dtype = np.dtype(column["dtype"])
+        rowBytes = dtype.itemsize * int(np.prod(column["shape"]))
+        sizes[name] = (dtype, tuple(column["shape"]), rowBytes)
+    # A row is complete once every column holds it
+    rows = min(os.path.getsize(columnFile(path, name)) // rowBytes for name, (_, _, rowBytes) in sizes.items())
+    for name, (dtype, shape, rowBytes) in sizes.items():
+        if rows == 0:
+            columns[name] = np.empty((0,) + shape, dtype=dtype)
+        else:
+            columns[name] = np.memmap(columnFile(path, name), dtype=dtype, mode='r', shape=(rows,) + shape)
+    return columns
+
+
+def main(args=None):
+    """
+    Command line summary of a series.
+    """
+    parser = argparse.ArgumentParser(description="Print the columns and the last aggregates of a series.")
+    parser.add_argument("path", help="directory of the series")
+    options = parser.parse_args(args)
+
+    series = readSeries(options.path)
+    generations = series["generation"]
+    if len(generations):
+        print("{} generations ({} to {})".format(len(generations), generations[0], generations[-1]))
+    else:
+        print("No generations")
+    for name, column in series.items():
+        last = column[-1].tolist() if len(column) and column.ndim <= 2 else ""
+        print("{:<20} {:<6} {:<16} {}".format(name, column.dtype.str, str(column.shape[1:]), last))
+
+
+if __name__ == "__main__":
+    main()
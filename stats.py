@@ -0,0 +1,113 @@
+import math
+
+
+class RunningStats:
+    """
+    Online (Welford) accumulator of the count, mean, stdev, min and max of a stream of values.
+    Uses constant memory no matter how many values are added.
+    """
+    def __init__(self):
+        """
+        Init function for class RunningStats
+        """
+        self.count = 0          # Number of values
+        self.mean = 0.0         # Mean of the values
+        self.m2 = 0.0           # Sum of squared distances from the mean
+        self.min = None         # Smallest value
+        self.max = None         # Largest value
+
+    def add(self, value):
+        """
+        Adds a single value.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Adds all the values of another accumulator (Chan et al. parallel update).
+
+        :param other: RunningStats to merge into this one.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def stdev(self):
+        """
+        :return: the sample standard deviation (like statistics.stdev), 0 for less than two values.
+        """
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def summary(self):
+        """
+        :return: dict with the avg, stdev, min and max of the values.
+        """
+        return {"avg": self.mean, "stdev": self.stdev, "min": self.min, "max": self.max}
+
+    @classmethod
+    def fromArray(cls, values):
+        """
+        Creates an accumulator from a NumPy array in a single vectorized pass.
+
+        :param values: NumPy array of values.
+        """
+        result = cls()
+        if values.size:
+            result.count = int(values.size)
+            result.mean = float(values.mean())
+            result.m2 = float(((values - result.mean) ** 2).sum())
+            result.min = values.min().item()
+            result.max = values.max().item()
+        return result
+
+    @classmethod
+    def fromVars(cls, values):
+        """
+        Creates an accumulator from the attributes of another one (saved with vars, e.g. in a checkpoint).
+
+        :param values: dict of attribute name to value.
+        """
+        result = cls()
+        vars(result).update(values)
+        return result
+
+    @classmethod
+    def fromRows(cls, values):
+        """
+        Creates an accumulator for every row of a 2-D NumPy array, in a single vectorized pass.
+
+        :param values: NumPy array of values, a row for every accumulator.
+        :return: list of RunningStats, one for every row.
+        """
+        if not values.shape[1]:
+            return [cls() for _ in range(values.shape[0])]
+        means = values.mean(axis=1)
+        m2s = ((values - means[:, None]) ** 2).sum(axis=1)
+        results = []
+        for mean, m2, low, high in zip(means.tolist(), m2s.tolist(), values.min(axis=1).tolist(),
+                                       values.max(axis=1).tolist()):
+            result = cls()
+            result.count = int(values.shape[1])
+            result.mean, result.m2, result.min, result.max = mean, m2, low, high
+            results.append(result)
+        return results
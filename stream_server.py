@@ -0,0 +1,432 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import struct
+import time
+import numpy as np
+import constants as const
+import array_engine
+from echo_system import EchoSystem
+
+# A frame is a binary WebSocket message: the header, the JSON list of the aggregates of the
+# generations since the client's previous frame, and the changed cells - their indices (row * cols + col,
+# only when the frame isn't FULL), type codes and (integer) temperatures.
+HEADER = struct.Struct("<BiiiII")   # Flags, generation, rows, columns, number of cells, size of the aggregates
+FULL = 1        # The frame holds every cell (the first frame of a client)
+DONE = 2        # The run ended, no frames follow
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+MAX_PAYLOAD = 4096      # Clients only send pings and close frames, a larger frame closes the connection
+MESSAGE_TOO_BIG = 1009  # Close status of a frame above MAX_PAYLOAD
+
+
+class FrameTooLarge(Exception):
+    """
+    A client sent a frame above MAX_PAYLOAD.
+    """
+
+
+class Snapshot:
+    """
+    The displayed values of the cells at a generation, shared by the clients (never changed).
+    """
+    def __init__(self, generation, types, temps, done=False):
+        self.generation = generation
+        self.types = types
+        self.temps = temps
+        self.done = done
+
+
+class StreamServer:
+    """
+    Local HTTP/WebSocket server streaming a headless EchoSystem run to any number of browsers.
+    The generations are calculated in a worker thread for FRAME_TIME milliseconds, then the last one
+    is published, like in the Gui. Every client is sent the cells changed since the snapshot it was
+    sent last, so a slow client skips generations (its frames are coalesced) and the run never waits
+    for it.
+    """
+    def __init__(self, echoSystem, host=const.STREAM_HOST, port=const.STREAM_PORT, frameTime=const.STREAM_FRAME_TIME):
+        """
+        Init function for class StreamServer.
+
+        :param echoSystem: the EchoSystem of the run.
+        :param host: the address the server listens on.
+        :param port: the port the server listens on (0 - any free port).
+        :param frameTime: milliseconds between two frames published to the clients.
+        """
+        self.echoSystem = echoSystem
+        self.host = host
+        self.port = port
+        self.frameTime = frameTime
+        self.server = None
+        self.shape = None       # (rows, columns) of the world
+        self.clients = {}       # The stream task of every client, by its writer
+        self.snapshot = None    # The last published Snapshot
+        self.published = asyncio.Event()    # Set (and replaced) when a snapshot is published
+        self.aggregates = []    # (generation, aggregates) of the last STREAM_AGGREGATES generations
+        self.messages = {}      # The frames of the last snapshot, by the generation of the client's snapshot
+
+    async def start(self):
+        """
+        Starts listening, and publishes the first generation.
+        """
+        self.publish()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def run(self, generations=const.STOP_GEN):
+        """
+        Runs the EchoSystem up to a generation, publishing a snapshot every frameTime milliseconds.
+
+        :param generations: the generation the run stops at.
+        """
+        loop = asyncio.get_running_loop()
+        while self.echoSystem.generation < generations:
+            await loop.run_in_executor(None, self.stepFrame, generations)
+            self.publish()
+        self.publish(done=True)
+
+    def stepFrame(self, generations):
+        """
+        Calculates generations for frameTime milliseconds (in the worker thread).
+        """
+        deadline = time.perf_counter() + self.frameTime / 1000
+        self.echoSystem.updateWorld()
+        while self.echoSystem.generation < generations and time.perf_counter() < deadline:
+            self.echoSystem.updateWorld()
+
+    def publish(self, done=False):
+        """
+        Publishes the current generation to the clients.
+
+        :param done: if True, the run ended.
+        """
+        echoSystem = self.echoSystem
+        grids = echoSystem.grids()
+        types = np.array(grids["type"], dtype=np.uint8).ravel()
+        temps = np.asarray(grids["temperature"], dtype=float).astype(int)
+        temps = np.clip(temps, -32768, 32767).astype("<i2").ravel()
+        self.shape = np.shape(grids["type"])
+
+        # The aggregates of a generation are calculated when the next one is
+        start = self.aggregates[-1][0] + 1 if self.aggregates else echoSystem.generation - const.STREAM_AGGREGATES
+        for generation in range(start, echoSystem.generation):
+            data = echoSystem.stats.get(generation)
+            if data is not None:
+                self.aggregates.append((generation, dict(data, generation=generation)))
+        del self.aggregates[:-const.STREAM_AGGREGATES]
+
+        self.snapshot = Snapshot(echoSystem.generation, types, temps, done)
+        self.messages = {}
+        self.published.set()
+        self.published = asyncio.Event()
+
+    def message(self, sent):
+        """
+        :param sent: the Snapshot the client was sent last (None - nothing was sent).
+        :return: the frame bringing the client from that snapshot to the last one.
+        """
+        key = None if sent is None else sent.generation
+        if key in self.messages:
+            return self.messages[key]
+        snapshot = self.snapshot
+        flags = DONE if snapshot.done else 0
+        if sent is None:
+            flags |= FULL
+            indices = None
+            types, temps = snapshot.types, snapshot.temps
+        else:
+            indices = np.flatnonzero((snapshot.types != sent.types) | (snapshot.temps != sent.temps)).astype("<u4")
+            types, temps = snapshot.types[indices], snapshot.temps[indices]
+        aggregates = [data for generation, data in self.aggregates if key is None or generation >= key]
+        aggregates = json.dumps(aggregates).encode()
+        rows, cols = self.shape
+        parts = [HEADER.pack(flags, snapshot.generation, rows, cols, len(types), len(aggregates)), aggregates]
+        if indices is not None:
+            parts.append(indices.tobytes())
+        parts += [types.tobytes(), temps.tobytes()]
+        self.messages[key] = encodeFrame(BINARY, b"".join(parts))
+        return self.messages[key]
+
+    async def handle(self, reader, writer):
+        """
+        Serves an HTTP connection: the page of the viewer, or the WebSocket stream.
+        """
+        try:
+            request = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else ""
+            if path == "/stream" and headers.get("upgrade", "").lower() == "websocket":
+                await self.stream(reader, writer, headers["sec-websocket-key"])
+            elif path == "/":
+                writeResponse(writer, "200 OK", "text/html; charset=utf-8", viewerPage().encode())
+            else:
+                writeResponse(writer, "404 Not Found", "text/plain", b"Not found")
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, KeyError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, reader, writer, key):
+        """
+        Sends the frames of the run to a WebSocket client until it disconnects.
+        """
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+        writer.write("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept).encode())
+        self.clients[writer] = asyncio.current_task()
+        receiver = asyncio.ensure_future(self.receive(reader, writer))
+        try:
+            sent = None
+            while not receiver.done():
+                if sent is not self.snapshot:
+                    snapshot = self.snapshot
+                    writer.write(self.message(sent))
+                    sent = snapshot
+                    # A client which doesn't read its frames only slows down its own next frame
+                    await writer.drain()
+                    if sent.done:
+                        break
+                else:
+                    published = asyncio.ensure_future(self.published.wait())
+                    await asyncio.wait([published, receiver], return_when=asyncio.FIRST_COMPLETED)
+                    published.cancel()
+        finally:
+            receiver.cancel()
+            self.clients.pop(writer, None)
+
+    async def receive(self, reader, writer):
+        """
+        Reads the frames of a WebSocket client until it closes the connection, answering its pings.
+        """
+        while True:
+            try:
+                opcode, payload = await readFrame(reader)
+            except FrameTooLarge:
+                writer.write(encodeFrame(CLOSE, struct.pack("!H", MESSAGE_TOO_BIG)))
+                return
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return
+            if opcode == CLOSE:
+                writer.write(encodeFrame(CLOSE, payload[:2]))
+                return
+            if opcode == PING:
+                writer.write(encodeFrame(PONG, payload))
+
+    async def close(self):
+        """
+        Stops listening and disconnects the clients.
+        """
+        self.server.close()
+        tasks = list(self.clients.values())
+        for writer in list(self.clients):
+            # The frames a client didn't read are dropped
+            writer.transport.abort()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.server.wait_closed()
+
+
+def encodeFrame(opcode, payload):
+    """
+    :return: a final, unmasked WebSocket frame (as sent by a server).
+    """
+    size = len(payload)
+    if size < 126:
+        header = struct.pack("!BB", 0x80 | opcode, size)
+    elif size < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, size)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, size)
+    return header + payload
+
+
+async def readFrame(reader):
+    """
+    Raises FrameTooLarge (before reading the payload) if the frame is above MAX_PAYLOAD.
+
+    :return: (opcode, unmasked payload) of the next WebSocket frame of a client.
+    """
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size, = struct.unpack("!H", await reader.readexactly(2))
+    elif size == 127:
+        size, = struct.unpack("!Q", await reader.readexactly(8))
+    if size > MAX_PAYLOAD:
+        raise FrameTooLarge("A frame of {} bytes, the maximum is {}".format(size, MAX_PAYLOAD))
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    payload = np.frombuffer(await reader.readexactly(size), dtype=np.uint8)
+    payload = payload ^ np.resize(np.frombuffer(mask, dtype=np.uint8), size)
+    return first & 0x0F, payload.tobytes()
+
+
+def writeResponse(writer, status, contentType, body):
+    """
+    Writes an HTTP response closing the connection.
+    """
+    writer.write("HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+        status, contentType, len(body)).encode() + body)
+
+
+def viewerPage():
+    """
+    :return: the HTML page of the viewer, drawing the frames of the stream on a canvas.
+    """
+    colors = [const.CELL_TYPES[cellType].replace(" ", "") for cellType in array_engine.TYPES]
+    return VIEWER.replace("$COLORS", json.dumps(colors)).replace("$TYPES", json.dumps(array_engine.TYPES)) \
+        .replace("$CELL_SIZE", str(const.CELL_SIZE)).replace("$MAX_IMAGE_SIZE", str(const.MAX_IMAGE_SIZE)) \
+        .replace("$HEADER", str(HEADER.size))
+
+
+VIEWER = """<!DOCTYPE html>
+<html>
+<head><title>Ecosystem</title></head>
+<body style="font-family: sans-serif">
+<div id="generation">Connecting...</div>
+<div id="aggregates"></div>
+<canvas id="world"></canvas>
+<div id="cell"></div>
+<script>
+const COLORS = $COLORS, TYPES = $TYPES, FULL = 1, DONE = 2;
+const canvas = document.getElementById("world"), context = canvas.getContext("2d");
+let rows = 0, cols = 0, size = 1, types = null, temps = null;
+
+function drawCell(cell) {
+    // Every row of the world is a column of the canvas, like in the Tk GUI
+    context.fillStyle = COLORS[types[cell]];
+    context.fillRect(Math.floor(cell / cols) * size, (cell % cols) * size, size, size);
+}
+
+const socket = new WebSocket("ws://" + location.host + "/stream");
+socket.binaryType = "arraybuffer";
+socket.onmessage = function (event) {
+    const data = event.data, view = new DataView(data);
+    const flags = view.getUint8(0), generation = view.getInt32(1, true), count = view.getUint32(13, true);
+    let offset = $HEADER + view.getUint32(17, true);
+    const aggregates = JSON.parse(new TextDecoder().decode(new Uint8Array(data, $HEADER, offset - $HEADER)));
+    let indices = null;
+    if (flags & FULL) {
+        rows = view.getInt32(5, true);
+        cols = view.getInt32(9, true);
+        size = Math.max(1, Math.min($CELL_SIZE, Math.floor($MAX_IMAGE_SIZE / Math.max(rows, cols))));
+        canvas.width = rows * size;
+        canvas.height = cols * size;
+        types = new Uint8Array(rows * cols);
+        temps = new Int16Array(rows * cols);
+    } else {
+        indices = new Uint32Array(data.slice(offset, offset + 4 * count));
+        offset += 4 * count;
+    }
+    const newTypes = new Uint8Array(data, offset, count);
+    const newTemps = new Int16Array(data.slice(offset + count, offset + 3 * count));
+    for (let i = 0; i < count; i++) {
+        const cell = indices ? indices[i] : i;
+        temps[cell] = newTemps[i];
+        if (indices === null || types[cell] !== newTypes[i]) {
+            types[cell] = newTypes[i];
+            drawCell(cell);
+        }
+    }
+    document.getElementById("generation").textContent =
+        "Generation " + generation + (flags & DONE ? " (the run ended)" : "");
+    if (aggregates.length > 0) {
+        const last = aggregates[aggregates.length - 1];
+        document.getElementById("aggregates").textContent =
+            "Generation " + last.generation + ": temperature avg " + last.temp.avg.toFixed(2) +
+            ", pollution avg " + last.pollution.avg.toFixed(2) + ", forests " + last.forests +
+            ", sea " + last.sea + ", glaciers " + last.glaciers;
+    }
+};
+socket.onclose = function () {
+    document.getElementById("generation").textContent += " - disconnected";
+};
+canvas.onmousemove = function (event) {
+    if (types === null) return;
+    const row = Math.floor(event.offsetX / size), col = Math.floor(event.offsetY / size);
+    if (row < rows && col < cols) {
+        const cell = row * cols + col;
+        document.getElementById("cell").textContent =
+            "Cell (" + row + ", " + col + "): " + TYPES[types[cell]] + ", " + temps[cell] + " degrees";
+    }
+};
+</script>
+</body>
+</html>
+"""
+
+
+async def serve(echoSystem, generations=const.STOP_GEN, host=const.STREAM_HOST, port=const.STREAM_PORT,
+                wait=True, quiet=False):
+    """
+    Runs an EchoSystem while streaming it, see StreamServer.
+
+    :param echoSystem: the EchoSystem of the run.
+    :param generations: the generation the run stops at.
+    :param host: the address the server listens on.
+    :param port: the port the server listens on.
+    :param wait: if True, the last generation is served after the run until the server is interrupted.
+    :param quiet: if True, nothing is printed.
+    """
+    server = StreamServer(echoSystem, host, port)
+    await server.start()
+    if not quiet:
+        print("Streaming on http://{}:{}/".format(host, server.port))
+    try:
+        await server.run(generations)
+        if not quiet:
+            print("The run reached generation {}".format(echoSystem.generation))
+        if wait:
+            await server.server.serve_forever()
+    finally:
+        await server.close()
+        echoSystem.close()
+
+
+def main(args=None):
+    """
+    Command line interface of the streaming server.
+    """
+    parser = argparse.ArgumentParser(description="Run the ecosystem without a GUI, streaming it to browsers.")
+    parser.add_argument("-g", "--generations", type=int, default=const.STOP_GEN,
+                        help="number of generations to run (default: %(default)s)")
+    parser.add_argument("-e", "--engine", choices=const.ENGINES, default=const.ENGINE,
+                        help="simulation engine (default: %(default)s)")
+    parser.add_argument("-s", "--seed", type=int, help="seed for the random initial conditions")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE,
+                        help="world file, text or binary (default: %(default)s)")
+    parser.add_argument("-r", "--resume", help="checkpoint file the run continues from")
+    parser.add_argument("--host", default=const.STREAM_HOST, help="address to listen on (default: %(default)s)")
+    parser.add_argument("-p", "--port", type=int, default=const.STREAM_PORT,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument("--exit", action="store_true", help="stop the server when the run ends")
+    options = parser.parse_args(args)
+
+    if options.resume is not None:
+        echoSystem = EchoSystem.loadCheckpoint(options.resume)
+    else:
+        if options.seed is not None:
+            random.seed(options.seed)
+        echoSystem = EchoSystem(options.engine, worldFile=options.world)
+    try:
+        asyncio.run(serve(echoSystem, options.generations, options.host, options.port, wait=not options.exit))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
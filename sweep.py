@@ -0,0 +1,339 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+import constants as const
+import array_engine
+import runner
+from echo_system import EchoSystem
+
+# Constants which don't change the results of a run (display, statistics and engine settings)
+SETTINGS = ["CELL_SIZE", "REFRESH_RATE", "FRAME_TIME", "MAX_CANVAS_CELLS", "MAX_IMAGE_SIZE", "WORLD_FILE",
+            "STATS_SNAPSHOTS", "PROFILE_HISTORY", "SERIES_CHUNK_BYTES", "ENGINES", "ENGINE", "TILES",
+            "ACTIVE_FRACTION", "PACKED_STRIP_CELLS", "SWEEP_CACHE_DIR", "SWEEP_CACHE_BYTES", "REPLAY_RATE",
+            "HISTORY_KEYFRAMES", "HISTORY_LEVEL", "STREAM_HOST", "STREAM_PORT", "STREAM_FRAME_TIME",
+            "STREAM_AGGREGATES", "REGIONS_REFRESH", "NO_REGION"]
+
+# Constants the integer codes of the cells are made of when the modules are imported
+FIXED = ["CELL_TYPES", "HEIGHTS", "WIND_DIRECTIONS", "WORLD_CELLS"]
+
+# The tiles engine runs worker processes of its own, a sweep runs every configuration in a single process
+ENGINES = [engine for engine in const.ENGINES if engine != "tiles"]
+
+# Part of every key, changed when the results of the same parameters change
+CACHE_VERSION = 1
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def modelParameters(overrides=None):
+    """
+    :param overrides: dict of constant name to the value replacing it.
+    :return: dict of every constant which changes the results of a run (see SETTINGS) to its value.
+    """
+    parameters = {name: getattr(const, name) for name in dir(const) if name.isupper() and name not in SETTINGS}
+    parameters.update(overrides or {})
+    return parameters
+
+
+def checkParameters(overrides, engine):
+    """
+    Raises ValueError if the constants can't be swept.
+
+    :param overrides: dict of constant name to the value replacing it.
+    :param engine: the simulation engine of the runs.
+    """
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine '{}', expected one of {}".format(engine, ENGINES))
+    for name in overrides:
+        if not name.isupper() or not hasattr(const, name):
+            raise ValueError("Unknown constant '{}'".format(name))
+        if name in SETTINGS:
+            raise ValueError("{} doesn't change the results of a run".format(name))
+        if name in FIXED:
+            raise ValueError("{} can't be swept, the cell codes are made of it".format(name))
+    speed = overrides.get("MAX_WIND_SPEED", const.MAX_WIND_SPEED)
+    if engine != "cells" and speed // 10 > array_engine.MAX_HOPS:
+        raise ValueError("MAX_WIND_SPEED above {} needs the cells engine".format(array_engine.MAX_HOPS * 10 + 9))
+
+
+def fileHash(path):
+    """
+    :return: SHA-256 hex digest of the contents of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def runKey(overrides, worldHash, seed, engine):
+    """
+    :param overrides: dict of constant name to the value replacing it.
+    :param worldHash: fileHash of the world file.
+    :param seed: seed of the run.
+    :param engine: the simulation engine of the run.
+    :return: the cache key of a run - a hash of all its model parameters, its world, seed and engine.
+    """
+    run = {"version": CACHE_VERSION,
+           "parameters": modelParameters(overrides),
+           "world": worldHash,
+           "seed": seed,
+           "engine": engine}
+    return hashlib.sha256(json.dumps(run, sort_keys=True).encode()).hexdigest()
+
+
+def expandGrid(grid):
+    """
+    :param grid: dict of constant name to the list of its values.
+    :return: list of dicts of constant name to value, one for every combination of the values.
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+class ResultCache:
+    """
+    On-disk cache of the results of runs, a JSON file (in the format of runner.writeStats) per run,
+    named after its key. Reading a result marks it as used, and when the cache grows above its
+    size the least recently used results are evicted.
+    """
+    def __init__(self, path=const.SWEEP_CACHE_DIR, maxBytes=const.SWEEP_CACHE_BYTES):
+        """
+        Init function for class ResultCache.
+
+        :param path: directory of the cache (created if needed).
+        :param maxBytes: size of the cached results kept.
+        """
+        self.path = path
+        self.maxBytes = maxBytes
+        os.makedirs(path, exist_ok=True)
+        self.bytes = sum(size for _, _, size in self.entries())
+        # A cache left larger than its size (by a larger maxBytes before) is trimmed right away
+        if self.bytes > self.maxBytes:
+            self.evict()
+
+    def entryFile(self, key):
+        """
+        :return: path of the file of a result.
+        """
+        return os.path.join(self.path, key + ".json")
+
+    def entries(self):
+        """
+        :return: list of (last use time, path, size) of the cached results.
+        """
+        result = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    info = entry.stat()
+                    result.append((info.st_mtime, entry.path, info.st_size))
+        return result
+
+    def get(self, key):
+        """
+        :return: the cached result of a run, None if it isn't cached.
+        """
+        path = self.entryFile(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        """
+        Caches the result of a run, and evicts results if the cache is too large.
+
+        :return: the result as it is read from the cache.
+        """
+        text = json.dumps(result)
+        path = self.entryFile(key)
+        # The file is renamed into place, so a result is never read half written
+        with open(path + ".tmp", 'w') as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        self.bytes += len(text)
+        if self.bytes > self.maxBytes:
+            self.evict(keep=path)
+        return json.loads(text)
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used results until the cache fits in its size.
+
+        :param keep: path of a result which isn't removed.
+        """
+        entries = sorted(self.entries())
+        self.bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.bytes <= self.maxBytes:
+                break
+            if path != keep:
+                os.remove(path)
+                self.bytes -= size
+
+
+def runConfig(task):
+    """
+    Runs a single configuration (in a worker process).
+
+    :param task: tuple of (constant overrides, world file, seed, engine).
+    :return: the stats of the run (see runner.runStats).
+    """
+    overrides, worldFile, seed, engine = task
+    saved = {name: getattr(const, name) for name in overrides}
+    try:
+        # The rules read the constants when they are applied
+        for name, value in overrides.items():
+            setattr(const, name, value)
+        random.seed(seed)
+        start = time.perf_counter()
+        echoSystem = EchoSystem(engine, worldFile=worldFile)
+        while echoSystem.generation < const.STOP_GEN:
+            echoSystem.updateWorld()
+        echoSystem.close()
+        return runner.runStats(echoSystem, parameters=overrides, engine=engine, seed=seed, world=worldFile,
+                               seconds=time.perf_counter() - start)
+    finally:
+        for name, value in saved.items():
+            setattr(const, name, value)
+
+
+def runSweep(grid, seeds=(0,), worldFile=const.WORLD_FILE, engine="arrays", processes=None, cache=None):
+    """
+    Runs every combination of a parameter grid with every seed in a process pool, skipping the
+    runs whose results are cached.
+
+    :param grid: dict of constant name to the list of its values (STOP_GEN sets the generations).
+    :param seeds: the seeds every combination is run with.
+    :param worldFile: the world file of the runs.
+    :param engine: the simulation engine of the runs (see ENGINES).
+    :param processes: number of worker processes (None - number of cores).
+    :param cache: the ResultCache of the runs (None - the default cache directory).
+    :return: list of dicts with the parameters, seed, key, cached (True if the result was cached)
+             and result (see runner.runStats) of every run, in grid order.
+    """
+    combinations = expandGrid(grid)
+    for overrides in combinations:
+        checkParameters(overrides, engine)
+    cache = ResultCache() if cache is None else cache
+    worldHash = fileHash(worldFile)
+
+    runs = []
+    tasks = {}      # The runs which aren't cached, by key (the same configuration is run once)
+    for overrides in combinations:
+        for seed in seeds:
+            key = runKey(overrides, worldHash, seed, engine)
+            result = cache.get(key)
+            runs.append({"parameters": overrides, "seed": seed, "key": key, "cached": result is not None,
+                         "result": result})
+            if result is None:
+                tasks[key] = (overrides, worldFile, seed, engine)
+
+    results = {}
+    if tasks:
+        with Pool(processes) as pool:
+            for key, result in zip(tasks, pool.imap(runConfig, tasks.values())):
+                results[key] = cache.put(key, result)
+    for run in runs:
+        if run["result"] is None:
+            run["result"] = results[run["key"]]
+    return runs
+
+
+def summary(run):
+    """
+    :param run: a run returned by runSweep.
+    :return: dict of the final generation aggregates and the run-wide temperature and pollution of a run.
+    """
+    stats = run["result"]["stats"]
+    last = stats[max(stats, key=int)] if stats else {}
+    return {"parameters": run["parameters"],
+            "seed": run["seed"],
+            "key": run["key"],
+            "cached": run["cached"],
+            "temp": run["result"]["totals"]["temp"],
+            "pollution": run["result"]["totals"]["pollution"],
+            "forests": last.get("forests"),
+            "sea": last.get("sea"),
+            "glaciers": last.get("glaciers")}
+
+
+def parseValue(text):
+    """
+    :return: the value of a command line parameter - a JSON value (a number, list, dict etc.) or a string.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def parseSize(text):
+    """
+    :return: number of bytes of a size such as 4096, 500K, 100M or 2G.
+    """
+    text = text.strip().upper()
+    if text[-1:] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def main(args=None):
+    """
+    Command line interface of the parameter sweep.
+    """
+    parser = argparse.ArgumentParser(description="Run every combination of a grid of constants, "
+                                                 "reusing the cached results of runs made before.")
+    parser.add_argument("-P", "--param", nargs="+", action="append", default=[], metavar=("NAME", "VALUE"),
+                        help="a constant and its values (JSON), e.g. -P GLACIER_TEMP -20 -10")
+    parser.add_argument("-s", "--seeds", nargs="+", type=int, default=[0],
+                        help="seeds every combination is run with (default: 0)")
+    parser.add_argument("-e", "--engine", choices=ENGINES, default="arrays",
+                        help="simulation engine (default: %(default)s)")
+    parser.add_argument("-w", "--world", default=const.WORLD_FILE,
+                        help="world file, text or binary (default: %(default)s)")
+    parser.add_argument("-p", "--processes", type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument("-c", "--cache-dir", default=const.SWEEP_CACHE_DIR,
+                        help="directory of the cached results (default: %(default)s)")
+    parser.add_argument("-m", "--cache-size", type=parseSize, default=const.SWEEP_CACHE_BYTES,
+                        help="size of the cache, e.g. 500M (default: %(default)s bytes)")
+    parser.add_argument("-o", "--output", help="JSON file the summaries of the runs are written to")
+    options = parser.parse_args(args)
+
+    grid = {}
+    for param in options.param:
+        if len(param) < 2:
+            parser.error("-P needs a constant name and at least one value")
+        grid[param[0]] = [parseValue(value) for value in param[1:]]
+
+    start = time.perf_counter()
+    try:
+        runs = runSweep(grid, options.seeds, options.world, options.engine, options.processes,
+                        ResultCache(options.cache_dir, options.cache_size))
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    summaries = [summary(run) for run in runs]
+    cached = sum(run["cached"] for run in runs)
+    print("{} runs ({} cached) in {:.3f} seconds".format(len(runs), cached, elapsed))
+    for s in summaries:
+        print("{} seed={} {}temp avg={:.3f} pollution avg={:.3f} forests={} sea={} glaciers={}".format(
+            json.dumps(s["parameters"], sort_keys=True), s["seed"], "(cached) " if s["cached"] else "",
+            s["temp"]["avg"], s["pollution"]["avg"], s["forests"], s["sea"], s["glaciers"]))
+    if options.output is not None:
+        with open(options.output, 'w') as f:
+            json.dump(summaries, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import weakref
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import constants as const
+import array_engine
+import rules
+
+# A wind travels at most MAX_HOPS cells, so a tile needs that many rows of its neighbors
+HALO = array_engine.MAX_HOPS
+
+# State of a worker process: the shared arrays, and the neighbor tables and cell order of its strips
+_shared = {}
+_strips = {}
+
+
+def _attach(blocks, shape, dtypes):
+    """
+    Worker initializer - maps the shared memory blocks of both buffers into arrays.
+
+    :param blocks: shared memory names, blocks[buffer][field].
+    :param shape: (rows, columns) of the world.
+    :param dtypes: dtype of every field.
+    """
+    _shared["memory"] = [{field: SharedMemory(name=name) for field, name in buffer.items()} for buffer in blocks]
+    _shared["arrays"] = [{field: np.ndarray(shape, dtype=dtypes[field], buffer=memory.buf)
+                          for field, memory in buffer.items()} for buffer in _shared["memory"]]
+
+
+def _calcTile(task):
+    """
+    Calculates the changes of the rows of a single tile (in a worker process).
+    The tile's rows and HALO rows above and below it are stepped as a strip, and only
+    the tile's rows are written to the next buffer.
+
+    :param task: tuple of (current buffer, first row, end row).
+    :return: the change of the (forests, sea, glaciers) counters in the tile.
+    """
+    current, first, end = task
+    arrays = _shared["arrays"][current]
+    nextArrays = _shared["arrays"][1 - current]
+    worldRows = arrays["type"].shape[0]
+    halo = 0 if end - first == worldRows else HALO
+
+    # Copy the strip, the circular world wraps around the first and last rows
+    rows = np.arange(first - halo, end + halo) % worldRows
+    state = {field: array[rows] for field, array in arrays.items()}
+    if (first, end) not in _strips:
+        # The changes of the strip cells are ordered by their position in the whole world
+        cols = arrays["type"].shape[1]
+        cellOrder = (rows[:, None] * cols + np.arange(cols)).ravel()
+        _strips[first, end] = (array_engine.neighborTable(state["type"].shape), cellOrder)
+    strip = array_engine.ArrayEngine.fromState(_Counters(), state, *_strips[first, end])
+    strip.calcChanges()
+
+    # Paths leaving the strip never get back to the tile's rows, so the tile's rows are exact
+    own = slice(halo, halo + end - first)
+    for field, array in strip.nextState().items():
+        nextArrays[field][first:end] = array[own]
+    return countChanges(state["type"][own], strip.nextType[own])
+
+
+def countChanges(cellType, nextType):
+    """
+    :return: the change of the (forests, sea, glaciers) counters made by cell type changes.
+    """
+    return tuple(int(change) for change in rules.countChanges(cellType, nextType))
+
+
+class _Counters:
+    """
+    Counters of a strip - they are ignored, the tile's counters are taken from its type changes.
+    """
+    forests = 0
+    sea = 0
+    glaciers = 0
+
+    def __init__(self, profiler=None):
+        """
+        :param profiler: the Profiler the rules of the strip are timed with (None - not timed).
+        """
+        self.profiler = profiler
+
+
+def _release(pool, memory):
+    """
+    Stops the workers and frees the shared memory.
+    """
+    pool.terminate()
+    for buffer in memory:
+        for block in buffer.values():
+            block.close()
+            block.unlink()
+
+
+class TiledEngine:
+    """
+    ArrayEngine split into row tiles stepped in parallel by worker processes.
+    The cell arrays are double-buffered in shared memory: the workers read the current buffer
+    (their tile and HALO rows around it) and write their tile's rows to the next buffer.
+    The results are the same, bit for bit, as the single process ArrayEngine.
+    """
+    def __init__(self, echoSystem, types, tiles=const.TILES):
+        """
+        Init function for class TiledEngine.
+
+        :param echoSystem: the EchoSystem whose counters are updated.
+        :param types: (rows, columns) array of type codes (the index in array_engine.TYPES).
+        :param tiles: number of tiles (and worker processes).
+        """
+        self.echoSystem = echoSystem
+        # The random initial values are drawn like in ArrayEngine
+        engine = array_engine.ArrayEngine(echoSystem, types)
+        self.shape = engine.shape
+        self.size = engine.size
+
+        rows = self.shape[0]
+        bounds = np.linspace(0, rows, tiles + 1).astype(int)
+        self.tiles = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        # A strip (tile and halo) must not overlap itself around the circular world
+        if tiles > 1 and min(end - first for first, end in self.tiles) + 2 * HALO > rows:
+            raise ValueError("A world of {} rows can't be split into {} tiles".format(rows, tiles))
+
+        # Two buffers of shared arrays, the current one and the next one
+        dtypes = {field: getattr(engine, field).dtype for field in array_engine.FIELDS}
+        self.memory = []
+        self.buffers = []
+        for _ in range(2):
+            memory = {}
+            arrays = {}
+            for field in array_engine.FIELDS:
+                memory[field] = SharedMemory(create=True, size=max(1, self.size * dtypes[field].itemsize))
+                arrays[field] = np.ndarray(self.shape, dtype=dtypes[field], buffer=memory[field].buf)
+            self.memory.append(memory)
+            self.buffers.append(arrays)
+        for field in array_engine.FIELDS:
+            self.buffers[0][field][...] = getattr(engine, field)
+        self.current = 0
+
+        blocks = [{field: block.name for field, block in memory.items()} for memory in self.memory]
+        self.pool = Pool(tiles, initializer=_attach, initargs=(blocks, self.shape, dtypes))
+        self._finalizer = weakref.finalize(self, _release, self.pool, self.memory)
+
+    def __getattr__(self, name):
+        """
+        The cell arrays (type, temperature etc.) are the arrays of the current buffer.
+        """
+        if name in array_engine.FIELDS:
+            return self.__dict__["buffers"][self.__dict__["current"]][name]
+        raise AttributeError(name)
+
+    def state(self):
+        """
+        :return: dict of field name to array, for every name in FIELDS.
+        """
+        return dict(self.buffers[self.current])
+
+    def nextState(self):
+        """
+        :return: the calculated changes - between generations they are the current state,
+                 the next buffer is rewritten by every generation.
+        """
+        return self.state()
+
+    def setState(self, state, nextState):
+        """
+        Replaces the cell arrays (the changes are calculated again every generation).
+
+        :param state: dict of field name to array, for every name in FIELDS.
+        :param nextState: ignored, see nextState.
+        """
+        for field in array_engine.FIELDS:
+            self.buffers[self.current][field][...] = state[field]
+
+    def calcChanges(self):
+        """
+        Calculate the changes of all the tiles in parallel.
+        """
+        tasks = [(self.current, first, end) for first, end in self.tiles]
+        for forests, sea, glaciers in self.pool.map(_calcTile, tasks):
+            self.echoSystem.forests += forests
+            self.echoSystem.sea += sea
+            self.echoSystem.glaciers += glaciers
+
+    def applyChanges(self):
+        """
+        Update the changes that were calculated - the next buffer becomes the current one.
+        """
+        self.current = 1 - self.current
+
+    def view(self):
+        """
+        :return: rows of CellView objects, with the same layout as EchoSystem.world.
+        """
+        return array_engine.WorldView(self)
+
+    def close(self):
+        """
+        Stops the worker processes and frees the shared memory. The cells are copied out of the shared
+        memory first, so the engine (and the world views of it) can still be read - but not stepped.
+        Arrays taken from the engine before (e.g. by state) must not be used after it's closed.
+        """
+        if self._finalizer.alive:
+            cells = {field: np.array(array) for field, array in self.buffers[self.current].items()}
+            self.buffers = [cells, cells]
+        self._finalizer()
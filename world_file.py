@@ -0,0 +1,128 @@
+import argparse
+import struct
+import numpy as np
+import constants as const
+from array_engine import TYPES
+
+# Binary world format: a header with the dimensions, followed by a uint8 type code
+# (the index in array_engine.TYPES) for every cell, row after row.
+MAGIC = b"ECOWLD01"
+HEADER = struct.Struct("<8sII")     # magic, rows, columns
+
+# Translation table from the letters of a text world to type codes, all other bytes are separators
+CODES = bytearray(256)
+for letter, cellType in const.WORLD_CELLS.items():
+    CODES[ord(letter)] = TYPES.index(cellType)
+CODES = bytes(CODES)
+SEPARATORS = bytes(b for b in range(256) if chr(b) not in const.WORLD_CELLS)
+CELL_BYTES = bytes(1 if chr(b) in const.WORLD_CELLS else 0 for b in range(256))    # 1 for the letters of cells
+
+
+def readWorld(path):
+    """
+    Reads a world file, in the text or the binary format.
+
+    :param path: path of the world file.
+    :return: (rows, columns) uint8 array of type codes. A binary world is memory-mapped (read-only).
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if header.startswith(MAGIC):
+        return readBinary(path)
+    return readText(path)
+
+
+def readText(path):
+    """
+    Reads a text world (a letter for every cell, see constants.WORLD_CELLS) in a single bulk read.
+    Every line holding cells is a row of the world, and they must all hold the same number of cells.
+
+    :param path: path of the world file.
+    :return: (rows, columns) uint8 array of type codes.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    raw = np.frombuffer(data, dtype=np.uint8)
+    # The number of cells on every line: the cells counted up to every line break (\n or \r)
+    counted = np.cumsum(np.frombuffer(data.translate(CELL_BYTES), dtype=np.uint8), dtype=np.int64)
+    ends = np.flatnonzero((raw == ord("\n")) | (raw == ord("\r")))
+    lineCells = np.diff(np.concatenate(([0], counted[ends], counted[-1:])))
+    lineCells = lineCells[lineCells > 0]
+    if len(lineCells) == 0 or (lineCells != lineCells[0]).any():
+        raise ValueError("{} is not a rectangular world".format(path))
+    codes = np.frombuffer(data.translate(CODES, SEPARATORS), dtype=np.uint8)
+    return codes.reshape(len(lineCells), lineCells[0])
+
+
+def readBinary(path):
+    """
+    Memory-maps a binary world, the cells are not copied.
+
+    :param path: path of the world file.
+    :return: (rows, columns) read-only uint8 array of type codes.
+    """
+    with open(path, 'rb') as f:
+        magic, rows, cols = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("{} is not a binary world".format(path))
+    return np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(rows, cols))
+
+
+def writeBinary(types, path):
+    """
+    Writes a world in the binary format.
+
+    :param types: (rows, columns) array of type codes.
+    :param path: path of the world file.
+    """
+    types = np.asarray(types, dtype=np.uint8)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, types.shape[0], types.shape[1]))
+        f.write(np.ascontiguousarray(types).tobytes())
+
+
+def writeText(types, path):
+    """
+    Writes a world in the text format (like world.dat).
+
+    :param types: (rows, columns) array of type codes.
+    :param path: path of the world file.
+    """
+    letters = np.array([ord(letter) for letter in typeLetters()], dtype=np.uint8)
+    rows, cols = np.shape(types)
+    # Every row is the letters separated by spaces, followed by a line break
+    text = np.full((rows, 2 * cols + 1), ord(" "), dtype=np.uint8)
+    text[:, 0:2 * cols - 1:2] = letters[np.asarray(types)]
+    text[:, -2] = ord("\r")
+    text[:, -1] = ord("\n")
+    with open(path, 'wb') as f:
+        f.write(text.tobytes())
+
+
+def typeLetters():
+    """
+    :return: the letter of every type code.
+    """
+    letters = {cellType: letter for letter, cellType in const.WORLD_CELLS.items()}
+    return [letters[cellType] for cellType in TYPES]
+
+
+def main(args=None):
+    """
+    Command line converter between the text and the binary world formats.
+    """
+    parser = argparse.ArgumentParser(description="Convert a world file between the text and the binary formats.")
+    parser.add_argument("source", help="world file to convert (the format is detected)")
+    parser.add_argument("target", help="converted world file")
+    options = parser.parse_args(args)
+
+    types = readWorld(options.source)
+    if isinstance(types, np.memmap):
+        writeText(types, options.target)
+    else:
+        writeBinary(types, options.target)
+    print("{} rows x {} columns written to {}".format(types.shape[0], types.shape[1], options.target))
+
+
+if __name__ == "__main__":
+    main()